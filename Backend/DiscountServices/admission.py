@@ -0,0 +1,247 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+from typing import Callable, Dict, FrozenSet, List, NamedTuple, Optional, Sequence
+
+from database import POOL_MAX_SIZE
+from metrics import Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+# Admission control in front of the routers. A worker serves at most ADMISSION_MAX_CONCURRENCY
+# requests at once (by default one per pooled DB connection, so SQL Server sees no more sessions
+# than the pool allows); the rest wait in a bounded queue, highest priority first, and are turned
+# away with 503 + Retry-After once the queue is full or their wait times out. Shedding early is
+# cheaper than letting every terminal time out on the DB pool together.
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "1").lower() not in ("0", "false", "no")
+ADMISSION_MAX_CONCURRENCY = int(os.getenv("ADMISSION_MAX_CONCURRENCY", str(POOL_MAX_SIZE)))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "100"))
+ADMISSION_RETRY_AFTER_SECONDS = int(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", "2"))
+# Per-route cap for the heavy admin reads, so a few reports cannot take every DB connection.
+ADMISSION_REPORT_CONCURRENCY = int(os.getenv("ADMISSION_REPORT_CONCURRENCY", "2"))
+
+# Lower is admitted first.
+PRIORITY_WRITE = 0   # sales and order updates: a till is waiting
+PRIORITY_READ = 1    # order boards, discount lookups
+PRIORITY_REPORT = 2  # admin listings, summaries, exports
+
+
+class RouteLimit(NamedTuple):
+    """
+    Requests whose path starts with `path_prefix` (and, when given, whose method is in `methods`
+    and for whose ASGI scope `when` returns true, e.g. to tell query-string shapes apart).
+    """
+    name: str
+    path_prefix: str
+    priority: int
+    methods: FrozenSet[str] = frozenset()
+    max_concurrency: Optional[int] = None  # per-route cap on top of the shared one
+    queue_timeout: float = 2.0
+    when: Optional[Callable[[dict], bool]] = None
+
+
+def route_limit(name: str, path_prefix: str, priority: int, methods: Sequence[str] = (),
+                max_concurrency: Optional[int] = None, queue_timeout: float = 2.0,
+                when: Optional[Callable[[dict], bool]] = None) -> RouteLimit:
+    return RouteLimit(name, path_prefix, priority, frozenset(methods), max_concurrency, queue_timeout, when)
+
+
+# --- Metrics ---
+
+ADMISSION_SHED = Counter(
+    "http_requests_shed_total", "Requests turned away with 503 by admission control, by route limit and reason.",
+    ["route", "reason"],
+)
+ADMISSION_WAIT_SECONDS = Histogram(
+    "http_admission_wait_seconds", "Time requests spent queued for an admission slot, by route limit.", ["route"],
+)
+
+
+class _Waiter:
+    __slots__ = ("limit", "future", "abandoned")
+
+    def __init__(self, limit: RouteLimit, future: asyncio.Future):
+        self.limit = limit
+        self.future = future
+        self.abandoned = False
+
+
+class AdmissionController:
+    def __init__(self, capacity: int = ADMISSION_MAX_CONCURRENCY, max_queue: int = ADMISSION_MAX_QUEUE):
+        self.capacity = capacity
+        self.max_queue = max_queue
+        self.active = 0
+        self._active_by_route: Dict[str, int] = {}
+        self._queue: List[tuple] = []  # heap of (priority, seq, waiter)
+        self._queued = 0               # live (not abandoned) waiters in _queue
+        self._queued_by_route: Dict[str, int] = {}
+        self._seq = itertools.count()
+        self._stats = {"admitted": 0, "queued": 0, "shed_queue_full": 0, "shed_timeout": 0, "max_queue_depth": 0}
+
+    def _has_room(self, limit: RouteLimit) -> bool:
+        if self.active >= self.capacity:
+            return False
+        return limit.max_concurrency is None or self._active_by_route.get(limit.name, 0) < limit.max_concurrency
+
+    def _take(self, limit: RouteLimit):
+        self.active += 1
+        self._active_by_route[limit.name] = self._active_by_route.get(limit.name, 0) + 1
+        self._stats["admitted"] += 1
+
+    def _dequeued(self, waiter: _Waiter):
+        self._queued -= 1
+        self._queued_by_route[waiter.limit.name] -= 1
+
+    def _abandon(self, waiter: _Waiter):
+        waiter.abandoned = True
+        self._dequeued(waiter)
+        # Abandoned entries are normally dropped by _dispatch; compact when it has not run in a while.
+        if len(self._queue) > 2 * self.max_queue:
+            self._queue = [entry for entry in self._queue if not entry[2].abandoned]
+            heapq.heapify(self._queue)
+
+    def _dispatch(self):
+        """Hands free slots to waiters in priority order, skipping the ones whose route is at its cap."""
+        blocked = []
+        while self._queue and self.active < self.capacity:
+            entry = heapq.heappop(self._queue)
+            waiter = entry[2]
+            if waiter.abandoned:
+                continue
+            if not self._has_room(waiter.limit):
+                blocked.append(entry)
+                continue
+            self._dequeued(waiter)
+            self._take(waiter.limit)
+            waiter.future.set_result(True)
+        for entry in blocked:
+            heapq.heappush(self._queue, entry)
+
+    async def acquire(self, limit: RouteLimit) -> Optional[str]:
+        """None once a slot is held (pair with release()), otherwise the reason the request was shed."""
+        if not self._queued and self._has_room(limit):
+            self._take(limit)
+            return None
+        if self._queued >= self.max_queue:
+            self._stats["shed_queue_full"] += 1
+            return "queue_full"
+
+        waiter = _Waiter(limit, asyncio.get_running_loop().create_future())
+        heapq.heappush(self._queue, (limit.priority, next(self._seq), waiter))
+        self._queued += 1
+        self._queued_by_route[limit.name] = self._queued_by_route.get(limit.name, 0) + 1
+        self._stats["queued"] += 1
+        self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], self._queued)
+        self._dispatch()
+
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), limit.queue_timeout)
+        except asyncio.TimeoutError:
+            if waiter.future.done():
+                return None  # granted just as the wait ran out
+            self._abandon(waiter)
+            self._stats["shed_timeout"] += 1
+            return "timeout"
+        except asyncio.CancelledError:
+            # Client went away while queued; give back the slot if it had just been granted.
+            if waiter.future.done():
+                self.release(limit)
+            else:
+                self._abandon(waiter)
+            raise
+        finally:
+            ADMISSION_WAIT_SECONDS.observe(time.perf_counter() - started, limit.name)
+        return None
+
+    def release(self, limit: RouteLimit):
+        self.active -= 1
+        self._active_by_route[limit.name] -= 1
+        self._dispatch()
+
+    def get_stats(self) -> dict:
+        return {
+            **self._stats,
+            "capacity": self.capacity,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "queue_depth": self._queued,
+            "active_by_route": {k: v for k, v in self._active_by_route.items() if v},
+            "queued_by_route": {k: v for k, v in self._queued_by_route.items() if v},
+        }
+
+
+controller = AdmissionController()
+
+ADMISSION_ACTIVE = Gauge(
+    "http_admission_active", "Requests holding an admission slot.",
+    collect=lambda: {(): controller.active},
+)
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "http_admission_queue_depth", "Requests waiting for an admission slot.",
+    collect=lambda: {(): controller.get_stats()["queue_depth"]},
+)
+
+
+def get_admission_stats() -> dict:
+    return controller.get_stats()
+
+
+def _reject(reason: str) -> List[dict]:
+    body = b'{"detail":"Service is busy, please retry shortly."}'
+    return [
+        {
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(ADMISSION_RETRY_AFTER_SECONDS).encode()),
+                (b"x-shed-reason", reason.encode()),
+            ],
+        },
+        {"type": "http.response.body", "body": body},
+    ]
+
+
+class AdmissionMiddleware:
+    """
+    Pure ASGI middleware: each HTTP request matching a RouteLimit (first match wins) holds an
+    admission slot until its response, streamed bodies included, has been sent. Requests that
+    match no limit (health checks, metrics, docs, static files), CORS preflights and
+    websockets pass straight through.
+    """
+
+    def __init__(self, app, limits: Sequence[RouteLimit], admission: Optional[AdmissionController] = None):
+        self.app = app
+        self.limits = list(limits)
+        self.admission = admission or controller
+
+    def _match(self, scope) -> Optional[RouteLimit]:
+        method, path = scope["method"], scope["path"]
+        for limit in self.limits:
+            if (path.startswith(limit.path_prefix) and (not limit.methods or method in limit.methods)
+                    and (limit.when is None or limit.when(scope))):
+                return limit
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "OPTIONS":
+            return await self.app(scope, receive, send)
+        limit = self._match(scope)
+        if limit is None:
+            return await self.app(scope, receive, send)
+
+        reason = await self.admission.acquire(limit)
+        if reason is not None:
+            ADMISSION_SHED.inc(limit.name, reason)
+            for message in _reject(reason):
+                await send(message)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.admission.release(limit)
@@ -0,0 +1,191 @@
+import hashlib
+import httpx
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from fastapi import Depends, HTTPException, status
+from fastapi.security import OAuth2PasswordBearer
+from jose import JWTError, jwt
+
+from http_client import get_http_client
+
+logger = logging.getLogger(__name__)
+
+# --- Auth and Service URL Configuration ---
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="http://127.0.0.1:4000/auth/token")
+USER_SERVICE_ME_URL = "http://localhost:4000/auth/users/me"
+
+# Set AUTH_JWT_SECRET_KEY (HS*) or AUTH_JWT_PUBLIC_KEY (RS*/ES*) to verify tokens locally.
+# Without a key every token is checked against the user service, with results cached.
+JWT_SECRET_KEY = os.getenv("AUTH_JWT_SECRET_KEY")
+JWT_PUBLIC_KEY = os.getenv("AUTH_JWT_PUBLIC_KEY")
+JWT_ALGORITHMS = [a.strip() for a in os.getenv("AUTH_JWT_ALGORITHMS", "HS256").split(",") if a.strip()]
+# Claims that carry the username and role in the user service's tokens. A verified token
+# without them is resolved through the user service instead of being rejected.
+JWT_SUBJECT_CLAIM = os.getenv("AUTH_JWT_SUBJECT_CLAIM", "sub")
+JWT_ROLE_CLAIM = os.getenv("AUTH_JWT_ROLE_CLAIM", "role")
+USER_CACHE_TTL_SECONDS = float(os.getenv("AUTH_USER_CACHE_TTL_SECONDS", "60"))
+USER_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_USER_CACHE_MAX_ENTRIES", "2048"))
+
+
+def _token_key(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+class UserCache:
+    """Bounded LRU of user profiles keyed by token hash. Entries never outlive the token's `exp`."""
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str) -> Optional[dict]:
+        key = _token_key(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, user = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return user
+
+    def put(self, token: str, user: dict, token_exp: Optional[float] = None):
+        expires_at = time.time() + self.ttl_seconds
+        if token_exp is not None:
+            expires_at = min(expires_at, token_exp)
+        if expires_at <= time.time():
+            return
+        key = _token_key(token)
+        self._entries[key] = (expires_at, user)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+# --- Token verifiers ---
+# Each verifier turns a bearer token into the user dict the routers expect
+# ({"username": ..., "userRole": ...}) or raises an HTTPException.
+
+class RemoteUserVerifier:
+    """Asks the user service who the token belongs to, caching the answer per token."""
+
+    def __init__(self, me_url: str = USER_SERVICE_ME_URL, cache: Optional[UserCache] = None):
+        self.me_url = me_url
+        self.cache = cache or UserCache(USER_CACHE_TTL_SECONDS, USER_CACHE_MAX_ENTRIES)
+
+    async def verify(self, token: str) -> dict:
+        user = self.cache.get(token)
+        if user is not None:
+            return user
+
+        try:
+            response = await get_http_client().get(self.me_url, headers={"Authorization": f"Bearer {token}"})
+            response.raise_for_status()
+        except httpx.HTTPStatusError as e:
+            raise HTTPException(
+                status_code=e.response.status_code,
+                detail=f"Invalid token or user not found: {e.response.text}",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        except httpx.RequestError:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Could not connect to the authentication service."
+            )
+
+        user = response.json()
+        try:
+            token_exp = jwt.get_unverified_claims(token).get("exp")
+        except JWTError:
+            token_exp = None
+        self.cache.put(token, user, token_exp)
+        return user
+
+
+class LocalJWTVerifier:
+    """
+    Checks the token signature and expiry with the configured key, without a network call.
+    Tokens whose username or role claim is missing go to `fallback` (the user service).
+    """
+
+    def __init__(self, key: str, algorithms: list, subject_claim: str = JWT_SUBJECT_CLAIM,
+                 role_claim: str = JWT_ROLE_CLAIM, fallback: Optional[RemoteUserVerifier] = None):
+        self.key = key
+        self.algorithms = algorithms
+        self.subject_claim = subject_claim
+        self.role_claim = role_claim
+        self.fallback = fallback
+        self.fallbacks = 0
+
+    async def verify(self, token: str) -> dict:
+        try:
+            claims = jwt.decode(token, self.key, algorithms=self.algorithms)
+        except JWTError:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid or expired token.",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        username = claims.get(self.subject_claim)
+        role = claims.get(self.role_claim)
+        if not username or not role:
+            if self.fallback is not None:
+                if not self.fallbacks:
+                    logger.warning(f"Tokens lack the '{self.subject_claim}'/'{self.role_claim}' claims; "
+                                   "resolving them through the user service (see AUTH_JWT_*_CLAIM).")
+                self.fallbacks += 1
+                return await self.fallback.verify(token)
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Token is missing the user or role claim.",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        return {"username": username, "userRole": role, "exp": claims.get("exp")}
+
+
+def _build_default_verifier():
+    key = JWT_PUBLIC_KEY or JWT_SECRET_KEY
+    if key:
+        logger.info(f"Verifying access tokens locally ({', '.join(JWT_ALGORITHMS)}).")
+        return LocalJWTVerifier(key, JWT_ALGORITHMS, fallback=RemoteUserVerifier())
+    logger.info("No JWT key configured; verifying access tokens through the user service.")
+    return RemoteUserVerifier()
+
+
+_verifier = _build_default_verifier()
+
+
+def set_token_verifier(verifier):
+    """Swaps the verifier, e.g. for a different key source or a test double."""
+    global _verifier
+    _verifier = verifier
+
+
+def get_token_verifier():
+    return _verifier
+
+
+async def verify_token(token: str) -> dict:
+    return await _verifier.verify(token)
+
+
+# --- Authorization dependency shared by all routers ---
+async def get_current_active_user(token: str = Depends(oauth2_scheme)):
+    return await verify_token(token)
@@ -0,0 +1,113 @@
+"""
+Load scenario for the discount service, run in-process against the local stand-ins
+(benchmarks/stand_ins.py): an in-memory Discounts table and a fake user service, each
+with its own latency.
+
+  discounts  GET /discounts/ (one default-size page, one keyset page with --page-size, or streamed with --stream)
+
+Run from DiscountServices/:  python -m benchmarks.bench_load [--requests 2000] [--concurrency 32] [--discounts 1000] [--replica]
+Prints one JSON line with throughput and p50/p95/p99 latency.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+from contextlib import asynccontextmanager
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+import main
+from database import init_db_pool, replica_is_current, POOL_MAX_SIZE, REPLICA_LAG_CHECK_SECONDS
+from http_client import init_http_client
+from auth import set_token_verifier, _build_default_verifier
+from benchmarks.stand_ins import InMemoryDatabase, InMemoryPool, ServiceRouter, fake_user_service, run_load
+
+
+def seed(db: InMemoryDatabase, discounts: int):
+    for n in range(1, discounts + 1):
+        percentage = n % 2 == 0
+        db.add_discount(
+            f"Promo {n}", "Percentage" if percentage else "Fixed",
+            Decimal("10.00") if percentage else Decimal("25.00"),
+            minimum_spend=Decimal("150.00"), product_name=None if n % 3 else "Spanish Latte",
+            status="Active" if n % 5 else "Inactive",
+        )
+
+
+async def _wait_for_replica():
+    # reads go to the primary until the first replica lag check has passed
+    while not replica_is_current():
+        await asyncio.sleep(REPLICA_LAG_CHECK_SECONDS / 10)
+
+
+@asynccontextmanager
+async def stand_in_service(args):
+    """A fresh in-memory database and fake user service, with the app's lifespan running."""
+    db = InMemoryDatabase(latency_ms=args.db_latency_ms)
+    seed(db, args.discounts)
+    user_service = fake_user_service(latency_ms=args.auth_latency_ms, role="manager")
+    replica = InMemoryPool(db, maxsize=args.pool_size) if getattr(args, "replica", False) else None
+    await init_db_pool(pool=InMemoryPool(db, maxsize=args.pool_size), replica_pool=replica)
+    set_token_verifier(_build_default_verifier())  # every run starts with a cold auth cache
+    await init_http_client(transport=ServiceRouter({"localhost:4000": user_service}))
+    async with main.lifespan(main.app):
+        if replica is not None:
+            await _wait_for_replica()
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://discounts.test", timeout=None) as client:
+            yield client, db, user_service
+
+
+async def scenario_discounts(args) -> dict:
+    params = {"active_only": str(args.active_only).lower()}
+    if args.page_size:
+        params["limit"] = args.page_size
+    if args.stream:
+        params["stream"] = "true"
+    async with stand_in_service(args) as (client, db, user_service):
+        async def send(i):
+            token = f"bench-token-{i % args.tokens:06d}"
+            return await client.get("/discounts/", params=params, headers={"Authorization": f"Bearer {token}"})
+        result = await run_load(send, args.requests, args.concurrency, args.warmup)
+        result["auth_calls"] = user_service.state.calls
+    result.update({"discounts": args.discounts, "page_size": args.page_size, "active_only": args.active_only,
+                   "stream": args.stream})
+    return result
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--tokens", type=int, default=20, help="Distinct bearer tokens (auth cache entries).")
+    parser.add_argument("--pool-size", type=int, default=POOL_MAX_SIZE)
+    parser.add_argument("--replica", action="store_true", help="Send reads to a second stand-in pool (a replica with no lag).")
+    parser.add_argument("--db-latency-ms", type=float, default=1.0, help="Added to every database round trip.")
+    parser.add_argument("--auth-latency-ms", type=float, default=5.0)
+    parser.add_argument("--discounts", type=int, default=1000, help="Seeded Discounts rows.")
+    parser.add_argument("--page-size", type=int, default=None, help="Request one keyset page of this size (default: the server's DEFAULT_PAGE_SIZE).")
+    parser.add_argument("--active-only", action="store_true")
+    parser.add_argument("--stream", action="store_true")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)  # per-request service logs would dominate the measurement
+    result = asyncio.run(scenario_discounts(args))
+    print(json.dumps({
+        "benchmark": "discounts_load",
+        "scenario": "discounts",
+        "db_latency_ms": args.db_latency_ms,
+        "auth_latency_ms": args.auth_latency_ms,
+        "pool_size": args.pool_size,
+        "replica": args.replica,
+        **result,
+    }), flush=True)
+
+
+if __name__ == "__main__":
+    main_cli()
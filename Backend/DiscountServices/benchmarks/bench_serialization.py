@@ -0,0 +1,91 @@
+"""
+Micro-benchmark: old vs new serialization of GET /discounts.
+
+old: the handler returns row dicts and FastAPI validates each through DiscountOut
+     (response_model=List[DiscountOut]) before json.dumps.
+new: the same row dicts rendered directly by FastJSONResponse.
+
+Run from DiscountServices/:  python -m benchmarks.bench_serialization [--rows 1000]
+Prints one JSON line with timings, and fails if the two paths produce different bytes.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from fast_json import FastJSONResponse
+from routers.discount import DISCOUNT_COLUMNS, DiscountOut
+
+
+def make_rows(count: int) -> List[dict]:
+    start = datetime(2024, 1, 1)
+    rows = []
+    for discount_id in range(count, 0, -1):
+        percentage = discount_id % 2 == 0
+        values = (
+            discount_id, f"Promo {discount_id}", "Seasonal promo", None if discount_id % 3 else "Spanish Latte",
+            "Percentage" if percentage else "Fixed",
+            Decimal("10.00") if percentage else None, None if percentage else Decimal("25.00"),
+            Decimal("150.00"), start + timedelta(days=discount_id), start + timedelta(days=discount_id + 30),
+            "manager01", "Active", start + timedelta(days=discount_id, microseconds=123000),
+        )
+        rows.append(dict(zip(DISCOUNT_COLUMNS, values)))
+    return rows
+
+
+_response_adapter = TypeAdapter(List[DiscountOut])
+
+
+def old_path(rows) -> bytes:
+    validated = _response_adapter.validate_python(rows)
+    return JSONResponse(jsonable_encoder(_response_adapter.dump_python(validated, mode="json"))).body
+
+
+def new_path(rows) -> bytes:
+    return FastJSONResponse(rows).body
+
+
+def timeit(fn, rows, repeat: int) -> dict:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(rows)
+        samples.append((time.perf_counter() - started) * 1000)
+    return {"median_ms": round(statistics.median(samples), 3), "min_ms": round(min(samples), 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    old_bytes, new_bytes = old_path(rows), new_path(rows)
+    if old_bytes != new_bytes:
+        raise SystemExit("Serialized output differs between the old and new paths.")
+
+    old, new = timeit(old_path, rows, args.repeat), timeit(new_path, rows, args.repeat)
+    print(json.dumps({
+        "benchmark": "discounts_serialization",
+        "rows": args.rows,
+        "bytes": len(new_bytes),
+        "old": old,
+        "new": new,
+        "speedup": round(old["median_ms"] / new["median_ms"], 2) if new["median_ms"] else None,
+    }))
+
+
+if __name__ == "__main__":
+    main()
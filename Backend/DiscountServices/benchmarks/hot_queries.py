@@ -0,0 +1,50 @@
+"""
+The discount service's hot SQL with sample parameters, for benchmarks/plan_check.py. Listing
+statements are built by the router's own helpers and the rest come from discount_repository.py,
+so the check always sees the SQL that ships.
+"""
+import json
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import List, NamedTuple, Sequence
+
+from discount_repository import (
+    SQL_GET_DISCOUNT, SQL_INSERT_DISCOUNT, SQL_UPDATE_DISCOUNT, SQL_DELETE_DISCOUNT, _write_params,
+    SQL_FIND_DISCOUNT_NAMES, SQL_UPSERT_DISCOUNTS, BULK_COLUMNS, _json_value,
+)
+from routers.discount import DISCOUNT_COLUMNS, _list_discounts_sql, _list_discounts_params
+
+
+class HotQuery(NamedTuple):
+    label: str
+    sql: str
+    params: Sequence = ()
+    allowed_scans: Sequence[str] = ()  # tables this statement reads whole by design
+
+
+def _listing(label: str, active_only: bool, after_id=None, limit=None, **kwargs) -> HotQuery:
+    return HotQuery(label, _list_discounts_sql(DISCOUNT_COLUMNS, active_only, after_id, limit),
+                    _list_discounts_params(after_id, limit), **kwargs)
+
+
+def hot_queries() -> List[HotQuery]:
+    now = datetime.now().replace(microsecond=0)
+    sample = {
+        "DiscountName": "Plan check promo", "Description": None, "ProductName": None, "DiscountType": "Percentage",
+        "PercentageValue": Decimal("10.00"), "FixedValue": None, "MinimumSpend": None,
+        "ValidFrom": now, "ValidTo": now + timedelta(days=30), "Status": "Active",
+    }
+    write_params = _write_params(sample, "plan-check")
+    return [
+        HotQuery("get by id", SQL_GET_DISCOUNT, [1]),
+        HotQuery("create", SQL_INSERT_DISCOUNT, write_params + [sample["DiscountName"]]),
+        HotQuery("update", SQL_UPDATE_DISCOUNT, write_params + [1]),
+        HotQuery("delete", SQL_DELETE_DISCOUNT, [1]),
+        HotQuery("bulk name lookup", SQL_FIND_DISCOUNT_NAMES, [json.dumps([sample["DiscountName"], "Senior Citizen"])]),
+        HotQuery("bulk upsert", SQL_UPSERT_DISCOUNTS,
+                 ["plan-check", json.dumps([[1] + [_json_value(sample[c]) for c in BULK_COLUMNS]])]),
+        _listing("list all", active_only=False, allowed_scans=["Discounts"]),
+        _listing("list page", active_only=False, after_id=1000000, limit=50),
+        _listing("list active", active_only=True),
+        _listing("list active page", active_only=True, after_id=1000000, limit=50),
+    ]
@@ -0,0 +1,133 @@
+"""
+Plan check for the service's hot SQL (benchmarks/hot_queries.py): asks the database configured
+in database.py for the estimated plan of each statement (SET SHOWPLAN_XML ON, so nothing is
+executed) and flags the ones that read a whole table or index.
+
+Scans of a filtered index are not flagged, since the filter already is the working set.
+Tables that a statement reads whole by design are listed in its `allowed_scans`. On a nearly
+empty local database the optimizer may prefer a scan to a perfectly good index, so each
+finding shows the table's cardinality; --min-table-rows ignores scans of smaller tables.
+
+Run from the service directory against a migrated database (python migrations.py apply):
+    python -m benchmarks.plan_check [--min-table-rows 0]
+Prints one JSON line per statement and a summary line; exits 1 when a scan was flagged.
+
+The file is shared verbatim by SalesServices/benchmarks and DiscountServices/benchmarks.
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from decimal import Decimal
+from typing import List, Sequence
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import init_db_pool, close_db_pool, acquire_connection
+from benchmarks.hot_queries import hot_queries
+
+SHOWPLAN_NS = {"p": "http://schemas.microsoft.com/sqlserver/2004/07/showplan"}
+SCAN_OPERATORS = {"Table Scan", "Clustered Index Scan", "Index Scan"}
+
+
+# --- Plans ---
+
+_STRING_LITERAL = re.compile(r"('(?:[^']|'')*')")
+
+
+def _literal(value) -> str:
+    if value is None:
+        return "NULL"
+    if isinstance(value, bytes):
+        return "0x" + value.hex()
+    if isinstance(value, (int, Decimal)):
+        return str(value)
+    if isinstance(value, datetime):
+        return f"'{value.isoformat(sep=' ', timespec='milliseconds')}'"
+    return "N'" + str(value).replace("'", "''") + "'"
+
+
+def inline_params(sql: str, params: Sequence) -> str:
+    """Replaces each ? outside string literals with the next sample value as a T-SQL literal,
+    so the statement can be sent as one plain batch while SHOWPLAN_XML is on."""
+    values = iter(params)
+    parts = _STRING_LITERAL.split(sql)
+    for i in range(0, len(parts), 2):
+        parts[i] = re.sub(r"\?", lambda _: _literal(next(values)), parts[i])
+    return "".join(parts)
+
+
+def find_scans(plan_xml: str) -> List[dict]:
+    scans = []
+    for relop in ET.fromstring(plan_xml).iter(f"{{{SHOWPLAN_NS['p']}}}RelOp"):
+        if relop.get("PhysicalOp") not in SCAN_OPERATORS:
+            continue
+        obj = relop.find(".//p:Object", SHOWPLAN_NS)
+        if obj is None or obj.get("Filtered") in ("1", "true"):
+            continue
+        scans.append({
+            "operator": relop.get("PhysicalOp"),
+            "table": (obj.get("Table") or "").strip("[]"),
+            "index": (obj.get("Index") or "").strip("[]") or None,
+            "table_rows": float(relop.get("TableCardinality") or 0),
+            "estimated_rows": float(relop.get("EstimateRows") or 0),
+        })
+    return scans
+
+
+async def explain(cursor, sql: str) -> List[str]:
+    """The estimated plan of every statement in `sql`, one XML document each."""
+    await cursor.execute(sql)
+    plans = []
+    while True:
+        row = await cursor.fetchone()
+        if row is not None:
+            plans.append(row[0])
+        if not await cursor.nextset():
+            return plans
+
+
+async def check(min_table_rows: float) -> int:
+    flagged = 0
+    async with acquire_connection() as conn:
+        async with conn.cursor() as cursor:
+            await cursor.execute("SET SHOWPLAN_XML ON")
+            try:
+                for query in hot_queries():
+                    scans = []
+                    for plan in await explain(cursor, inline_params(query.sql, query.params)):
+                        scans += find_scans(plan)
+                    findings = [
+                        scan for scan in scans
+                        if scan["table"] not in query.allowed_scans and scan["table_rows"] >= min_table_rows
+                    ]
+                    flagged += bool(findings)
+                    print(json.dumps({"statement": query.label, "ok": not findings, "scans": findings}), flush=True)
+            finally:
+                await cursor.execute("SET SHOWPLAN_XML OFF")
+    return flagged
+
+
+async def run(args) -> int:
+    await init_db_pool()
+    try:
+        flagged = await check(args.min_table_rows)
+    finally:
+        await close_db_pool()
+    print(json.dumps({"benchmark": "plan_check", "statements": len(hot_queries()), "flagged": flagged}))
+    return 1 if flagged else 0
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--min-table-rows", type=float, default=0,
+                        help="Ignore scans of tables with fewer rows than this.")
+    sys.exit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main_cli()
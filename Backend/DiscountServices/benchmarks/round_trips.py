@@ -0,0 +1,100 @@
+"""
+Database round trips per endpoint, counted against the in-memory stand-in database
+(benchmarks/stand_ins.py: every statement, commit and rollback is one round trip).
+Each case is sent once and compared with its budget.
+
+Run from DiscountServices/:  python -m benchmarks.round_trips
+Prints one JSON line per case; exits 1 if any case goes over its budget or gets an unexpected status.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+from typing import NamedTuple, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_load import stand_in_service
+
+NEW_DISCOUNT = {
+    "DiscountName": "Round trip promo", "Description": "Counted", "ProductName": None,
+    "DiscountType": "Percentage", "PercentageValue": "10.00", "FixedValue": None, "MinimumSpend": "100.00",
+    "ValidFrom": "2026-01-01T00:00:00", "ValidTo": "2026-12-31T00:00:00", "Status": "Active",
+}
+MISSING_ID = 999999
+
+
+class Case(NamedTuple):
+    label: str
+    method: str
+    path: str
+    status: int
+    budget: int
+    body: object = None
+    csv: Optional[str] = None  # sent as text/csv instead of `body`
+
+
+BULK_CSV = (
+    "DiscountName,DiscountType,PercentageValue,FixedValue,ValidFrom,ValidTo,Status\n"
+    + "".join(f"CSV promo {n},Fixed,,{n}.00,2026-01-01T00:00:00,2026-12-31T00:00:00,Active\n" for n in range(1, 51))
+)
+
+
+def cases(existing_id: int) -> list:
+    renamed = {**NEW_DISCOUNT, "DiscountName": "Round trip promo (renamed)"}
+    bulk = [{**NEW_DISCOUNT, "DiscountName": f"Bulk promo {n}"} for n in range(1, 51)]
+    bulk += [{**NEW_DISCOUNT, "DiscountName": "Promo 2"}, {**NEW_DISCOUNT, "DiscountName": "Bulk invalid", "PercentageValue": None}]
+    return [
+        Case("create", "POST", "/discounts/", 201, 1, NEW_DISCOUNT),
+        Case("create duplicate name", "POST", "/discounts/", 400, 1, NEW_DISCOUNT),
+        Case("get by id", "GET", f"/discounts/{existing_id}", 200, 1),
+        Case("get missing", "GET", f"/discounts/{MISSING_ID}", 404, 1),
+        Case("update", "PUT", f"/discounts/{existing_id}", 200, 1, renamed),
+        Case("update missing", "PUT", f"/discounts/{MISSING_ID}", 404, 1, renamed),
+        Case("delete", "DELETE", f"/discounts/{existing_id}", 200, 1),
+        Case("delete missing", "DELETE", f"/discounts/{MISSING_ID}", 404, 1),
+        Case("list page", "GET", "/discounts/?limit=50", 200, 1),
+        # Name lookup, MERGE, commit: the same for 52 rows as for one.
+        Case("bulk import (JSON, 52 rows)", "POST", "/discounts/bulk", 200, 3, bulk),
+        Case("bulk import (CSV, 50 rows)", "POST", "/discounts/bulk?mode=create", 200, 3, csv=BULK_CSV),
+    ]
+
+
+async def run(args) -> bool:
+    ok = True
+    async with stand_in_service(args) as (client, db, user_service):
+        headers = {"Authorization": "Bearer round-trip-token"}
+        for case in cases(existing_id=1):
+            before = db.round_trips
+            if case.csv is not None:
+                response = await client.request(case.method, case.path, content=case.csv,
+                                                headers={**headers, "Content-Type": "text/csv"})
+            else:
+                response = await client.request(case.method, case.path, json=case.body, headers=headers)
+            used = db.round_trips - before
+            passed = response.status_code == case.status and used <= case.budget
+            ok &= passed
+            print(json.dumps({
+                "benchmark": "round_trips", "case": case.label, "method": case.method, "path": case.path,
+                "status": response.status_code, "round_trips": used, "budget": case.budget, "ok": passed,
+            }), flush=True)
+    return ok
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--discounts", type=int, default=100, help="Seeded Discounts rows.")
+    args = parser.parse_args()
+    # stand_in_service's knobs; latency does not change the counts
+    args.db_latency_ms = args.auth_latency_ms = 0.0
+    args.pool_size = 2
+
+    # Cache invalidation calls to the sales service have no stand-in and only log a warning.
+    logging.disable(logging.WARNING)
+    sys.exit(0 if asyncio.run(run(args)) else 1)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,22 @@
+import logging
+import os
+
+from http_client import get_http_client
+
+logger = logging.getLogger(__name__)
+
+# SalesServices keeps an in-memory catalog of active discounts. It also polls for changes,
+# so a failed notification only delays the refresh until its next check.
+SALES_SERVICE_URL = os.getenv("SALES_SERVICE_URL", "http://localhost:9000")
+DISCOUNT_CATALOG_REFRESH_URL = f"{SALES_SERVICE_URL}/auth/sales/discount-catalog/refresh"
+
+
+async def invalidate_discount_caches(token: str):
+    """Tells SalesServices to reload its discount catalog. Run once per write, after commit."""
+    try:
+        response = await get_http_client().post(
+            DISCOUNT_CATALOG_REFRESH_URL, headers={"Authorization": f"Bearer {token}"}
+        )
+        response.raise_for_status()
+    except Exception as e:
+        logger.warning(f"Could not invalidate the sales discount catalog: {e}")
@@ -0,0 +1,208 @@
+import json
+import re
+from contextlib import contextmanager
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+# Data access for the Discounts table. Every operation is a single statement: writes return
+# the affected row through OUTPUT INSERTED/DELETED instead of a check before and a read-back
+# after, and constraint violations raised by SQL Server are mapped to the errors below.
+# Statement text never depends on the input, so each one has exactly one cached plan.
+
+DISCOUNT_COLUMNS = (
+    "DiscountID", "DiscountName", "Description", "ProductName", "DiscountType", "PercentageValue",
+    "FixedValue", "MinimumSpend", "ValidFrom", "ValidTo", "Username", "Status", "CreatedAt",
+)
+# Written by create and update, in parameter order.
+WRITE_COLUMNS = (
+    "DiscountName", "Description", "ProductName", "DiscountType", "PercentageValue", "FixedValue",
+    "MinimumSpend", "ValidFrom", "ValidTo", "Username", "Status",
+)
+
+
+def _output(prefix: str) -> str:
+    return ", ".join(f"{prefix}.{column}" for column in DISCOUNT_COLUMNS)
+
+
+SQL_GET_DISCOUNT = f"SELECT {', '.join(DISCOUNT_COLUMNS)} FROM Discounts WHERE DiscountID = ?"
+
+# The name check and the insert are one statement; UPDLOCK + HOLDLOCK on the probe keeps two
+# concurrent creates of the same name from both passing it. No row back means the name is taken.
+SQL_INSERT_DISCOUNT = f"""
+    INSERT INTO Discounts ({', '.join(WRITE_COLUMNS)})
+    OUTPUT {_output('INSERTED')}
+    SELECT {', '.join('?' for _ in WRITE_COLUMNS)}
+    WHERE NOT EXISTS (SELECT 1 FROM Discounts WITH (UPDLOCK, HOLDLOCK) WHERE DiscountName = ?)
+"""
+
+SQL_UPDATE_DISCOUNT = f"""
+    UPDATE Discounts SET {', '.join(f'{column} = ?' for column in WRITE_COLUMNS)}
+    OUTPUT {_output('INSERTED')}
+    WHERE DiscountID = ?
+"""
+
+SQL_DELETE_DISCOUNT = "DELETE FROM Discounts OUTPUT DELETED.DiscountID WHERE DiscountID = ?"
+
+# --- Bulk import: one name lookup and one MERGE, whatever the number of rows ---
+# Both take their rows as one JSON document, so the statement text and parameter count
+# never change with the batch size. Run inside one transaction: the lookup's UPDLOCK +
+# HOLDLOCK keeps the names it saw (present or absent) stable until the MERGE commits.
+SQL_FIND_DISCOUNT_NAMES = """
+    SELECT d.DiscountID, d.DiscountName
+    FROM OPENJSON(?) WITH (DiscountName NVARCHAR(255) '$') AS j
+    JOIN Discounts AS d WITH (UPDLOCK, HOLDLOCK) ON d.DiscountName = j.DiscountName
+"""
+
+# Parameters: Username, then the rows as [RowIndex, DiscountName, ..., Status] in BULK_COLUMNS
+# order. DATETIME2 accepts Python's microsecond ISO strings; the DATETIME columns round them.
+BULK_COLUMNS = tuple(column for column in WRITE_COLUMNS if column != "Username")
+SQL_UPSERT_DISCOUNTS = f"""
+    DECLARE @Username NVARCHAR(100) = ?;
+    MERGE INTO Discounts WITH (HOLDLOCK) AS t
+    USING (
+        SELECT * FROM OPENJSON(?) WITH (
+            RowIndex INT '$[0]',
+            DiscountName NVARCHAR(255) '$[1]',
+            Description NVARCHAR(1000) '$[2]',
+            ProductName NVARCHAR(255) '$[3]',
+            DiscountType VARCHAR(20) '$[4]',
+            PercentageValue DECIMAL(5, 2) '$[5]',
+            FixedValue DECIMAL(18, 2) '$[6]',
+            MinimumSpend DECIMAL(18, 2) '$[7]',
+            ValidFrom DATETIME2 '$[8]',
+            ValidTo DATETIME2 '$[9]',
+            Status VARCHAR(20) '$[10]'
+        )
+    ) AS src
+    ON t.DiscountName = src.DiscountName
+    WHEN MATCHED THEN
+        UPDATE SET {', '.join(f'{column} = src.{column}' for column in BULK_COLUMNS)}, Username = @Username
+    WHEN NOT MATCHED THEN
+        INSERT ({', '.join(WRITE_COLUMNS)})
+        VALUES ({', '.join('@Username' if column == 'Username' else f'src.{column}' for column in WRITE_COLUMNS)})
+    OUTPUT src.RowIndex, $action, INSERTED.DiscountID;
+"""
+
+# SQL Server error numbers, which the ODBC driver puts in the message as "... (2627)".
+UNIQUE_VIOLATIONS = {2601, 2627}
+FOREIGN_KEY_VIOLATION = 547
+_ERROR_NUMBER = re.compile(r"\((\d+)\)")
+
+
+class DiscountRepositoryError(Exception):
+    pass
+
+
+class DiscountNotFoundError(DiscountRepositoryError):
+    def __init__(self, discount_id: int):
+        super().__init__(f"Discount ID {discount_id} not found.")
+        self.discount_id = discount_id
+
+
+class DuplicateDiscountNameError(DiscountRepositoryError):
+    def __init__(self, name: str):
+        super().__init__(f"Discount name '{name}' already exists.")
+        self.name = name
+
+
+class DiscountInUseError(DiscountRepositoryError):
+    def __init__(self, discount_id: int):
+        super().__init__(f"Cannot delete discount ID {discount_id} as it is currently applied to one or more sales.")
+        self.discount_id = discount_id
+
+
+def constraint_error_numbers(error: Exception) -> set:
+    """The SQL Server error numbers of an integrity-constraint violation (SQLSTATE 23000), else empty."""
+    args = getattr(error, "args", ())
+    if not args or args[0] != "23000":
+        return set()
+    return {int(number) for number in _ERROR_NUMBER.findall(str(error))}
+
+
+@contextmanager
+def _map_constraint_errors(name: Optional[str] = None, discount_id: Optional[int] = None):
+    try:
+        yield
+    except Exception as e:
+        numbers = constraint_error_numbers(e)
+        if numbers & UNIQUE_VIOLATIONS and name is not None:
+            raise DuplicateDiscountNameError(name) from e
+        if FOREIGN_KEY_VIOLATION in numbers and discount_id is not None:
+            raise DiscountInUseError(discount_id) from e
+        raise
+
+
+def _write_params(discount: dict, username: str) -> list:
+    return [username if column == "Username" else discount.get(column) for column in WRITE_COLUMNS]
+
+
+def _as_dict(row) -> dict:
+    return dict(zip(DISCOUNT_COLUMNS, row))
+
+
+async def get_discount(cursor, discount_id: int) -> dict:
+    await cursor.execute(SQL_GET_DISCOUNT, discount_id)
+    row = await cursor.fetchone()
+    if not row:
+        raise DiscountNotFoundError(discount_id)
+    return _as_dict(row)
+
+
+async def insert_discount(cursor, discount: dict, username: str) -> dict:
+    """`discount` holds the WRITE_COLUMNS fields (Username aside), e.g. a DiscountCreate's model_dump()."""
+    name = discount["DiscountName"]
+    with _map_constraint_errors(name=name):
+        await cursor.execute(SQL_INSERT_DISCOUNT, *_write_params(discount, username), name)
+        row = await cursor.fetchone()
+    if not row:
+        raise DuplicateDiscountNameError(name)
+    return _as_dict(row)
+
+
+async def update_discount(cursor, discount_id: int, discount: dict, username: str) -> dict:
+    with _map_constraint_errors(name=discount["DiscountName"]):
+        await cursor.execute(SQL_UPDATE_DISCOUNT, *_write_params(discount, username), discount_id)
+        row = await cursor.fetchone()
+    if not row:
+        raise DiscountNotFoundError(discount_id)
+    return _as_dict(row)
+
+
+async def delete_discount(cursor, discount_id: int):
+    with _map_constraint_errors(discount_id=discount_id):
+        await cursor.execute(SQL_DELETE_DISCOUNT, discount_id)
+        row = await cursor.fetchone()
+    if not row:
+        raise DiscountNotFoundError(discount_id)
+
+
+def _json_value(value):
+    # Decimals as strings so OPENJSON converts them without float rounding; datetimes as naive
+    # ISO strings, as pyodbc sends them on the single-row paths.
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None).isoformat()
+    return value
+
+
+async def find_discount_names(cursor, names: List[str]) -> Dict[str, int]:
+    """{DiscountName: DiscountID} for the given names that already exist, in one lookup."""
+    if not names:
+        return {}
+    await cursor.execute(SQL_FIND_DISCOUNT_NAMES, json.dumps(names))
+    return {row.DiscountName: row.DiscountID for row in await cursor.fetchall()}
+
+
+async def upsert_discounts(cursor, discounts: Dict[int, dict], username: str) -> Dict[int, tuple]:
+    """
+    Inserts or updates (matched on DiscountName) every discount in one MERGE. `discounts` maps
+    the caller's row index to the BULK_COLUMNS fields; returns {row index: (action, DiscountID)}
+    with action 'INSERT' or 'UPDATE'.
+    """
+    if not discounts:
+        return {}
+    rows = [[index] + [_json_value(discount.get(column)) for column in BULK_COLUMNS] for index, discount in discounts.items()]
+    await cursor.execute(SQL_UPSERT_DISCOUNTS, username, json.dumps(rows, separators=(",", ":")))
+    return {row[0]: (row[1], row[2]) for row in await cursor.fetchall()}
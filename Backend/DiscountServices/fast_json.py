@@ -0,0 +1,14 @@
+from fastapi.responses import JSONResponse
+from pydantic_core import to_json
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered by pydantic-core. Handlers return payloads they already built from
+    trusted rows (plain dicts in the response model's field order), so nothing is validated a
+    second time; Decimal, datetime and nested containers are encoded natively. The output is
+    compact UTF-8, the same bytes FastAPI's default JSONResponse produces for these payloads.
+    """
+
+    def render(self, content) -> bytes:
+        return to_json(content)
@@ -0,0 +1,61 @@
+import httpx
+import logging
+import os
+
+from metrics import METRICS_ENABLED, InstrumentedTransport, Gauge
+
+logger = logging.getLogger(__name__)
+
+# One keep-alive client is shared by every router and background job, so calls to the
+# auth and inventory services reuse open connections instead of handshaking each time.
+HTTP_TIMEOUT_SECONDS = float(os.getenv("HTTP_TIMEOUT_SECONDS", "5"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "50"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+
+_client = None
+
+
+async def init_http_client(transport=None):
+    """`transport` routes requests somewhere other than the network (the benchmarks' stand-in services)."""
+    global _client
+    if _client is None:
+        if transport is None:
+            transport = httpx.AsyncHTTPTransport(limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            ))
+        if METRICS_ENABLED:
+            transport = InstrumentedTransport(transport)
+        _client = httpx.AsyncClient(transport=transport, timeout=HTTP_TIMEOUT_SECONDS)
+    return _client
+
+
+async def close_http_client():
+    global _client
+    if _client is not None:
+        client, _client = _client, None
+        await client.aclose()
+
+
+def get_http_client() -> httpx.AsyncClient:
+    if _client is None:
+        raise RuntimeError("HTTP client is not initialised. Call init_http_client() on startup.")
+    return _client
+
+
+def _connection_counts() -> dict:
+    # The httpcore pool behind the default transport; stand-in transports have none.
+    transport = getattr(_client, "_transport", None)
+    transport = getattr(transport, "transport", transport)
+    pool = getattr(transport, "_pool", None)
+    if pool is None:
+        return {}
+    connections = pool.connections
+    idle = sum(1 for c in connections if c.is_idle())
+    return {("open",): len(connections), ("idle",): idle, ("in_use",): len(connections) - idle}
+
+
+HTTP_CLIENT_CONNECTIONS = Gauge(
+    "http_client_connections", "Keep-alive connections to other services by state.", ["state"],
+    collect=_connection_counts,
+)
@@ -0,0 +1,220 @@
+"""
+Product image processing. An upload is stored once under the hash of its bytes, next to
+resized variants (IMAGE_WIDTHS, never wider than the original) in AVIF and WebP when this
+Pillow build can write them, plus JPEG (or PNG when the image has transparency) for older
+clients. Variants are rendered at upload time in a process pool, so resizing never runs on
+the event loop, and a file is never rewritten once its manifest exists: the URLs can be
+cached forever.
+
+    uploads/images/<digest>/manifest.json
+    uploads/images/<digest>/orig.jpg, w160.avif, w160.webp, w160.jpg, w320.avif, ...
+
+    python image_pipeline.py import uploads/photo.jpg ...   # process existing files
+"""
+import argparse
+import asyncio
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from PIL import Image, ImageOps, UnidentifiedImageError, features
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+IMAGE_DIR = os.path.join(UPLOAD_DIR, "images")
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+IMAGE_WIDTHS = tuple(sorted(int(w) for w in os.getenv("IMAGE_WIDTHS", "160,320,640,1280").split(",")))
+MAX_IMAGE_UPLOAD_BYTES = int(os.getenv("MAX_IMAGE_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", "40000000"))  # larger images are refused, not decoded
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+DIGEST_LENGTH = 32
+DIGEST_PATTERN = re.compile(rf"^[0-9a-f]{{{DIGEST_LENGTH}}}$")
+
+# Preferred first: a client gets the first of these its Accept header allows.
+MODERN_FORMATS = [fmt for fmt in ("avif", "webp") if features.check(fmt)]
+SOURCE_FORMATS = {"JPEG": "jpg", "PNG": "png", "WEBP": "webp"}
+MEDIA_TYPES = {"avif": "image/avif", "webp": "image/webp", "jpg": "image/jpeg", "png": "image/png"}
+_ENCODERS = {
+    "avif": ("AVIF", {"quality": 60}),
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+    "png": ("PNG", {"optimize": True}),
+}
+
+
+class InvalidImageError(ValueError):
+    pass
+
+
+def content_digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:DIGEST_LENGTH]
+
+
+def _write_file(directory: str, name: str, data: bytes) -> dict:
+    path = os.path.join(directory, name)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+    os.replace(temp_path, path)  # readers never see a partial file
+    return {"file": name, "bytes": len(data), "etag": content_digest(data)}
+
+
+def render_variants(data: bytes, directory: str) -> dict:
+    """Runs in a pool worker: decodes the upload, writes the original and every variant, then the manifest."""
+    Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+    warnings.simplefilter("error", Image.DecompressionBombWarning)
+    try:
+        with Image.open(io.BytesIO(data)) as source:
+            source_format = SOURCE_FORMATS.get(source.format)
+            if source_format is None:
+                raise InvalidImageError(f"Unsupported image format: {source.format}. Use JPEG, PNG or WebP.")
+            image = ImageOps.exif_transpose(source)  # phone photos carry their rotation in EXIF
+            image.load()
+    except (Image.DecompressionBombError, Image.DecompressionBombWarning):
+        raise InvalidImageError(f"Images are limited to {MAX_IMAGE_PIXELS} pixels.")
+    except (UnidentifiedImageError, OSError):
+        raise InvalidImageError("Not a readable image. Use JPEG, PNG or WebP.")
+
+    has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+    image = image.convert("RGBA" if has_alpha else "RGB")
+    fallback_format = "png" if has_alpha else "jpg"
+
+    os.makedirs(directory, exist_ok=True)
+    original = _write_file(directory, f"orig.{source_format}", data)
+    original.update(width=image.width, height=image.height, format=source_format)
+    files = [original]
+    for width in sorted({w for w in IMAGE_WIDTHS if w < image.width} | {image.width}):
+        height = max(1, round(image.height * width / image.width))
+        resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+        for fmt in MODERN_FORMATS + [fallback_format]:
+            encoder, options = _ENCODERS[fmt]
+            buffer = io.BytesIO()
+            resized.save(buffer, encoder, **options)
+            entry = _write_file(directory, f"w{width}.{fmt}", buffer.getvalue())
+            entry.update(width=width, height=height, format=fmt)
+            files.append(entry)
+
+    manifest = {"width": image.width, "height": image.height, "files": files}
+    # Written last: its presence means every file above is complete.
+    _write_file(directory, "manifest.json", json.dumps(manifest).encode())
+    return manifest
+
+
+def _accepts(accept: str, media_type: str) -> bool:
+    for part in accept.split(","):
+        value, _, params = part.strip().partition(";")
+        if value.strip() == media_type and "q=0" not in params.replace(" ", "").split(";"):
+            return True
+    return False
+
+
+def choose_variant(manifest: dict, width: Optional[int], fmt: Optional[str], accept: str) -> Optional[dict]:
+    """
+    The resized file to serve: the narrowest variant at least `width` wide (the full-size one
+    when none is, or when no width is asked for), in `fmt` if given, otherwise in the first
+    modern format the Accept header allows, falling back to JPEG/PNG.
+    """
+    variants = [f for f in manifest["files"] if f["file"].startswith("w")]
+    widths = sorted({f["width"] for f in variants})
+    if not widths:
+        return None
+    target = widths[-1] if width is None else next((w for w in widths if w >= width), widths[-1])
+    by_format = {f["format"]: f for f in variants if f["width"] == target}
+    if fmt is not None:
+        return by_format.get(fmt)
+    for candidate in MODERN_FORMATS:
+        if candidate in by_format and _accepts(accept, MEDIA_TYPES[candidate]):
+            return by_format[candidate]
+    return by_format.get("png") or by_format.get("jpg")
+
+
+class ImagePipeline:
+    def __init__(self):
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._manifests: Dict[str, dict] = {}  # digest -> manifest; files never change, so never stale
+        self.stats = {"uploads": 0, "deduplicated": 0, "rendered": 0, "rejected": 0, "variants_written": 0}
+
+    def start(self):
+        os.makedirs(IMAGE_DIR, exist_ok=True)
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+
+    async def stop(self):
+        if self._executor is not None:
+            executor, self._executor = self._executor, None
+            await asyncio.to_thread(executor.shutdown, True, cancel_futures=True)
+
+    def directory(self, digest: str) -> str:
+        return os.path.join(IMAGE_DIR, digest)
+
+    def manifest(self, digest: str) -> Optional[dict]:
+        """The stored manifest for a digest, or None when no complete upload has that hash."""
+        manifest = self._manifests.get(digest)
+        if manifest is None and DIGEST_PATTERN.match(digest):
+            try:
+                with open(os.path.join(self.directory(digest), "manifest.json"), "rb") as f:
+                    manifest = self._manifests[digest] = json.load(f)
+            except FileNotFoundError:
+                return None
+        return manifest
+
+    async def process(self, data: bytes) -> tuple:
+        """Stores an upload and its variants. Returns (digest, manifest); re-uploads are free."""
+        self.stats["uploads"] += 1
+        digest = content_digest(data)
+        manifest = self.manifest(digest)
+        if manifest is not None:
+            self.stats["deduplicated"] += 1
+            return digest, manifest
+        self.start()
+        try:
+            manifest = await asyncio.get_running_loop().run_in_executor(
+                self._executor, render_variants, data, self.directory(digest)
+            )
+        except InvalidImageError:
+            self.stats["rejected"] += 1
+            raise
+        self._manifests[digest] = manifest
+        self.stats["rendered"] += 1
+        self.stats["variants_written"] += len(manifest["files"]) - 1
+        logger.info(f"Stored image {digest} with {len(manifest['files']) - 1} variants.")
+        return digest, manifest
+
+    def get_stats(self) -> dict:
+        return {
+            "workers": IMAGE_WORKERS,
+            "widths": list(IMAGE_WIDTHS),
+            "formats": MODERN_FORMATS,
+            "cached_manifests": len(self._manifests),
+            **self.stats,
+        }
+
+
+image_pipeline = ImagePipeline()
+
+
+async def _import(paths: List[str]):
+    try:
+        for path in paths:
+            with open(path, "rb") as f:
+                digest, manifest = await image_pipeline.process(f.read())
+            print(f"{path} -> /uploads/images/{digest} ({len(manifest['files']) - 1} variants)")
+    finally:
+        await image_pipeline.stop()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Product image processing.")
+    parser.add_argument("command", choices=["import"])
+    parser.add_argument("paths", nargs="+")
+    args = parser.parse_args()
+    asyncio.run(_import(args.paths))
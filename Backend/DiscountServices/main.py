@@ -1,18 +1,50 @@
 # main.py
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 import os
+from urllib.parse import parse_qs
+
+
+from routers import discount, uploads
+from database import init_db_pool, close_db_pool, get_pool_stats, get_replica_stats
+from http_client import init_http_client, close_http_client
+from migrations import apply_migrations
+import lifecycle
+from image_pipeline import image_pipeline
+from admission import (
+    ADMISSION_ENABLED, ADMISSION_REPORT_CONCURRENCY, AdmissionMiddleware, get_admission_stats, route_limit,
+    PRIORITY_WRITE, PRIORITY_READ, PRIORITY_REPORT,
+)
+from metrics import (
+    METRICS_ENABLED, MetricsMiddleware, render_metrics, snapshot_writer, CONTENT_TYPE as METRICS_CONTENT_TYPE,
+)
 
 
-from routers import discount
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await init_db_pool()
+    await init_http_client()
+    await apply_migrations()
+    image_pipeline.start()
+    snapshot_writer.start()
+    lifecycle.mark_ready()
+    yield
+    lifecycle.mark_draining()
+    await image_pipeline.stop()
+    await close_http_client()
+    await close_db_pool()
+    await snapshot_writer.stop()
 
 
 app = FastAPI(
     title="My POS System API",
     description="API for managing POS operations including discounts, products, etc.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 
@@ -20,7 +52,32 @@ app = FastAPI(
 
 
 app.include_router(discount.router_discounts)
+# Before the /uploads mount, which keeps serving files uploaded before the image pipeline
+app.include_router(uploads.router_uploads)
+
+# Admission control: discount changes first, then the tills' lookups (GET /discounts?active_only=true,
+# GET /discounts/{id}); only the admin listing shapes are capped as reports.
+ADMIN_LISTING_PARAMS = {"limit", "after_id", "fields", "stream"}
+
 
+def _is_admin_listing(scope) -> bool:
+    if scope["path"].rstrip("/") != "/discounts":
+        return False
+    params = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    active_only = params.get("active_only", ["false"])[-1].lower() in ("true", "1", "yes", "on")
+    return not active_only or bool(ADMIN_LISTING_PARAMS & params.keys())
+
+
+ADMISSION_LIMITS = [
+    route_limit("discount write", "/discounts", PRIORITY_WRITE, methods=["POST", "PUT", "DELETE"], queue_timeout=5.0),
+    route_limit("discount listing", "/discounts", PRIORITY_REPORT, methods=["GET"], when=_is_admin_listing,
+                max_concurrency=ADMISSION_REPORT_CONCURRENCY, queue_timeout=1.0),
+    route_limit("discount lookup", "/discounts", PRIORITY_READ),
+]
+
+# Inside CORS, so a 503 from admission control still carries the CORS headers the browser needs
+if ADMISSION_ENABLED:
+    app.add_middleware(AdmissionMiddleware, limits=ADMISSION_LIMITS)
 
 app.add_middleware(
     CORSMiddleware,
@@ -40,6 +97,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outermost, so the timings include CORS handling
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 UPLOAD_DIR_NAME = "uploads" 
 os.makedirs(UPLOAD_DIR_NAME, exist_ok=True)
 app.mount(f"/{UPLOAD_DIR_NAME}", StaticFiles(directory=UPLOAD_DIR_NAME), name=UPLOAD_DIR_NAME)
@@ -48,7 +109,44 @@ app.mount(f"/{UPLOAD_DIR_NAME}", StaticFiles(directory=UPLOAD_DIR_NAME), name=UP
 async def read_root():
     return {"message": "Welcome to the POS System API. Visit /docs for API documentation."}
 
+# Liveness: the worker's event loop is answering
+@app.get("/health/live", tags=["Root"])
+async def read_liveness():
+    return {"status": "alive"}
+
+# Readiness: 503 while the worker is warming up or draining, so load balancers skip it
+@app.get("/health/ready", tags=["Root"])
+async def read_readiness():
+    if not lifecycle.is_ready():
+        return JSONResponse(status_code=503, content={"status": lifecycle.get_state()})
+    return {"status": "ready"}
+
+@app.get("/health/db-pool", tags=["Root"])
+async def read_db_pool_stats():
+    return get_pool_stats()
+
+# Replica lag, read-your-writes pins and where read-intent connections went
+@app.get("/health/db-replica", tags=["Root"])
+async def read_db_replica_stats():
+    return get_replica_stats()
+
+# Admission slots in use, queue depth and shed requests
+@app.get("/health/admission", tags=["Root"])
+async def read_admission_stats():
+    return get_admission_stats()
+
+# Image workers, formats and upload counts
+@app.get("/health/image-pipeline", tags=["Root"])
+async def read_image_pipeline_stats():
+    return image_pipeline.get_stats()
+
+# Prometheus scrape target: request, SQL statement and outbound call timings
+@app.get("/metrics", tags=["Root"], response_class=PlainTextResponse)
+def read_metrics():
+    return PlainTextResponse(render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
 
+# Dev server with reload; production uses serve.py
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", port=9002, host="127.0.0.1", reload=True)
\ No newline at end of file
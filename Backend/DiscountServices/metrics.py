@@ -0,0 +1,426 @@
+import asyncio
+import bisect
+import json
+import logging
+import os
+import re
+import time
+from functools import lru_cache
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Prometheus metrics kept in plain dicts: this process is single-threaded asyncio, so a
+# sample is one dict update and no locking is needed.
+#
+# serve.py's workers share one listening socket, so a scrape reaches whichever worker accepts
+# it. With several workers serve.py sets METRICS_MULTIPROC_DIR: every worker writes its samples
+# to <dir>/<pid>.json every METRICS_FLUSH_SECONDS, and /metrics on any worker adds up all the
+# files, so each scrape reports the whole service. Counters and histograms of workers that
+# exited stay in the sum, so totals never go backwards; gauges only count from workers that
+# flushed recently. Without the directory, /metrics reports this process alone.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1").lower() not in ("0", "false", "no")
+METRICS_MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR")
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "5"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_registry = []
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        _registry.append(self)
+
+    def render(self, values: Optional[dict] = None) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines += self._sample_lines(self.values() if values is None else values)
+        return "\n".join(lines)
+
+    def values(self) -> dict:
+        """This process's samples, {label values: value}, as a copy."""
+        return dict(self._values)
+
+    def merge(self, total: dict, values: dict):
+        """Adds another worker's samples into `total`."""
+        for labels, value in values.items():
+            total[labels] = total.get(labels, 0) + value
+
+    def _sample_lines(self, values: dict):
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {v}" for k, v in values.items()]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    """
+    A gauge set by the code, or read at scrape time from `collect` ({label values: value}).
+    Across workers the values are summed, or with aggregate="max" the largest one is kept.
+    """
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), collect: Optional[Callable[[], Dict[tuple, float]]] = None,
+                 aggregate: str = "sum"):
+        super().__init__(name, documentation, labelnames)
+        if aggregate not in ("sum", "max"):
+            raise ValueError("aggregate must be 'sum' or 'max'.")
+        self._values: Dict[tuple, float] = {}
+        self._collect = collect
+        self._aggregate = aggregate
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) - amount
+
+    def set(self, value: float, *labels):
+        self._values[labels] = value
+
+    def values(self) -> dict:
+        if self._collect is None:
+            return dict(self._values)
+        try:
+            return dict(self._collect())
+        except Exception as e:
+            logger.warning(f"Collecting {self.name} failed: {e}")
+            return {}
+
+    def merge(self, total: dict, values: dict):
+        if self._aggregate == "sum":
+            return super().merge(total, values)
+        for labels, value in values.items():
+            total[labels] = max(total[labels], value) if labels in total else value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        self._series: Dict[tuple, list] = {}  # labels -> [per-bucket counts..., +Inf count, sum]
+
+    def observe(self, value: float, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def values(self) -> dict:
+        return {labels: list(series) for labels, series in self._series.items()}
+
+    def merge(self, total: dict, values: dict):
+        for labels, series in values.items():
+            mine = total.get(labels)
+            total[labels] = list(series) if mine is None else [a + b for a, b in zip(mine, series)]
+
+    def _sample_lines(self, values: dict):
+        lines = []
+        for labels, series in values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {series[-1]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+def render_metrics() -> str:
+    if METRICS_MULTIPROC_DIR:
+        totals = _all_workers_values()
+        return "\n".join(metric.render(totals[metric.name]) for metric in _registry) + "\n"
+    return "\n".join(metric.render() for metric in _registry) + "\n"
+
+
+# --- Several worker processes ---
+
+def _snapshot_path(pid: int) -> str:
+    return os.path.join(METRICS_MULTIPROC_DIR, f"{pid}.json")
+
+
+def write_snapshot(include_gauges: bool = True):
+    """Writes this worker's samples for the other workers' /metrics. Replaced atomically."""
+    snapshot = {
+        metric.name: [[list(labels), value] for labels, value in metric.values().items()]
+        for metric in _registry if include_gauges or metric.kind != "gauge"
+    }
+    path = _snapshot_path(os.getpid())
+    try:
+        with open(path + ".tmp", "w") as f:
+            json.dump(snapshot, f, separators=(",", ":"))
+        os.replace(path + ".tmp", path)
+    except OSError as e:
+        logger.warning(f"Could not write the metrics snapshot {path}: {e}")
+
+
+def _all_workers_values() -> Dict[str, dict]:
+    """This worker's live samples plus every other worker's last snapshot, merged per metric."""
+    totals = {metric.name: metric.values() for metric in _registry}
+    own = os.path.basename(_snapshot_path(os.getpid()))
+    fresh_after = time.time() - 3 * METRICS_FLUSH_SECONDS
+    try:
+        entries = [e for e in os.scandir(METRICS_MULTIPROC_DIR) if e.name.endswith(".json") and e.name != own]
+    except OSError as e:
+        logger.warning(f"Could not read the metrics directory {METRICS_MULTIPROC_DIR}: {e}")
+        entries = []
+    for entry in entries:
+        try:
+            fresh = entry.stat().st_mtime >= fresh_after
+            with open(entry.path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue  # removed or being replaced; its numbers are in the next scrape
+        for metric in _registry:
+            if metric.kind == "gauge" and not fresh:
+                continue  # the worker has exited or stalled: its gauges no longer describe anything
+            rows = snapshot.get(metric.name)
+            if rows:
+                metric.merge(totals[metric.name], {tuple(labels): value for labels, value in rows})
+    return totals
+
+
+class SnapshotWriter:
+    """Background task that writes this worker's snapshot every METRICS_FLUSH_SECONDS while
+    METRICS_MULTIPROC_DIR is set. On stop it writes a last one without gauges."""
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if METRICS_ENABLED and METRICS_MULTIPROC_DIR and self._task is None:
+            write_snapshot()
+            self._task = asyncio.create_task(self._run(), name="metrics-snapshot-writer")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(METRICS_FLUSH_SECONDS)
+            write_snapshot()
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        write_snapshot(include_gauges=False)
+
+
+snapshot_writer = SnapshotWriter()
+
+
+# --- Metrics ---
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Time to serve an HTTP request, by route template and status.",
+    ["method", "route", "status"],
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests being served.")
+DB_QUERY_SECONDS = Histogram(
+    "db_query_duration_seconds", "Time to execute a SQL statement, by normalised statement label.",
+    ["statement"], buckets=QUERY_BUCKETS,
+)
+DB_QUERY_ERRORS = Counter("db_query_errors_total", "SQL statements that raised, by statement label.", ["statement"])
+OUTBOUND_SECONDS = Histogram(
+    "http_client_request_duration_seconds", "Time for calls to other services, by target and status.",
+    ["target", "method", "status"],
+)
+OUTBOUND_ERRORS = Counter(
+    "http_client_errors_total", "Calls to other services that failed without a response, by target and error.",
+    ["target", "error"],
+)
+OUTBOUND_IN_FLIGHT = Gauge("http_client_requests_in_flight", "Calls to other services awaiting a response.", ["target"])
+
+
+# --- Incoming requests ---
+
+class MetricsMiddleware:
+    """Pure ASGI middleware: times each HTTP request and labels it with the matched route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            route = scope.get("route")
+            # Unmatched paths share one label so scanners cannot blow up the series count.
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                scope["method"], route.path if route is not None else "unmatched", str(status_code),
+            )
+
+
+# --- SQL statements ---
+
+_TABLE = r"([\w.\[\]]+)"
+_LABEL_PATTERNS = [
+    ("insert", re.compile(rf"\bINSERT\s+INTO\s+{_TABLE}", re.IGNORECASE)),
+    ("merge", re.compile(rf"\bMERGE\s+(?:INTO\s+)?{_TABLE}", re.IGNORECASE)),
+    ("delete", re.compile(rf"\bDELETE\s+(?:TOP\s*\(\S+\)\s*)?FROM\s+{_TABLE}", re.IGNORECASE)),
+    ("update", re.compile(rf"\bUPDATE\s+(?:TOP\s*\(\S+\)\s*)?{_TABLE}", re.IGNORECASE)),
+    ("select", re.compile(rf"\bSELECT\b(?:.*?\bFROM\s+{_TABLE})?", re.IGNORECASE | re.DOTALL)),
+]
+_FROM_TABLE = re.compile(rf"\bFROM\s+{_TABLE}", re.IGNORECASE)
+_DDL = re.compile(r"^\s*(IF|CREATE|ALTER|DROP)\b", re.IGNORECASE)
+
+
+@lru_cache(maxsize=1024)
+def statement_label(sql: str) -> str:
+    """'select Sales', 'insert SaleItems', 'merge SalesRollupHourly', ... from the first statement's verb and table."""
+    if _DDL.match(sql):
+        return "ddl"
+    first = None
+    for verb, pattern in _LABEL_PATTERNS:
+        match = pattern.search(sql)
+        if match and (first is None or match.start() < first[1].start()):
+            first = (verb, match)
+    if first is None:
+        return "other"
+    verb, match = first
+    table = match.group(1)
+    if verb == "update":
+        # UPDATE alias ... FROM Table AS alias
+        from_match = _FROM_TABLE.search(sql, match.end())
+        if from_match:
+            table = from_match.group(1)
+    if not table or table.upper().startswith("OPENJSON"):
+        return verb
+    return f"{verb} {table.replace('[', '').replace(']', '').removeprefix('dbo.')}"
+
+
+class InstrumentedCursor:
+    __slots__ = ("_cursor",)
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    async def execute(self, sql: str, *params):
+        label = statement_label(sql)
+        started = time.perf_counter()
+        try:
+            return await self._cursor.execute(sql, *params)
+        except Exception:
+            DB_QUERY_ERRORS.inc(label)
+            raise
+        finally:
+            DB_QUERY_SECONDS.observe(time.perf_counter() - started, label)
+
+
+class _InstrumentedCursorContext:
+    __slots__ = ("_context",)
+
+    def __init__(self, context):
+        self._context = context
+
+    async def __aenter__(self):
+        return InstrumentedCursor(await self._context.__aenter__())
+
+    async def __aexit__(self, *exc):
+        return await self._context.__aexit__(*exc)
+
+
+class InstrumentedConnection:
+    """Wraps a pooled connection so every cursor's execute() is timed. Everything else passes through."""
+    __slots__ = ("_conn",)
+
+    def __init__(self, conn):
+        object.__setattr__(self, "_conn", conn)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._conn, name, value)
+
+    def cursor(self):
+        return _InstrumentedCursorContext(self._conn.cursor())
+
+
+def instrument_connection(conn):
+    return InstrumentedConnection(conn) if METRICS_ENABLED else conn
+
+
+# --- Outbound HTTP ---
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    """Times calls to other services per host:port, and counts the ones that fail without a response."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        target = f"{request.url.host}:{request.url.port}"
+        OUTBOUND_IN_FLIGHT.inc(target)
+        started = time.perf_counter()
+        try:
+            response = await self.transport.handle_async_request(request)
+        except Exception as e:
+            OUTBOUND_ERRORS.inc(target, type(e).__name__)
+            raise
+        finally:
+            OUTBOUND_IN_FLIGHT.dec(target)
+        OUTBOUND_SECONDS.observe(time.perf_counter() - started, target, request.method, str(response.status_code))
+        return response
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+def connection_pool_gauge(name: str, documentation: str, read_stats: Callable[[], dict], keys: Tuple[str, ...]) -> Gauge:
+    """A gauge with a `state` label read from a stats dict at scrape time, e.g. the DB pool's in_use/idle."""
+    return Gauge(name, documentation, ["state"], collect=lambda: {(key,): read_stats()[key] for key in keys})
@@ -0,0 +1,84 @@
+"""
+Schema of the Discounts table and the indexes its readers need, as versioned steps
+(runner: schema_migrations.py). Applied at startup from the main.py lifespan.
+
+    python migrations.py status|apply
+"""
+from typing import List
+
+import schema_migrations
+from schema_migrations import Migration, create_index
+from database import REPLICA_HEARTBEAT_DDL
+
+SERVICE = "discounts"
+
+DISCOUNTS_TABLE_DDL = """
+IF OBJECT_ID('dbo.Discounts', 'U') IS NULL
+    CREATE TABLE dbo.Discounts (
+        DiscountID INT IDENTITY(1,1) PRIMARY KEY,
+        DiscountName NVARCHAR(255) NOT NULL,
+        Description NVARCHAR(1000) NULL,
+        ProductName NVARCHAR(255) NULL,
+        DiscountType VARCHAR(20) NOT NULL,
+        PercentageValue DECIMAL(5, 2) NULL,
+        FixedValue DECIMAL(18, 2) NULL,
+        MinimumSpend DECIMAL(18, 2) NULL,
+        ValidFrom DATETIME NOT NULL,
+        ValidTo DATETIME NOT NULL,
+        Username NVARCHAR(100) NOT NULL,
+        Status VARCHAR(20) NOT NULL,
+        CreatedAt DATETIME NOT NULL DEFAULT GETDATE()
+    );
+"""
+
+DISCOUNT_INDEXES_DDL = "".join([
+    # Name lookups: the duplicate-name check on create, and the sales service's by-name fallback.
+    create_index(
+        "Discounts", "IX_Discounts_DiscountName",
+        "(DiscountName) INCLUDE (ProductName, DiscountType, PercentageValue, FixedValue, MinimumSpend, "
+        "ValidFrom, ValidTo, Status)",
+    ),
+    # Status = 'Active' AND ValidTo >= now: the sales service's catalog loads and active_only
+    # listings. Active rows are a small slice of the table, and the queries compare Status to a
+    # literal, so the filter matches.
+    create_index(
+        "Discounts", "IX_Discounts_Active",
+        "(ValidTo, ValidFrom) INCLUDE (DiscountName, ProductName, DiscountType, PercentageValue, FixedValue, "
+        "MinimumSpend, Status) "
+        "WHERE Status = 'Active'",
+    ),
+])
+
+# Makes duplicate names a constraint violation (2601) for every writer, not only the create
+# path's guarded insert. Skipped, with the guard still in place, while duplicates remain.
+UNIQUE_DISCOUNT_NAME_DDL = """
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'UX_Discounts_DiscountName' AND object_id = OBJECT_ID('dbo.Discounts'))
+   AND NOT EXISTS (SELECT DiscountName FROM dbo.Discounts GROUP BY DiscountName HAVING COUNT(*) > 1)
+    CREATE UNIQUE INDEX UX_Discounts_DiscountName ON dbo.Discounts (DiscountName);
+"""
+
+# The sales service's discount catalog polls COUNT_BIG(*) and MAX(RowVer) to notice edits,
+# including ones made outside this service. The index (its own step, so the batch that
+# creates it already sees the column) keeps that probe off the table itself.
+DISCOUNT_CHANGE_TRACKING_DDL = """
+IF COL_LENGTH('dbo.Discounts', 'RowVer') IS NULL
+    ALTER TABLE dbo.Discounts ADD RowVer ROWVERSION;
+"""
+DISCOUNT_CHANGE_TRACKING_INDEX_DDL = create_index("Discounts", "IX_Discounts_RowVer", "(RowVer)")
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "discounts table", DISCOUNTS_TABLE_DDL),
+    Migration(2, "discount lookup indexes", DISCOUNT_INDEXES_DDL),
+    Migration(3, "unique discount names", UNIQUE_DISCOUNT_NAME_DDL),
+    Migration(4, "replica heartbeat", REPLICA_HEARTBEAT_DDL),
+    Migration(5, "discount change tracking", DISCOUNT_CHANGE_TRACKING_DDL),
+    Migration(6, "discount change tracking index", DISCOUNT_CHANGE_TRACKING_INDEX_DDL),
+]
+
+
+async def apply_migrations() -> List[int]:
+    return await schema_migrations.apply_migrations(SERVICE, MIGRATIONS)
+
+
+if __name__ == "__main__":
+    schema_migrations.main_cli(SERVICE, MIGRATIONS)
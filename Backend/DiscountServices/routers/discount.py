@@ -1,38 +1,35 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, status
+from fastapi.responses import Response, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer
-from pydantic import BaseModel, Field, field_validator, model_validator
-from typing import List, Optional
-import httpx
+from pydantic import BaseModel, Field, ValidationError, field_validator, model_validator
+from pydantic_core import to_json
+from typing import List, Literal, Optional
 from decimal import Decimal
 from datetime import datetime
 
+import csv
+import io
+import json
+from contextlib import asynccontextmanager
+
 # --- Database Connection Import ---
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-try:
-    from database import get_db_connection
-except ImportError:
-    print("ERROR: Could not import get_db_connection from database.py.")
-    async def get_db_connection():
-        raise NotImplementedError("Database connection not configured.")
+from database import get_db_connection, get_read_connection, acquire_connection, transaction, client_key
+from auth import verify_token
+from fast_json import FastJSONResponse
+from catalog_invalidation import invalidate_discount_caches
+import discount_repository
+from discount_repository import DiscountNotFoundError, DuplicateDiscountNameError, DiscountInUseError
 
 # --- Router and Auth ---
 router_discounts = APIRouter(prefix="/discounts", tags=["discounts"])
 oauth2_scheme_port4000 = OAuth2PasswordBearer(tokenUrl="http://localhost:4000/auth/token")
 
 async def validate_token_and_roles_port4000(token: str, allowed_roles: List[str]):
-    auth_url = "http://localhost:4000/auth/users/me"
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(auth_url, headers={"Authorization": f"Bearer {token}"})
-            response.raise_for_status()
-        except httpx.RequestError as exc:
-            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=f"Auth service is unavailable: {exc}")
-        except httpx.HTTPStatusError as exc:
-            raise HTTPException(status_code=exc.response.status_code, detail="Invalid or expired token.")
-
-    user_data = response.json()
+    # Verified locally when a JWT key is configured, otherwise via the cached user-service lookup.
+    user_data = await verify_token(token)
     if user_data.get("userRole") not in allowed_roles:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied for this role.")
     return user_data
@@ -102,158 +99,278 @@ class DiscountOut(BaseModel):
 # --- CRUD Endpoints ---
 
 @router_discounts.post("/", response_model=DiscountOut, status_code=status.HTTP_201_CREATED)
-async def create_discount(discount_data: DiscountCreate, current_user: dict = Depends(get_admin_or_manager)):
+async def create_discount(discount_data: DiscountCreate, background_tasks: BackgroundTasks, token: str = Depends(oauth2_scheme_port4000), current_user: dict = Depends(get_admin_or_manager), conn = Depends(get_db_connection)):
     username = current_user.get("username", "unknown_user") 
-    conn = None
     try:
-        conn = await get_db_connection()
-        # FIX: Removed `as_dict=True` which is not supported by pyodbc
+        # One round trip: the name check, the insert and the read-back are a single statement.
         async with conn.cursor() as cursor:
-            await cursor.execute("SELECT 1 FROM Discounts WHERE DiscountName = ?", discount_data.DiscountName)
-            if await cursor.fetchone():
-                raise HTTPException(status_code=400, detail=f"Discount name '{discount_data.DiscountName}' already exists.")
-
-            sql = """
-                INSERT INTO Discounts (
-                    DiscountName, Description, ProductName, DiscountType, PercentageValue, FixedValue,
-                    MinimumSpend, ValidFrom, ValidTo, Username, Status
-                )
-                OUTPUT INSERTED.*
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """
-            await cursor.execute(
-                sql,
-                discount_data.DiscountName, discount_data.Description, discount_data.ProductName,
-                discount_data.DiscountType, discount_data.PercentageValue, discount_data.FixedValue,
-                discount_data.MinimumSpend, discount_data.ValidFrom, discount_data.ValidTo,
-                username, discount_data.Status
-            )
-            # FIX: Manually convert the single-row result to a dictionary
-            columns = [column[0] for column in cursor.description]
-            row = await cursor.fetchone()
-            await conn.commit()
-            
-            if not row:
-                raise HTTPException(status_code=500, detail="Failed to create discount, no record returned.")
-                
-            return dict(zip(columns, row))
-            
+            created = await discount_repository.insert_discount(cursor, discount_data.model_dump(), username)
+    except DuplicateDiscountNameError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except ValueError as ve: 
         raise HTTPException(status_code=422, detail=str(ve))
     except Exception as e:
-        if conn: await conn.rollback()
         raise HTTPException(status_code=500, detail=f"Database error creating discount: {e}")
-    finally:
-        if conn: await conn.close()
+
+    background_tasks.add_task(invalidate_discount_caches, token)
+    return created
+
+# --- Bulk import: validate every row, one name lookup and one MERGE in one transaction ---
+MAX_BULK_DISCOUNTS = int(os.getenv("MAX_BULK_DISCOUNTS", "1000"))
+CSV_CONTENT_TYPES = ("text/csv", "application/csv")
+
+
+class BulkDiscountResult(BaseModel):
+    row: int                          # 1-based position in the payload (CSV: data row after the header)
+    DiscountName: Optional[str] = None
+    status: str                       # "created", "updated", "conflict", "duplicate" or "invalid"
+    DiscountID: Optional[int] = None
+    errors: List[str] = []
+
+class BulkDiscountResponse(BaseModel):
+    created: int
+    updated: int
+    rejected: int
+    results: List[BulkDiscountResult]
+
+
+def _parse_bulk_rows(body: bytes, content_type: str) -> List[dict]:
+    """The payload as row dicts: a JSON array of discounts, or CSV with DiscountBase column names."""
+    if content_type.split(";")[0].strip().lower() in CSV_CONTENT_TYPES:
+        try:
+            reader = csv.DictReader(io.StringIO(body.decode("utf-8-sig")))
+            unknown = [c for c in reader.fieldnames or [] if c not in DiscountBase.model_fields]
+            if unknown:
+                raise HTTPException(status_code=400, detail=f"Unknown discount column(s): {', '.join(unknown)}")
+            # Empty cells are missing values, not empty strings.
+            return [{k: (v if v != "" else None) for k, v in row.items()} for row in reader]
+        except UnicodeDecodeError:
+            raise HTTPException(status_code=400, detail="CSV must be UTF-8 encoded.")
+    try:
+        rows = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body must be a JSON array of discounts or CSV.")
+    if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+        raise HTTPException(status_code=400, detail="Body must be a JSON array of discount objects.")
+    return rows
+
+
+def _validation_messages(error: ValidationError) -> List[str]:
+    return [f"{'.'.join(str(part) for part in e['loc']) or 'row'}: {e['msg']}" for e in error.errors()]
+
+
+@router_discounts.post("/bulk", response_model=BulkDiscountResponse)
+async def bulk_import_discounts(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    mode: Literal["upsert", "create"] = Query("upsert", description="upsert: update discounts whose name exists. create: report them as conflicts."),
+    token: str = Depends(oauth2_scheme_port4000),
+    current_user: dict = Depends(get_admin_or_manager),
+    conn = Depends(get_db_connection)
+):
+    """
+    Creates or updates many discounts from a JSON array or a CSV file (Content-Type: text/csv),
+    matched on DiscountName. Every row is validated with the DiscountBase rules; valid rows are
+    written together in one transaction and the rest are returned with their reasons.
+    """
+    username = current_user.get("username", "unknown_user")
+    rows = _parse_bulk_rows(await request.body(), request.headers.get("content-type", ""))
+    if not rows:
+        raise HTTPException(status_code=400, detail="No discounts to import.")
+    if len(rows) > MAX_BULK_DISCOUNTS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_DISCOUNTS} discounts per import.")
+
+    results: List[BulkDiscountResult] = []
+    valid = {}  # row number -> validated fields
+    seen_names = set()
+    for number, row in enumerate(rows, start=1):
+        name = row.get("DiscountName")
+        name = str(name) if name is not None else None
+        try:
+            discount = DiscountCreate.model_validate(row)
+        except ValidationError as e:
+            results.append(BulkDiscountResult(row=number, DiscountName=name, status="invalid", errors=_validation_messages(e)))
+            continue
+        if discount.DiscountName in seen_names:
+            results.append(BulkDiscountResult(row=number, DiscountName=name, status="duplicate",
+                                              errors=["DiscountName appears earlier in this import."]))
+            continue
+        seen_names.add(discount.DiscountName)
+        valid[number] = discount.model_dump()
+
+    written = {}
+    if valid:
+        try:
+            async with transaction(conn), conn.cursor() as cursor:
+                existing = await discount_repository.find_discount_names(cursor, [d["DiscountName"] for d in valid.values()])
+                if mode == "create":
+                    for number in [n for n, d in valid.items() if d["DiscountName"] in existing]:
+                        name = valid.pop(number)["DiscountName"]
+                        results.append(BulkDiscountResult(row=number, DiscountName=name, status="conflict",
+                                                          DiscountID=existing[name], errors=[f"Discount name '{name}' already exists."]))
+                written = await discount_repository.upsert_discounts(cursor, valid, username)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Database error importing discounts: {e}")
+
+    for number, (action, discount_id) in written.items():
+        results.append(BulkDiscountResult(row=number, DiscountName=valid[number]["DiscountName"],
+                                          status="created" if action == "INSERT" else "updated", DiscountID=discount_id))
+    results.sort(key=lambda result: result.row)
+
+    if written:
+        background_tasks.add_task(invalidate_discount_caches, token)  # once for the whole import
+    created = sum(1 for r in results if r.status == "created")
+    updated = sum(1 for r in results if r.status == "updated")
+    return BulkDiscountResponse(created=created, updated=updated, rejected=len(results) - created - updated, results=results)
+
+# --- Listing: keyset pages, column projection and streaming ---
+DISCOUNT_COLUMNS = list(DiscountOut.model_fields)
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+STREAM_BATCH_SIZE = 200
+
+
+def _parse_fields(fields: Optional[str]) -> List[str]:
+    """Validates ?fields= against DiscountOut's columns. DiscountID is always returned (it is the cursor)."""
+    if not fields:
+        return DISCOUNT_COLUMNS
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in DISCOUNT_COLUMNS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown discount field(s): {', '.join(unknown)}")
+    return ["DiscountID"] + [f for f in DISCOUNT_COLUMNS if f in requested and f != "DiscountID"]
+
+
+def _list_discounts_sql(columns: List[str], active_only: bool, after_id: Optional[int], limit: Optional[int]) -> str:
+    # Column names come from the DiscountOut whitelist above, never from raw input.
+    sql = f"SELECT {'TOP (?) ' if limit else ''}{', '.join(columns)} FROM Discounts"
+    conditions = []
+    if active_only:
+        conditions.append("Status = 'Active' AND GETUTCDATE() BETWEEN ValidFrom AND ValidTo")
+    if after_id is not None:
+        conditions.append("DiscountID < ?")
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    return sql + " ORDER BY DiscountID DESC"
+
+
+def _list_discounts_params(after_id: Optional[int], limit: Optional[int]) -> list:
+    params = [limit + 1] if limit else []  # one extra row tells us whether another page exists
+    if after_id is not None:
+        params.append(after_id)
+    return params
+
+
+async def _stream_discounts(columns: List[str], sql: str, params: list, client):
+    """Writes a JSON array row batch by row batch, so memory stays flat however many rows match."""
+    # The request's pooled connection is released before a streamed body is sent,
+    # so the stream borrows its own (from the replica when it is current) for as long as it runs.
+    async with acquire_connection(read_only=True, client=client) as conn:
+        async with conn.cursor() as cursor:
+            await cursor.execute(sql, *params)
+            yield b"["
+            first = True
+            while True:
+                rows = await cursor.fetchmany(STREAM_BATCH_SIZE)
+                if not rows:
+                    break
+                chunk = b",".join(to_json(dict(zip(columns, row))) for row in rows)
+                yield chunk if first else b"," + chunk
+                first = False
+            yield b"]"
+
+
+async def _listing_connection(request: Request, stream: bool = False):
+    """The pooled read connection for a listing page. A streamed listing gets none: its body
+    outlives the request and borrows its own connection, so holding this one too would
+    tie up two per stream."""
+    if stream:
+        yield None
+        return
+    async with asynccontextmanager(get_read_connection)(request) as conn:
+        yield conn
+
 
 @router_discounts.get("/", response_model=List[DiscountOut])
-async def get_all_discounts(active_only: bool = False, current_user: dict = Depends(get_any_user)):
-    conn = None
+async def get_all_discounts(
+    request: Request,
+    response: Response,
+    active_only: bool = False,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Page size. The next page's cursor is returned in X-Next-Cursor; ignored when streaming."),
+    after_id: Optional[int] = Query(None, description="Cursor: return discounts with a lower DiscountID than this."),
+    fields: Optional[str] = Query(None, description="Comma-separated DiscountOut fields to return."),
+    stream: bool = Query(False, description="Stream every matching row as one JSON array."),
+    current_user: dict = Depends(get_any_user),
+    conn = Depends(_listing_connection)
+):
+    columns = _parse_fields(fields)
+    if stream:
+        sql = _list_discounts_sql(columns, active_only, after_id, None)
+        return StreamingResponse(
+            _stream_discounts(columns, sql, _list_discounts_params(after_id, None), client_key(request)),
+            media_type="application/json",
+        )
+
     try:
-        conn = await get_db_connection()
         # FIX: Removed `as_dict=True` which is not supported by pyodbc
         async with conn.cursor() as cursor:
-            sql = "SELECT * FROM Discounts"
-            if active_only:
-                sql += " WHERE Status = 'Active' AND GETUTCDATE() BETWEEN ValidFrom AND ValidTo"
-            sql += " ORDER BY DiscountID DESC"
-            
-            await cursor.execute(sql)
+            sql = _list_discounts_sql(columns, active_only, after_id, limit)
+            await cursor.execute(sql, *_list_discounts_params(after_id, limit))
             
             # FIX: Manually convert tuple results into a list of dictionaries
-            columns = [column[0] for column in cursor.description]
             rows = await cursor.fetchall()
-            
-            return [dict(zip(columns, row)) for row in rows]
+            results = [dict(zip(columns, row)) for row in rows]
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching discounts: {e}")
-    finally:
-        if conn: await conn.close()
+
+    if len(results) > limit:
+        results = results[:limit]
+        response.headers["X-Next-Cursor"] = str(results[-1]["DiscountID"])
+    # Rows are already in DiscountOut's field order, so they are written without a second
+    # validation pass (this also covers projections, which do not fit DiscountOut).
+    return FastJSONResponse(results, headers=dict(response.headers))
         
 @router_discounts.get("/{discount_id}", response_model=DiscountOut)
-async def get_discount_by_id(discount_id: int, current_user: dict = Depends(get_any_user)):
-    conn = None
+async def get_discount_by_id(discount_id: int, current_user: dict = Depends(get_any_user), conn = Depends(get_read_connection)):
     try:
-        conn = await get_db_connection()
-        # FIX: Removed `as_dict=True` which is not supported by pyodbc
         async with conn.cursor() as cursor:
-            await cursor.execute("SELECT * FROM Discounts WHERE DiscountID = ?", discount_id)
-            
-            # FIX: Manually convert the single-row result to a dictionary
-            columns = [column[0] for column in cursor.description]
-            row = await cursor.fetchone()
-            
-            if not row:
-                raise HTTPException(status_code=404, detail=f"Discount ID {discount_id} not found.")
-                
-            return dict(zip(columns, row))
-            
+            return await discount_repository.get_discount(cursor, discount_id)
+    except DiscountNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching discount: {e}")
-    finally:
-        if conn: await conn.close()
 
 @router_discounts.put("/{discount_id}", response_model=DiscountOut)
-async def update_discount(discount_id: int, discount_data: DiscountUpdate, current_user: dict = Depends(get_admin_or_manager)):
-    conn = None
+async def update_discount(discount_id: int, discount_data: DiscountUpdate, background_tasks: BackgroundTasks, token: str = Depends(oauth2_scheme_port4000), current_user: dict = Depends(get_admin_or_manager), conn = Depends(get_db_connection)):
     username = current_user.get("username", "unknown_user")
     try:
-        conn = await get_db_connection()
-        # FIX: Removed `as_dict=True`
+        # UPDATE ... OUTPUT INSERTED returns the updated row; no existence check or read-back.
         async with conn.cursor() as cursor:
-            await cursor.execute("SELECT 1 FROM Discounts WHERE DiscountID = ?", discount_id)
-            if not await cursor.fetchone():
-                raise HTTPException(status_code=404, detail=f"Discount ID {discount_id} not found.")
-
-            sql = """
-                UPDATE Discounts SET
-                    DiscountName = ?, Description = ?, ProductName = ?, DiscountType = ?,
-                    PercentageValue = ?, FixedValue = ?, MinimumSpend = ?, ValidFrom = ?,
-                    ValidTo = ?, Username = ?, Status = ?
-                WHERE DiscountID = ?
-            """
-            await cursor.execute(
-                sql,
-                discount_data.DiscountName, discount_data.Description, discount_data.ProductName,
-                discount_data.DiscountType, discount_data.PercentageValue, discount_data.FixedValue,
-                discount_data.MinimumSpend, discount_data.ValidFrom, discount_data.ValidTo,
-                username, discount_data.Status, discount_id
-            )
-            await conn.commit()
-            
-            # This function is now fixed, so calling it will work correctly.
-            return await get_discount_by_id(discount_id, current_user)
-            
+            updated = await discount_repository.update_discount(cursor, discount_id, discount_data.model_dump(), username)
+    except DiscountNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except DuplicateDiscountNameError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except ValueError as ve:
         raise HTTPException(status_code=422, detail=str(ve))
     except Exception as e:
-        if conn: await conn.rollback()
         raise HTTPException(status_code=500, detail=f"Error updating discount: {e}")
-    finally:
-        if conn: await conn.close()
+
+    background_tasks.add_task(invalidate_discount_caches, token)
+    return updated
 
 @router_discounts.delete("/{discount_id}", status_code=status.HTTP_200_OK)
-async def delete_discount(discount_id: int, current_user: dict = Depends(get_admin_or_manager)):
-    conn = None
+async def delete_discount(discount_id: int, background_tasks: BackgroundTasks, token: str = Depends(oauth2_scheme_port4000), current_user: dict = Depends(get_admin_or_manager), conn = Depends(get_db_connection)):
     try:
-        conn = await get_db_connection()
         async with conn.cursor() as cursor:
-            await cursor.execute("SELECT 1 FROM Discounts WHERE DiscountID = ?", discount_id)
-            if not await cursor.fetchone():
-                raise HTTPException(status_code=404, detail=f"Discount ID {discount_id} not found.")
-            
-            await cursor.execute("DELETE FROM Discounts WHERE DiscountID = ?", discount_id)
-            await conn.commit()
-            
-            if cursor.rowcount == 0:
-                raise HTTPException(status_code=404, detail=f"Discount ID {discount_id} could not be deleted.")
-            
-            return {"message": f"Discount ID {discount_id} deleted successfully."}
+            await discount_repository.delete_discount(cursor, discount_id)
+    except DiscountNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except DiscountInUseError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
-        if conn: await conn.rollback()
-        if "The DELETE statement conflicted with the REFERENCE constraint" in str(e):
-             raise HTTPException(status_code=409, detail=f"Cannot delete discount ID {discount_id} as it is currently applied to one or more sales.")
         raise HTTPException(status_code=500, detail=f"Error deleting discount: {e}")
-    finally:
-        if conn: await conn.close()
\ No newline at end of file
+
+    background_tasks.add_task(invalidate_discount_caches, token)
+    return {"message": f"Discount ID {discount_id} deleted successfully."}
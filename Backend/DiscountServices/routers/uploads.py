@@ -0,0 +1,98 @@
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Request, UploadFile, status
+from fastapi.responses import FileResponse, JSONResponse, Response
+from typing import Literal, Optional
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from image_pipeline import (
+    image_pipeline, choose_variant, InvalidImageError, MAX_IMAGE_UPLOAD_BYTES, MEDIA_TYPES, IMMUTABLE_CACHE_CONTROL,
+)
+from routers.discount import get_admin_or_manager
+
+# Content-addressed product images. Legacy files uploaded before the pipeline are still
+# served as they are by the StaticFiles mount in main.py; these routes are matched first.
+router_uploads = APIRouter(prefix="/uploads/images", tags=["uploads"])
+
+UPLOAD_READ_CHUNK = 1024 * 1024
+
+
+def _image_urls(digest: str, manifest: dict) -> dict:
+    base = f"{router_uploads.prefix}/{digest}"
+    return {
+        "digest": digest,
+        "url": base,  # ?w=<px> picks a size, the format follows the Accept header
+        "width": manifest["width"],
+        "height": manifest["height"],
+        "files": [{**entry, "url": f"{base}/{entry['file']}"} for entry in manifest["files"]],
+    }
+
+
+def _file_response(request: Request, digest: str, entry: dict, vary_accept: bool = False) -> Response:
+    """Serves one stored file. The bytes behind a URL never change, so it may be cached for good."""
+    etag = f'"{entry["etag"]}"'
+    headers = {"Cache-Control": IMMUTABLE_CACHE_CONTROL, "ETag": etag}
+    if vary_accept:
+        headers["Vary"] = "Accept"
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    # FileResponse answers Range / If-Range requests (206, 416) itself.
+    return FileResponse(
+        os.path.join(image_pipeline.directory(digest), entry["file"]),
+        media_type=MEDIA_TYPES[entry["format"]],
+        headers=headers,
+    )
+
+
+@router_uploads.post("", status_code=status.HTTP_201_CREATED)
+async def upload_image(file: UploadFile = File(...), current_user: dict = Depends(get_admin_or_manager)):
+    """
+    Stores a JPEG, PNG or WebP image with its resized AVIF/WebP/JPEG variants and returns their
+    URLs. Uploading the same bytes again returns the existing image without reprocessing it.
+    """
+    data = bytearray()
+    while chunk := await file.read(UPLOAD_READ_CHUNK):
+        data += chunk
+        if len(data) > MAX_IMAGE_UPLOAD_BYTES:
+            raise HTTPException(status_code=413, detail=f"Images are limited to {MAX_IMAGE_UPLOAD_BYTES // (1024 * 1024)} MB.")
+    if not data:
+        raise HTTPException(status_code=400, detail="The uploaded file is empty.")
+    try:
+        digest, manifest = await image_pipeline.process(bytes(data))
+    except InvalidImageError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _image_urls(digest, manifest)
+
+
+@router_uploads.get("/{digest}")
+async def get_image(
+    digest: str,
+    request: Request,
+    w: Optional[int] = Query(None, ge=1, le=10000, description="Display width in pixels; the next larger variant is served."),
+    format: Optional[Literal["avif", "webp", "jpg", "png"]] = Query(None, description="Force a format instead of following Accept."),
+):
+    manifest = image_pipeline.manifest(digest)
+    if manifest is None:
+        raise HTTPException(status_code=404, detail="Image not found.")
+    entry = choose_variant(manifest, w, format, request.headers.get("accept", ""))
+    if entry is None:
+        raise HTTPException(status_code=404, detail=f"No {format} variant of this image.")
+    return _file_response(request, digest, entry, vary_accept=format is None)
+
+
+@router_uploads.get("/{digest}/manifest")
+async def get_image_manifest(digest: str):
+    manifest = image_pipeline.manifest(digest)
+    if manifest is None:
+        raise HTTPException(status_code=404, detail="Image not found.")
+    return JSONResponse(_image_urls(digest, manifest), headers={"Cache-Control": IMMUTABLE_CACHE_CONTROL})
+
+
+@router_uploads.get("/{digest}/{name}")
+async def get_image_file(digest: str, name: str, request: Request):
+    manifest = image_pipeline.manifest(digest)
+    entry = next((f for f in manifest["files"] if f["file"] == name), None) if manifest else None
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Image not found.")
+    return _file_response(request, digest, entry)
@@ -0,0 +1,110 @@
+"""
+Versioned schema steps, shared verbatim by both services (each lists its own steps in migrations.py).
+
+Each step runs once per database, in version order, and is recorded in dbo.SchemaMigrations
+under the owning service's name. Steps are written to be no-ops when their objects already
+exist, so databases that were set up by hand adopt them cleanly. Add new steps at the end
+and never edit one that has shipped.
+"""
+import argparse
+import asyncio
+import logging
+from typing import List, NamedTuple, Sequence
+
+from database import init_db_pool, close_db_pool, acquire_connection, transaction
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_LOCK_TIMEOUT_MS = 60000
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    sql: str
+    params: Sequence = ()
+
+
+SCHEMA_MIGRATIONS_DDL = """
+IF OBJECT_ID('dbo.SchemaMigrations', 'U') IS NULL
+    CREATE TABLE dbo.SchemaMigrations (
+        Service VARCHAR(50) NOT NULL,
+        Version INT NOT NULL,
+        Name NVARCHAR(200) NOT NULL,
+        AppliedAt DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME(),
+        CONSTRAINT PK_SchemaMigrations PRIMARY KEY (Service, Version)
+    );
+"""
+
+# Held until the migration transaction ends, so workers starting together apply the steps once.
+SQL_MIGRATION_LOCK = """
+DECLARE @Result INT;
+EXEC @Result = sp_getapplock @Resource = ?, @LockMode = 'Exclusive', @LockOwner = 'Transaction', @LockTimeout = ?;
+IF @Result < 0
+    THROW 50000, 'Timed out waiting for the schema migration lock.', 1;
+"""
+
+SQL_APPLIED_VERSIONS = "SELECT Version FROM SchemaMigrations WHERE Service = ?"
+SQL_RECORD_MIGRATION = "INSERT INTO SchemaMigrations (Service, Version, Name) VALUES (?, ?, ?)"
+
+
+def create_index(table: str, name: str, definition: str) -> str:
+    """DDL that creates index `name` on `table` unless it exists. `definition` is everything after ON table."""
+    return f"""
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE object_id = OBJECT_ID('dbo.{table}') AND name = '{name}')
+    CREATE INDEX {name} ON dbo.{table} {definition};
+"""
+
+
+async def _applied_versions(cursor, service: str) -> set:
+    await cursor.execute(SQL_APPLIED_VERSIONS, service)
+    return {row[0] for row in await cursor.fetchall()}
+
+
+async def apply_migrations(service: str, migrations: List[Migration]) -> List[int]:
+    """Applies the pending steps in one transaction (all or nothing) and returns their versions."""
+    applied = []
+    async with acquire_connection() as conn:
+        async with conn.cursor() as cursor:
+            await cursor.execute(SCHEMA_MIGRATIONS_DDL)
+        async with transaction(conn), conn.cursor() as cursor:
+            await cursor.execute(SQL_MIGRATION_LOCK, f"SchemaMigrations:{service}", MIGRATION_LOCK_TIMEOUT_MS)
+            done = await _applied_versions(cursor, service)
+            for migration in migrations:
+                if migration.version in done:
+                    continue
+                logger.info(f"Applying {service} schema migration {migration.version}: {migration.name}.")
+                await cursor.execute(migration.sql, *migration.params)
+                await cursor.execute(SQL_RECORD_MIGRATION, service, migration.version, migration.name)
+                applied.append(migration.version)
+    if applied:
+        logger.info(f"Schema is at {service} v{migrations[-1].version} (applied {applied}).")
+    return applied
+
+
+async def migration_status(service: str, migrations: List[Migration]) -> List[dict]:
+    async with acquire_connection() as conn:
+        async with conn.cursor() as cursor:
+            await cursor.execute(SCHEMA_MIGRATIONS_DDL)
+            done = await _applied_versions(cursor, service)
+    return [{"version": m.version, "name": m.name, "applied": m.version in done} for m in migrations]
+
+
+async def _run(command: str, service: str, migrations: List[Migration]):
+    await init_db_pool()
+    try:
+        if command == "apply":
+            print(f"Applied: {await apply_migrations(service, migrations) or 'nothing, schema is current'}")
+        else:
+            for step in await migration_status(service, migrations):
+                print(f"{step['version']:>4}  {'applied' if step['applied'] else 'pending':<8} {step['name']}")
+    finally:
+        await close_db_pool()
+
+
+def main_cli(service: str, migrations: List[Migration]):
+    """`python migrations.py status|apply` for the calling service."""
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=f"{service} service schema migrations.")
+    parser.add_argument("command", choices=["status", "apply"])
+    asyncio.run(_run(parser.parse_args().command, service, migrations))
@@ -0,0 +1,131 @@
+"""
+Discount engine (discount_engine.DiscountRules) against a linear scan of the catalog.
+
+Builds --discounts active discounts over --products products (--product-share of them
+product-level, the rest order-level with spread-out minimum spends) and prices --carts carts
+of --lines lines each:
+
+  indexed    DiscountRules.price, auto-applying: product index probes plus one threshold bisect
+  linear     the same result by checking every discount against every cart
+  requested  DiscountRules.price limited to 3 discounts named by the cashier (the default mode)
+
+Both auto-apply paths must agree on every cart. Run from SalesServices/:
+    python -m benchmarks.bench_discounts [--discounts 5000] [--lines 50]
+Prints one JSON line.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from discount_catalog import ActiveDiscount
+from discount_engine import DiscountRules, _discount_amount
+
+CartItem = namedtuple("CartItem", "name quantity")
+
+
+def build_catalog(args, now: datetime, rng: random.Random) -> list:
+    discounts = []
+    for n in range(1, args.discounts + 1):
+        percentage = rng.random() < 0.6
+        product = f"Product {rng.randrange(args.products)}" if rng.random() < args.product_share else None
+        discounts.append(ActiveDiscount(
+            DiscountID=n, DiscountName=f"Promo {n}", ProductName=product,
+            DiscountType="Percentage" if percentage else "Fixed",
+            PercentageValue=Decimal(rng.choice(["5.00", "10.00", "15.00"])) if percentage else None,
+            FixedValue=None if percentage else Decimal(rng.choice(["5.00", "10.00", "25.00"])),
+            MinimumSpend=Decimal(rng.randrange(0, 20000, 50)) if rng.random() < 0.8 else None,
+            ValidFrom=now - timedelta(days=1), ValidTo=now + timedelta(days=rng.choice([-2, 30])),
+        ))
+    return discounts
+
+
+def build_carts(args, rng: random.Random) -> list:
+    carts = []
+    for _ in range(args.carts):
+        items = [CartItem(f"Product {rng.randrange(args.products)}", rng.randint(1, 3)) for _ in range(args.lines)]
+        unit_prices = [Decimal(rng.choice(["95.00", "129.00", "149.00"])) for _ in items]
+        subtotal = sum((p * i.quantity for i, p in zip(items, unit_prices)), Decimal("0.0"))
+        carts.append((items, unit_prices, subtotal))
+    return carts
+
+
+def linear_price(discounts, items, unit_prices, subtotal, now):
+    """The reference: every discount is checked against the cart."""
+    applied = []
+    for discount in discounts:
+        if not (discount.ValidFrom <= now <= discount.ValidTo) or subtotal < (discount.MinimumSpend or Decimal("0.0")):
+            continue
+        if discount.ProductName:
+            lines = [(i, p) for i, p in zip(items, unit_prices) if i.name == discount.ProductName]
+            if not lines:
+                continue
+            amount = _discount_amount(discount, sum(p * i.quantity for i, p in lines), sum(i.quantity for i, _ in lines))
+        else:
+            amount = _discount_amount(discount, subtotal, 1)
+        applied.append({"id": discount.DiscountID, "amount": amount})
+    return min(sum((d["amount"] for d in applied), Decimal("0.0")), subtotal), applied
+
+
+def per_cart_us(fn, carts, rounds: int) -> float:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for cart in carts:
+            fn(*cart)
+    return round((time.perf_counter() - started) / (rounds * len(carts)) * 1e6, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--discounts", type=int, default=5000)
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--product-share", type=float, default=0.95, help="Share of product-level discounts.")
+    parser.add_argument("--carts", type=int, default=200)
+    parser.add_argument("--lines", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    now = datetime.utcnow()
+    discounts = build_catalog(args, now, rng)
+    carts = build_carts(args, rng)
+
+    started = time.perf_counter()
+    rules = DiscountRules(discounts)
+    compile_ms = (time.perf_counter() - started) * 1000
+
+    matched = 0
+    for items, unit_prices, subtotal in carts:
+        indexed = rules.price(items, unit_prices, subtotal, now)
+        linear = linear_price(discounts, items, unit_prices, subtotal, now)
+        assert indexed[0] == linear[0] and sorted(d["id"] for d in indexed[1]) == sorted(d["id"] for d in linear[1])
+        matched += len(indexed[1])
+    requested = [d.DiscountName for d in rng.sample(discounts, 3)]
+
+    indexed_us = per_cart_us(lambda i, p, s: rules.price(i, p, s, now), carts, args.rounds)
+    linear_us = per_cart_us(lambda i, p, s: linear_price(discounts, i, p, s, now), carts, args.rounds)
+    print(json.dumps({
+        "benchmark": "discount_engine",
+        "discounts": args.discounts,
+        "products": args.products,
+        "lines_per_cart": args.lines,
+        "carts": args.carts,
+        "avg_applied_per_cart": round(matched / len(carts), 1),
+        "compile_ms": round(compile_ms, 2),
+        "indexed_us_per_cart": indexed_us,
+        "linear_us_per_cart": linear_us,
+        "speedup": round(linear_us / indexed_us, 1),
+        "requested_us_per_cart": per_cart_us(lambda i, p, s: rules.price(i, p, s, now, requested), carts, args.rounds),
+    }))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Load scenarios for the sales service, run in-process against the local stand-ins
+(benchmarks/stand_ins.py): an in-memory database, a fake user service and fake inventory
+services, each with its own latency.
+
+  create_sale        POST /auth/sales/ with a 3-line cart and one applied discount
+  processing_orders  GET /auth/purchase_orders/status/processing (full snapshot, or 304s with --conditional)
+
+Run from SalesServices/:  python -m benchmarks.bench_load [--scenario all] [--requests 2000] [--concurrency 32] [--replica]
+Prints one JSON line per scenario with throughput and p50/p95/p99 latency.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+from contextlib import asynccontextmanager
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("INVENTORY_SERVICE_TOKEN", "bench-service-token")  # the outbox dispatcher requires one
+
+import httpx
+
+import main
+from database import init_db_pool, replica_is_current, POOL_MAX_SIZE, REPLICA_LAG_CHECK_SECONDS
+from http_client import init_http_client
+from auth import set_token_verifier, _build_default_verifier
+from benchmarks.stand_ins import (
+    InMemoryDatabase, InMemoryPool, ServiceRouter, fake_user_service, fake_inventory_service, run_load,
+)
+
+PRODUCTS = [("Spanish Latte", Decimal("129.00"), "Coffee"), ("Matcha Latte", Decimal("149.00"), "Non-Coffee"),
+            ("Croissant", Decimal("95.00"), "Pastry"), ("Americano", Decimal("99.00"), "Coffee")]
+DISCOUNT_NAME = "Bench 10%"
+
+
+def seed(db: InMemoryDatabase, processing_orders: int, items_per_order: int):
+    for name, price, _ in PRODUCTS:
+        db.add_product(name, price)
+    db.add_discount(DISCOUNT_NAME, "Percentage", Decimal("10.00"), minimum_spend=Decimal("100.00"))
+    for n in range(processing_orders):
+        db.add_sale([
+            (name, 1 + (n + i) % 3, price, category, {"espressoShots": 1} if i % 2 else None)
+            for i, (name, price, category) in enumerate(PRODUCTS[j % len(PRODUCTS)] for j in range(n, n + items_per_order))
+        ])
+
+
+async def _wait_for_replica():
+    # reads go to the primary until the first replica lag check has passed
+    while not replica_is_current():
+        await asyncio.sleep(REPLICA_LAG_CHECK_SECONDS / 10)
+
+
+@asynccontextmanager
+async def stand_in_service(args):
+    """A fresh in-memory database and fake upstreams, with the app's lifespan running."""
+    db = InMemoryDatabase(latency_ms=args.db_latency_ms)
+    seed(db, args.processing_orders, args.items)
+    user_service = fake_user_service(latency_ms=args.auth_latency_ms, role="cashier")
+    inventory = fake_inventory_service(latency_ms=args.inventory_latency_ms)
+    replica = InMemoryPool(db, maxsize=args.pool_size) if getattr(args, "replica", False) else None
+    await init_db_pool(pool=InMemoryPool(db, maxsize=args.pool_size), replica_pool=replica)
+    set_token_verifier(_build_default_verifier())  # every scenario starts with a cold auth cache
+    await init_http_client(transport=ServiceRouter({
+        "localhost:4000": user_service,
+        "127.0.0.1:8002": inventory,
+        "127.0.0.1:8003": inventory,
+    }))
+    async with main.lifespan(main.app):
+        if replica is not None:
+            await _wait_for_replica()
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://sales.test", timeout=None) as client:
+            yield client, db, user_service, inventory
+
+
+def token_for(args, i: int) -> str:
+    # A fixed pool of tokens, so the auth cache sees a realistic number of distinct cashiers.
+    return f"bench-token-{i % args.tokens:06d}"
+
+
+async def scenario_create_sale(args) -> dict:
+    cart = [
+        {"name": name, "quantity": 1 + i, "price": float(price), "category": category, "addons": {"espressoShots": 1}}
+        for i, (name, price, category) in enumerate(PRODUCTS[:3])
+    ]
+    body = {"cartItems": cart, "orderType": "Dine In", "paymentMethod": "Cash", "appliedDiscounts": [DISCOUNT_NAME]}
+    async with stand_in_service(args) as (client, db, user_service, inventory):
+        async def send(i):
+            return await client.post("/auth/sales/", json=body, headers={"Authorization": f"Bearer {token_for(args, i)}"})
+        result = await run_load(send, args.requests, args.concurrency, args.warmup)
+        result["db_statements_per_request"] = round(db.statements / (args.requests + args.warmup), 2)
+        result["auth_calls"] = user_service.state.calls
+    result["inventory_requests"] = inventory.state.calls
+    return result
+
+
+async def scenario_processing_orders(args) -> dict:
+    async with stand_in_service(args) as (client, db, user_service, inventory):
+        etag = None
+        if args.conditional:
+            first = await client.get("/auth/purchase_orders/status/processing",
+                                     headers={"Authorization": f"Bearer {token_for(args, 0)}"})
+            etag = first.headers.get("ETag")
+
+        async def send(i):
+            headers = {"Authorization": f"Bearer {token_for(args, i)}"}
+            if etag:
+                headers["If-None-Match"] = etag
+            return await client.get("/auth/purchase_orders/status/processing", headers=headers)
+        result = await run_load(send, args.requests, args.concurrency, args.warmup)
+        result["auth_calls"] = user_service.state.calls
+    result.update({"processing_orders": args.processing_orders, "items_per_order": args.items,
+                   "conditional": args.conditional})
+    return result
+
+
+SCENARIOS = {"create_sale": scenario_create_sale, "processing_orders": scenario_processing_orders}
+
+
+async def run(args):
+    names = list(SCENARIOS) if args.scenario == "all" else [args.scenario]
+    for name in names:
+        result = await SCENARIOS[name](args)
+        print(json.dumps({
+            "benchmark": "sales_load",
+            "scenario": name,
+            "db_latency_ms": args.db_latency_ms,
+            "auth_latency_ms": args.auth_latency_ms,
+            "inventory_latency_ms": args.inventory_latency_ms,
+            "pool_size": args.pool_size,
+            "replica": args.replica,
+            **result,
+        }), flush=True)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", choices=["all", *SCENARIOS], default="all")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--tokens", type=int, default=20, help="Distinct bearer tokens (auth cache entries).")
+    parser.add_argument("--pool-size", type=int, default=POOL_MAX_SIZE)
+    parser.add_argument("--replica", action="store_true", help="Send reads to a second stand-in pool (a replica with no lag).")
+    parser.add_argument("--db-latency-ms", type=float, default=1.0, help="Added to every database round trip.")
+    parser.add_argument("--auth-latency-ms", type=float, default=5.0)
+    parser.add_argument("--inventory-latency-ms", type=float, default=20.0)
+    parser.add_argument("--processing-orders", type=int, default=200, help="Seeded orders in 'processing'.")
+    parser.add_argument("--items", type=int, default=3, help="Items per seeded order.")
+    parser.add_argument("--conditional", action="store_true", help="Send If-None-Match (measures the 304 path).")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)  # per-request service logs would dominate the measurement
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main_cli()
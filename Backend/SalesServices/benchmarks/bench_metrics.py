@@ -0,0 +1,106 @@
+"""
+Overhead of the Prometheus instrumentation (metrics.py).
+
+end-to-end: benchmarks.bench_load runs with METRICS_ENABLED=0 and =1, alternating for
+            --rounds rounds, with every stand-in latency set to 0 so the instrumentation is
+            as large a share of each request as it can be.
+micro:      the cost of one histogram observation, one cached statement label, and one
+            /metrics render with realistic series counts.
+
+Run from SalesServices/:  python -m benchmarks.bench_metrics [--requests 2000] [--rounds 3]
+Prints one JSON line.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVICE_DIR)
+
+import metrics
+
+
+def load_round(scenario: str, enabled: bool, args) -> dict:
+    command = [
+        sys.executable, "-m", "benchmarks.bench_load", "--scenario", scenario,
+        "--requests", str(args.requests), "--concurrency", str(args.concurrency),
+        "--db-latency-ms", "0", "--auth-latency-ms", "0", "--inventory-latency-ms", "0",
+    ]
+    if scenario == "processing_orders":
+        command.append("--conditional")  # the cheapest request, so overhead shows most
+    env = {**os.environ, "METRICS_ENABLED": "1" if enabled else "0"}
+    output = subprocess.run(command, cwd=SERVICE_DIR, env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def end_to_end(scenario: str, args) -> dict:
+    runs = {False: [], True: []}
+    for _ in range(args.rounds):
+        for enabled in (False, True):
+            runs[enabled].append(load_round(scenario, enabled, args))
+
+    def summary(results):
+        return {
+            "throughput_rps": statistics.median(r["throughput_rps"] for r in results),
+            "p50_ms": statistics.median(r["latency_ms"]["p50"] for r in results),
+            "p99_ms": statistics.median(r["latency_ms"]["p99"] for r in results),
+        }
+    off, on = summary(runs[False]), summary(runs[True])
+    return {
+        "off": off,
+        "on": on,
+        "throughput_overhead_pct": round((off["throughput_rps"] - on["throughput_rps"]) / off["throughput_rps"] * 100, 2),
+    }
+
+
+def per_call_ns(fn, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return round((time.perf_counter() - started) / repeat * 1e9, 1)
+
+
+def micro(repeat: int) -> dict:
+    histogram = metrics.Histogram("bench_seconds", "Benchmark histogram.", ["route", "status"])
+    sql = "INSERT INTO Sales (OrderType, PaymentMethod, CashierName, TotalDiscountAmount) OUTPUT INSERTED.SaleID VALUES (?, ?, ?, ?)"
+    metrics.statement_label(sql)
+    for route in range(20):  # ~20 routes x 3 statuses, 40 statements, 3 outbound targets
+        for status in ("200", "304", "500"):
+            histogram.observe(0.01, f"/route/{route}", status)
+    for n in range(40):
+        metrics.DB_QUERY_SECONDS.observe(0.001, f"select Table{n}")
+    started = time.perf_counter()
+    body = metrics.render_metrics()
+    render_ms = (time.perf_counter() - started) * 1000
+    return {
+        "histogram_observe_ns": per_call_ns(lambda: histogram.observe(0.0123, "/route/1", "200"), repeat),
+        "statement_label_cached_ns": per_call_ns(lambda: metrics.statement_label(sql), repeat),
+        "render_ms": round(render_ms, 3),
+        "render_bytes": len(body),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=200000)
+    args = parser.parse_args()
+
+    print(json.dumps({
+        "benchmark": "metrics_overhead",
+        "requests": args.requests,
+        "rounds": args.rounds,
+        "create_sale": end_to_end("create_sale", args),
+        "processing_orders_304": end_to_end("processing_orders", args),
+        "micro": micro(args.repeat),
+    }))
+
+
+if __name__ == "__main__":
+    main()
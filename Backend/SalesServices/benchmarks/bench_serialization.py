@@ -0,0 +1,136 @@
+"""
+Micro-benchmark: old vs new serialization of GET /auth/purchase_orders/status/processing.
+
+old: build ProcessingSaleItem/ProcessingOrder models per row, then let FastAPI validate and
+     serialize the list again through response_model=List[ProcessingOrder].
+new: build the dicts once (_group_order_rows) and render them with FastJSONResponse.
+
+Run from SalesServices/:  python -m benchmarks.bench_serialization [--orders 1000] [--items 3]
+Prints one JSON line with timings, and fails if the two paths produce different bytes.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from fast_json import FastJSONResponse
+from routers.purchase_order import ProcessingOrder, ProcessingSaleItem, _group_order_rows
+
+Row = namedtuple("Row", [
+    "SaleID", "OrderType", "PaymentMethod", "CreatedAt", "CashierName", "TotalDiscountAmount",
+    "Status", "SaleItemID", "ItemName", "Quantity", "UnitPrice", "Category", "Addons",
+])
+
+
+def make_rows(orders: int, items_per_order: int) -> list:
+    start = datetime(2025, 5, 1, 7, 0, 0)
+    rows = []
+    item_id = 0
+    for sale_id in range(1, orders + 1):
+        for n in range(items_per_order):
+            item_id += 1
+            rows.append(Row(
+                sale_id, "Dine In", "Cash", start + timedelta(seconds=sale_id), "cashier01",
+                Decimal("10.00"), "processing", item_id, f"Spanish Latte {n}", 1 + n % 3,
+                Decimal("129.00") + n, "Coffee",
+                json.dumps({"espressoShots": n % 2, "seaSaltCream": 0, "syrupSauces": 1}) if n % 2 else None,
+            ))
+    return rows
+
+
+def legacy_group_order_rows(rows) -> List[ProcessingOrder]:
+    """The pre-change implementation: a model per item and per order."""
+    orders_dict, item_subtotals = {}, {}
+    for row in rows:
+        sale_id = row.SaleID
+        if sale_id not in orders_dict:
+            item_subtotals[sale_id] = Decimal('0.0')
+            orders_dict[sale_id] = {
+                "id": f"SO-{sale_id}",
+                "date": row.CreatedAt.strftime("%B %d, %Y %I:%M %p"),
+                "status": row.Status,
+                "orderType": row.OrderType,
+                "paymentMethod": row.PaymentMethod,
+                "cashierName": row.CashierName,
+                "items": 0,
+                "orderItems": [],
+                "_totalDiscount": row.TotalDiscountAmount,
+            }
+        if row.SaleItemID:
+            item_quantity = row.Quantity or 0
+            item_price = row.UnitPrice or Decimal('0.0')
+            orders_dict[sale_id]["items"] += item_quantity
+            item_subtotals[sale_id] += item_price * item_quantity
+            orders_dict[sale_id]["orderItems"].append(ProcessingSaleItem(
+                name=row.ItemName, quantity=item_quantity, price=float(item_price),
+                category=row.Category, addons=json.loads(row.Addons) if row.Addons else {},
+            ))
+    response_list = []
+    for sale_id, order_data in orders_dict.items():
+        total_discount = order_data.pop("_totalDiscount", Decimal('0.0'))
+        order_data["total"] = float(item_subtotals[sale_id] - total_discount)
+        response_list.append(ProcessingOrder(**order_data))
+    return response_list
+
+
+_response_adapter = TypeAdapter(List[ProcessingOrder])
+
+
+def old_path(rows) -> bytes:
+    models = legacy_group_order_rows(rows)
+    # What FastAPI does with response_model: dump, re-validate, serialize, then json.dumps.
+    validated = _response_adapter.validate_python([m.model_dump() for m in models])
+    return JSONResponse(jsonable_encoder(_response_adapter.dump_python(validated, mode="json"))).body
+
+
+def new_path(rows) -> bytes:
+    return FastJSONResponse(_group_order_rows(rows)).body
+
+
+def timeit(fn, rows, repeat: int) -> dict:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(rows)
+        samples.append((time.perf_counter() - started) * 1000)
+    return {"median_ms": round(statistics.median(samples), 3), "min_ms": round(min(samples), 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=1000)
+    parser.add_argument("--items", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rows = make_rows(args.orders, args.items)
+    old_bytes, new_bytes = old_path(rows), new_path(rows)
+    if old_bytes != new_bytes:
+        raise SystemExit("Serialized output differs between the old and new paths.")
+
+    old, new = timeit(old_path, rows, args.repeat), timeit(new_path, rows, args.repeat)
+    print(json.dumps({
+        "benchmark": "processing_orders_serialization",
+        "orders": args.orders,
+        "items_per_order": args.items,
+        "bytes": len(new_bytes),
+        "old": old,
+        "new": new,
+        "speedup": round(old["median_ms"] / new["median_ms"], 2) if new["median_ms"] else None,
+    }))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+The sales service's hot SQL with sample parameters, for benchmarks/plan_check.py. Statements are
+imported from the modules that run them, so the check always sees the SQL that ships.
+"""
+import json
+from datetime import datetime, timedelta
+from typing import List, NamedTuple, Sequence
+
+from discount_catalog import SQL_LOAD_DISCOUNTS, SQL_CHANGE_TOKEN, SQL_DISCOUNTS_BY_NAME
+from inventory_outbox import SQL_CLAIM_DUE_ROWS, SQL_DELETE_SENT_ROWS, SQL_RESCHEDULE_ROWS, OUTBOX_MAX_ATTEMPTS
+from price_catalog import PRODUCT_PRICES_SQL, ADDON_PRICES_SQL
+from sale_writes import SQL_FIND_INGESTED_KEYS, SQL_INSERT_SALE_LINES
+from sales_archive import SQL_ARCHIVE_BATCH, ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE
+from sales_export import SQL_EXPORT_SALES, ExportFilters
+from sales_rollups import GRAINS, SQL_APPLY_ROLLUPS, _rebuild_sql, _summary_sql
+from routers.purchase_order import (
+    SQL_PROCESSING_SNAPSHOT, SQL_PROCESSING_DELTA, SQL_PROCESSING_PROBE, SQL_ORDER_HISTORY, _status_update_sql,
+)
+
+
+class HotQuery(NamedTuple):
+    label: str
+    sql: str
+    params: Sequence = ()
+    allowed_scans: Sequence[str] = ()  # tables this statement reads whole by design
+
+
+def hot_queries() -> List[HotQuery]:
+    now = datetime.now().replace(minute=0, second=0, microsecond=0)
+    hourly_table, hourly_bucket = GRAINS["hour"]
+    return [
+        HotQuery("processing snapshot", SQL_PROCESSING_SNAPSHOT),
+        HotQuery("processing probe", SQL_PROCESSING_PROBE),
+        HotQuery("processing delta", SQL_PROCESSING_DELTA, [bytes(7) + b"\x01", b"\xff" * 8]),
+        HotQuery("order status update", _status_update_sql("completed"),
+                 ["completed", json.dumps([1, 2, 3]), json.dumps(["processing", "ready"])]),
+        HotQuery("sale lines insert", SQL_INSERT_SALE_LINES,
+                 [json.dumps([[1, "Spanish Latte", 1, "129.00", "Coffee", None, "0.00"]]), json.dumps([[1, 1, "10.00"]])]),
+        HotQuery("ingested keys lookup", SQL_FIND_INGESTED_KEYS, [json.dumps(["terminal-1:0001"])]),
+        HotQuery("rollup apply", SQL_APPLY_ROLLUPS,
+                 [json.dumps([[1, "total", "all", 1, 2, "250.00", "0.00"]])] * len(GRAINS)),
+        # Maintenance: clears a BucketStart range, which is not a prefix of the rollup key.
+        HotQuery("rollup rebuild (hour)", _rebuild_sql(hourly_table, hourly_bucket),
+                 [now - timedelta(days=1), now] * 3, allowed_scans=[hourly_table]),
+        HotQuery("sales summary", _summary_sql(hourly_table, by_bucket=True),
+                 ["item", now - timedelta(days=7), now, None, None]),
+        HotQuery("order history", SQL_ORDER_HISTORY, [200, now - timedelta(days=400), now - timedelta(days=300), 0]),
+        HotQuery("sales export", SQL_EXPORT_SALES,
+                 ExportFilters(now - timedelta(days=31), now, payment_method="Cash").params()),
+        HotQuery("archive batch", SQL_ARCHIVE_BATCH, [ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE]),
+        HotQuery("outbox claim", SQL_CLAIM_DUE_ROWS, [OUTBOX_MAX_ATTEMPTS, 100, 60]),
+        HotQuery("outbox reschedule", SQL_RESCHEDULE_ROWS, [OUTBOX_MAX_ATTEMPTS, json.dumps([[1, 2000, "HTTP 503"]])]),
+        HotQuery("outbox delete", SQL_DELETE_SENT_ROWS, [json.dumps([1, 2, 3])]),
+        HotQuery("discount catalog load", SQL_LOAD_DISCOUNTS),
+        HotQuery("discounts by name", SQL_DISCOUNTS_BY_NAME, [json.dumps(["Senior Citizen", "PWD"])]),
+        HotQuery("discount change token", SQL_CHANGE_TOKEN, allowed_scans=["Discounts"]),  # COUNT_BIG over IX_Discounts_RowVer
+        HotQuery("product prices", PRODUCT_PRICES_SQL, allowed_scans=["ProductPrices"]),
+        HotQuery("addon prices", ADDON_PRICES_SQL, allowed_scans=["AddonPrices"]),
+    ]
@@ -0,0 +1,145 @@
+"""
+Database round trips per endpoint, counted against the in-memory stand-in database
+(benchmarks/stand_ins.py: every statement, commit and rollback is one round trip).
+Each case is sent once and compared with its budget, and a 50-line cart must cost exactly
+as many round trips as a 1-line cart. The outbox dispatcher is stopped first so background
+deliveries do not land in an endpoint's count; one delivery round is measured as its own case.
+
+Run from SalesServices/:  python -m benchmarks.round_trips
+Prints one JSON line per case; exits 1 if any case goes over its budget or gets an unexpected status.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_load import PRODUCTS, DISCOUNT_NAME, stand_in_service
+from discount_catalog import discount_catalog
+from inventory_outbox import dispatcher as outbox_dispatcher
+
+
+class Case(NamedTuple):
+    label: str
+    method: str
+    path: str
+    status: int
+    budget: int
+    body: Optional[dict] = None
+    cold_catalog: bool = False  # price the sale as if the discount catalog had not loaded yet
+
+
+def _sale(discounts=(DISCOUNT_NAME,), products=PRODUCTS[:3]) -> dict:
+    cart = [
+        {"name": name, "quantity": 1 + i, "price": float(price), "category": category, "addons": {"espressoShots": 1}}
+        for i, (name, price, category) in enumerate(products)
+    ]
+    return {"cartItems": cart, "orderType": "Dine In", "paymentMethod": "Cash", "appliedDiscounts": list(discounts)}
+
+
+def cases() -> list:
+    created_at = datetime.now().isoformat()
+    batch = {"sales": [
+        {**_sale(), "idempotencyKey": f"round-trip-{n}", "createdAt": created_at,
+         "status": "completed" if n % 2 else "processing"}
+        for n in range(10)
+    ]}
+    return [
+        # Insert sale, sale lines, outbox rows and rollups, then commit.
+        Case("create sale", "POST", "/auth/sales/", 201, 5, _sale()),
+        Case("create sale, catalog cold", "POST", "/auth/sales/", 201, 6, _sale(), cold_catalog=True),
+        Case("create sale, no discount", "POST", "/auth/sales/", 201, 5, _sale(discounts=())),
+        # Key lookup, headers, lines, outbox rows, rollups, commit: the same for 10 sales as for one.
+        Case("batch of 10 sales", "POST", "/auth/sales/batch", 200, 6, batch),
+        # Change probe (for the ETag), then the snapshot.
+        Case("processing orders", "GET", "/auth/purchase_orders/status/processing", 200, 2),
+        Case("complete 3 orders", "PATCH", "/auth/purchase_orders/status", 200, 1,
+             {"orderIds": ["SO-1", "SO-2", "3"], "status": "completed"}),
+    ]
+
+
+def _report(label: str, used: int, budget: int, passed: bool, **fields):
+    print(json.dumps({"benchmark": "round_trips", "case": label, **fields,
+                      "round_trips": used, "budget": budget, "ok": passed}), flush=True)
+
+
+async def run(args) -> bool:
+    ok = True
+    async with stand_in_service(args) as (client, db, user_service, inventory):
+        await outbox_dispatcher.stop()
+        headers = {"Authorization": "Bearer round-trip-token"}
+        for case in cases():
+            rules = discount_catalog._rules
+            if case.cold_catalog:
+                discount_catalog._rules = None
+            before = db.round_trips
+            try:
+                response = await client.request(case.method, case.path, json=case.body, headers=headers)
+            finally:
+                discount_catalog._rules = rules
+            used = db.round_trips - before
+            passed = response.status_code == case.status and used <= case.budget
+            ok &= passed
+            _report(case.label, used, case.budget, passed,
+                    method=case.method, path=case.path, status=response.status_code)
+
+        # Cart size must not change the statement count: lines, discounts and outbox rows are set-based.
+        counts, statuses = {}, {}
+        for lines in (1, 50):
+            body = _sale(products=[PRODUCTS[i % 3] for i in range(lines)])
+            before = db.round_trips
+            response = await client.post("/auth/sales/", json=body, headers=headers)
+            counts[lines], statuses[lines] = db.round_trips - before, response.status_code
+        passed = counts[1] == counts[50] and set(statuses.values()) == {201}
+        ok &= passed
+        _report("create sale, 1 vs 50 lines", counts[50], counts[1], passed,
+                one_line=counts[1], fifty_lines=counts[50], statuses=list(statuses.values()))
+
+        # One claim for every queued deduction, then one delete per delivered batch (one per target here).
+        before = db.round_trips
+        await outbox_dispatcher.dispatch_once()
+        used = db.round_trips - before
+        passed = used <= 3 and not db.outbox
+        ok &= passed
+        _report("outbox delivery round", used, 3, passed, pending_after=len(db.outbox))
+
+        # A sale the inventory services reject (400) is split out of its batch: the other sales'
+        # rows are delivered and deleted, and only the bad sale's rows stay queued for a retry,
+        # rescheduled together in one statement at the end of the round.
+        bad_item = PRODUCTS[3][0]
+        for body in [_sale(), _sale(), _sale(products=PRODUCTS[3:]), _sale()]:
+            response = await client.post("/auth/sales/", json=body, headers=headers)
+            if body["cartItems"][0]["name"] == bad_item:
+                bad_sale = response.json().get("saleId")
+        inventory.state.reject = {bad_item}
+        before = db.round_trips
+        await outbox_dispatcher.dispatch_once()
+        used = db.round_trips - before
+        inventory.state.reject = set()
+        left = sorted({row["SaleID"] for row in db.outbox.values()})
+        passed = left == [bad_sale] and used <= 6
+        ok &= passed
+        _report("outbox round, one rejected sale", used, 6, passed, pending_sales_after=left, rejected_sale=bad_sale)
+    return ok
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processing-orders", type=int, default=20, help="Seeded orders in 'processing'.")
+    parser.add_argument("--items", type=int, default=3, help="Items per seeded order.")
+    args = parser.parse_args()
+    # stand_in_service's knobs; latency does not change the counts
+    args.db_latency_ms = args.auth_latency_ms = args.inventory_latency_ms = 0.0
+    args.pool_size = 2
+
+    logging.disable(logging.INFO)
+    sys.exit(0 if asyncio.run(run(args)) else 1)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,64 @@
+"""
+SalesServices and DiscountServices each ship their own copy of the modules below, so either
+service can be deployed from its folder alone. The copies must stay byte-identical: edit one,
+copy it over the other, and run this check (this file is one of the copies too).
+
+Run from either service folder:  python -m benchmarks.shared_copies
+Prints one JSON line per file; exits 1 if any copy is missing or differs.
+"""
+import argparse
+import difflib
+import json
+import os
+import sys
+
+SERVICES = ("SalesServices", "DiscountServices")
+SHARED_FILES = [
+    "admission.py",
+    "auth.py",
+    "database.py",
+    "fast_json.py",
+    "http_client.py",
+    "lifecycle.py",
+    "metrics.py",
+    "schema_migrations.py",
+    "benchmarks/README.md",
+    "benchmarks/plan_check.py",
+    "benchmarks/shared_copies.py",
+    "benchmarks/stand_ins.py",
+]
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _read(service: str, path: str):
+    try:
+        with open(os.path.join(BACKEND_DIR, service, path), "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def check(show_diff: bool = False) -> bool:
+    ok = True
+    for path in SHARED_FILES:
+        copies = {service: _read(service, path) for service in SERVICES}
+        missing = [service for service, data in copies.items() if data is None]
+        same = not missing and len(set(copies.values())) == 1
+        ok &= same
+        print(json.dumps({"check": "shared_copies", "file": path, "missing": missing, "ok": same}), flush=True)
+        if show_diff and not same and not missing:
+            first, second = (copies[s].decode("utf-8", "replace").splitlines(keepends=True) for s in SERVICES)
+            sys.stdout.writelines(difflib.unified_diff(first, second, *(f"{s}/{path}" for s in SERVICES)))
+    return ok
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--diff", action="store_true", help="Print a unified diff for each copy that differs.")
+    args = parser.parse_args()
+    sys.exit(0 if check(args.diff) else 1)
+
+
+if __name__ == "__main__":
+    main_cli()
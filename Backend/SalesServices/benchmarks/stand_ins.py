@@ -0,0 +1,607 @@
+"""
+Local stand-ins for the load benchmarks, so a service can be measured without SQL Server,
+the user service (:4000) or the inventory services (:8002/:8003).
+
+- InMemoryDatabase / InMemoryPool: the Sales, SaleItems, SaleDiscounts, Discounts, price,
+  outbox and replica heartbeat tables held in Python, behind the same pool/connection/cursor
+  interface as aioodbc. A second pool over the same database stands in for a replica with no lag.
+  Statements are matched on their text and answered from the tables, after a configurable
+  per-round-trip latency, and counted (`round_trips` also counts commits and rollbacks).
+  Transactions are not isolated and rollbacks are not undone. This is not a SQL engine: it
+  never executes the schema or validates the T-SQL, so see benchmarks/README.md for what it
+  does and does not cover.
+- fake_user_service / fake_inventory_service: ASGI apps with configurable latency.
+- ServiceRouter: an httpx transport that sends each outbound request to the stand-in app
+  registered for its host:port.
+- run_load: drives an app with N concurrent clients and reports throughput and percentiles.
+
+The file is shared verbatim by SalesServices/benchmarks and DiscountServices/benchmarks.
+"""
+import asyncio
+import json
+import re
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from decimal import Decimal
+from functools import lru_cache
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+from fastapi import FastAPI, Header, HTTPException
+
+
+async def _sleep_ms(latency_ms: float):
+    if latency_ms > 0:
+        await asyncio.sleep(latency_ms / 1000)
+
+
+@lru_cache(maxsize=None)
+def _row_type(columns: tuple):
+    return namedtuple("Row", columns)
+
+
+def _rows(columns, values) -> list:
+    row_type = _row_type(tuple(columns))
+    return [row_type(*v) for v in values]
+
+
+def _rowversion(value: int) -> bytes:
+    return value.to_bytes(8, "big")
+
+
+ORDER_COLUMNS = (
+    "SaleID", "OrderType", "PaymentMethod", "CreatedAt", "CashierName", "TotalDiscountAmount", "Status",
+    "SaleItemID", "ItemName", "Quantity", "UnitPrice", "Category", "Addons",
+)
+OUTBOX_COLUMNS = ("OutboxID", "Target", "Payload", "Attempts")
+
+
+# --- In-memory database ---
+
+class InMemoryDatabase:
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency_ms = latency_ms
+        self.sales: Dict[int, dict] = {}
+        self.sale_items: Dict[int, List[dict]] = {}
+        self.sale_discounts: List[tuple] = []
+        self.discounts: Dict[int, dict] = {}
+        self.products: Dict[str, Decimal] = {}
+        # Seeded like SalesServices' AddonPrices table
+        self.addons: Dict[str, Decimal] = {
+            "espressoShots": Decimal("25.00"), "seaSaltCream": Decimal("30.00"), "syrupSauces": Decimal("20.00"),
+        }
+        self.outbox: Dict[int, dict] = {}
+        self.idempotency_keys: Dict[str, int] = {}
+        self.heartbeat = datetime.utcnow()
+        self.statements = 0
+        self.round_trips = 0
+        self._next_sale_id = 1
+        self._next_item_id = 1
+        self._next_outbox_id = 1
+        self._rowver = 1
+        self._handlers = [
+            (r"^\s*(IF |CREATE |ALTER )", self._no_rows),
+            (r"^\s*SELECT 1\s*$", lambda params, sql: ((None,), [(1,)])),
+            (r"sp_getapplock", self._no_rows),
+            (r"FROM SchemaMigrations", lambda params, sql: (("Version",), [])),
+            (r"^\s*INSERT INTO SchemaMigrations", self._no_rows),
+            (r"^\s*UPDATE ReplicaHeartbeat", self._write_heartbeat),
+            (r"FROM ReplicaHeartbeat", lambda params, sql: (("BeatAt",), [(self.heartbeat,)])),
+            (r"MAX\(RowVer\)\s+FROM Discounts", self._discount_change_token),
+            (r"FROM Discounts\s+WHERE Status = 'Active' AND ValidTo", self._active_discounts),
+            (r"WITH \(DiscountName NVARCHAR\(255\) '\$'\) AS j", self._discounts_by_name),
+            (r"^\s*INSERT INTO Discounts", self._insert_discount),
+            (r"JOIN Discounts AS d WITH \(UPDLOCK, HOLDLOCK\)", self._find_discount_names),
+            (r"MERGE INTO Discounts", self._upsert_discounts),
+            (r"^\s*UPDATE Discounts SET", self._update_discount),
+            (r"^\s*DELETE FROM Discounts", self._delete_discount),
+            (r"FROM Discounts WHERE DiscountID = \?", self._get_discount),
+            (r"FROM ProductPrices", lambda params, sql: (("ProductName", "Price"), list(self.products.items()))),
+            (r"FROM AddonPrices", lambda params, sql: (("AddonKey", "Price"), list(self.addons.items()))),
+            (r"^\s*INSERT INTO Sales \(", self._insert_sale),
+            (r"JOIN SaleIdempotencyKeys", self._find_ingested_keys),
+            (r"^\s*MERGE INTO Sales", self._insert_sale_headers),
+            (r"INSERT INTO SaleItems", self._insert_sale_lines),
+            (r"INSERT INTO InventoryOutbox", self._enqueue_outbox),
+            (r"^\s*MERGE SalesRollup", self._no_rows),
+            (r"UPDATE TOP \(\?\) o WITH", self._claim_outbox),
+            (r"^\s*DELETE FROM InventoryOutbox", self._delete_outbox),
+            (r"^\s*UPDATE o\s+SET Status = CASE", self._reschedule_outbox),
+            (r"FROM InventoryOutbox GROUP BY Status", self._outbox_counts),
+            (r"COUNT_BIG\(\*\), MAX\(RowVer\)", self._processing_probe),
+            (r"^\s*SELECT CAST\(MIN_ACTIVE_ROWVERSION", lambda params, sql: ((None,), [(_rowversion(self._rowver),)])),
+            (r"^\s*UPDATE s\s+SET Status = \?", self._update_statuses),
+            (r"^\s*SELECT s\.SaleID, s\.Status FROM Sales", self._sale_statuses),
+            (r"s\.RowVer >= \? AND s\.RowVer < \?", self._processing_delta),
+            (r"WHERE\s+s\.Status = 'processing'", self._processing_snapshot),
+            (r"^\s*SELECT (TOP \(\?\) )?([\w, ]+) FROM Discounts", self._list_discounts),
+        ]
+        self._handlers = [(re.compile(pattern, re.IGNORECASE), handler) for pattern, handler in self._handlers]
+
+    def run(self, sql: str, params: tuple):
+        self.statements += 1
+        self.round_trips += 1
+        for pattern, handler in self._handlers:
+            if pattern.search(sql):
+                return handler(params, sql)
+        raise NotImplementedError(f"The in-memory database has no handler for: {' '.join(sql.split())[:120]}")
+
+    # --- Seeding ---
+
+    def add_product(self, name: str, price: Decimal):
+        self.products[name] = price
+
+    def add_discount(self, name: str, discount_type: str = "Percentage", value: Decimal = Decimal("10.00"),
+                     minimum_spend: Optional[Decimal] = None, product_name: Optional[str] = None,
+                     status: str = "Active") -> int:
+        discount_id = max(self.discounts, default=0) + 1
+        now = datetime.utcnow()
+        self.discounts[discount_id] = {
+            "DiscountID": discount_id, "DiscountName": name, "Description": f"{name} (benchmark)",
+            "ProductName": product_name, "DiscountType": discount_type,
+            "PercentageValue": value if discount_type == "Percentage" else None,
+            "FixedValue": value if discount_type == "Fixed" else None,
+            "MinimumSpend": minimum_spend, "ValidFrom": now - timedelta(days=1), "ValidTo": now + timedelta(days=30),
+            "Username": "bench", "Status": status, "CreatedAt": now - timedelta(days=1), "RowVer": self._bump(),
+        }
+        return discount_id
+
+    def add_sale(self, cart: List[tuple], status: str = "processing", order_type: str = "Dine In",
+                 payment_method: str = "Cash", cashier: str = "bench", discount: Decimal = Decimal("0.00")) -> int:
+        """cart: [(name, quantity, unit_price, category, addons dict or None)]"""
+        sale_id = self._new_sale(order_type, payment_method, cashier, discount, status)
+        for name, quantity, unit_price, category, addons in cart:
+            self._add_item(sale_id, name, quantity, unit_price, category, json.dumps(addons) if addons else None)
+        return sale_id
+
+    def _new_sale(self, order_type, payment_method, cashier, discount, status="processing", created_at=None) -> int:
+        sale_id = self._next_sale_id
+        self._next_sale_id += 1
+        self.sales[sale_id] = {
+            "SaleID": sale_id, "OrderType": order_type, "PaymentMethod": payment_method,
+            "CreatedAt": created_at or datetime.now(), "CashierName": cashier, "TotalDiscountAmount": Decimal(discount),
+            "Status": status, "RowVer": self._bump(),
+        }
+        self.sale_items[sale_id] = []
+        return sale_id
+
+    def _add_item(self, sale_id, name, quantity, unit_price, category, addons, addons_price=0):
+        self.sale_items[sale_id].append({
+            "SaleItemID": self._next_item_id, "ItemName": name, "Quantity": quantity,
+            "UnitPrice": Decimal(unit_price), "Category": category, "Addons": addons,
+            "AddonsPrice": Decimal(addons_price),
+        })
+        self._next_item_id += 1
+
+    def _bump(self) -> int:
+        self._rowver += 1
+        return self._rowver - 1
+
+    # --- Statement handlers: each returns (columns, rows as tuples) ---
+
+    def _no_rows(self, params, sql):
+        return (), []
+
+    def _write_heartbeat(self, params, sql):
+        self.heartbeat = datetime.utcnow()
+        return ("BeatAt",), [(self.heartbeat,)]
+
+    def _discount_change_token(self, params, sql):
+        newest = max((d["RowVer"] for d in self.discounts.values()), default=None)
+        return (None, None), [(len(self.discounts), newest)]
+
+    def _active_discounts(self, params, sql):
+        now = datetime.utcnow()
+        columns = ("DiscountID", "DiscountName", "ProductName", "DiscountType", "PercentageValue",
+                   "FixedValue", "MinimumSpend", "ValidFrom", "ValidTo")
+        return columns, [
+            tuple(d[c] for c in columns) for d in self.discounts.values()
+            if d["Status"] == "Active" and d["ValidTo"] >= now
+        ]
+
+    def _discounts_by_name(self, params, sql):
+        names = {name.casefold() for name in json.loads(params[0])}
+        now = datetime.utcnow()
+        columns = ("DiscountID", "DiscountName", "ProductName", "DiscountType", "PercentageValue",
+                   "FixedValue", "MinimumSpend", "ValidFrom", "ValidTo")
+        return columns, [
+            tuple(d[c] for c in columns) for d in self.discounts.values()
+            if d["DiscountName"].casefold() in names and d["Status"] == "Active" and d["ValidFrom"] <= now <= d["ValidTo"]
+        ]
+
+    @staticmethod
+    def _statement_columns(sql) -> tuple:
+        """Column names of an OUTPUT INSERTED.a, INSERTED.b ... or SELECT a, b ... FROM list."""
+        match = re.search(r"OUTPUT\s+(.+?)\s+(?:SELECT|WHERE|VALUES)\b|SELECT\s+(.+?)\s+FROM", sql, re.DOTALL)
+        columns = match.group(1) or match.group(2)
+        return tuple(c.strip().split(".")[-1] for c in columns.split(","))
+
+    def _write_discount(self, discount_id, params, sql) -> dict:
+        names = re.search(r"INSERT INTO Discounts \(([^)]+)\)", sql)
+        if names:
+            columns = [c.strip() for c in names.group(1).split(",")]
+        else:
+            columns = re.findall(r"(\w+) = \?", sql.split("OUTPUT")[0])
+        discount = self.discounts.setdefault(discount_id, {"DiscountID": discount_id, "CreatedAt": datetime.now()})
+        discount.update(zip(columns, params), RowVer=self._bump())
+        return discount
+
+    def _insert_discount(self, params, sql):
+        columns = self._statement_columns(sql)
+        if any(d["DiscountName"] == params[-1] for d in self.discounts.values()):
+            return columns, []
+        discount = self._write_discount(max(self.discounts, default=0) + 1, params[:-1], sql)
+        return columns, [tuple(discount[c] for c in columns)]
+
+    def _update_discount(self, params, sql):
+        columns = self._statement_columns(sql)
+        discount_id = params[-1]
+        if discount_id not in self.discounts:
+            return columns, []
+        discount = self._write_discount(discount_id, params[:-1], sql)
+        return columns, [tuple(discount[c] for c in columns)]
+
+    def _find_discount_names(self, params, sql):
+        names = set(json.loads(params[0]))
+        return ("DiscountID", "DiscountName"), [
+            (d["DiscountID"], d["DiscountName"]) for d in self.discounts.values() if d["DiscountName"] in names
+        ]
+
+    def _upsert_discounts(self, params, sql):
+        username, rows = params[0], json.loads(params[1])
+        by_name = {d["DiscountName"]: d for d in self.discounts.values()}
+        columns = ("DiscountName", "Description", "ProductName", "DiscountType", "PercentageValue", "FixedValue",
+                   "MinimumSpend", "ValidFrom", "ValidTo", "Status")
+        output = []
+        for index, *values in rows:
+            discount = by_name.get(values[0])
+            action = "UPDATE" if discount else "INSERT"
+            if discount is None:
+                discount_id = max(self.discounts, default=0) + 1
+                discount = self.discounts[discount_id] = {"DiscountID": discount_id, "CreatedAt": datetime.now()}
+            discount.update(zip(columns, values), Username=username, RowVer=self._bump())
+            for column in ("PercentageValue", "FixedValue", "MinimumSpend"):
+                if discount[column] is not None:
+                    discount[column] = Decimal(discount[column])
+            for column in ("ValidFrom", "ValidTo"):
+                discount[column] = datetime.fromisoformat(discount[column])
+            output.append((index, action, discount["DiscountID"]))
+        return ("RowIndex", "Action", "DiscountID"), output
+
+    def _delete_discount(self, params, sql):
+        discount = self.discounts.pop(params[0], None)
+        return ("DiscountID",), [(discount["DiscountID"],)] if discount else []
+
+    def _get_discount(self, params, sql):
+        columns = self._statement_columns(sql)
+        discount = self.discounts.get(params[0])
+        return columns, [tuple(discount[c] for c in columns)] if discount else []
+
+    def _insert_sale(self, params, sql):
+        order_type, payment_method, cashier, discount = params
+        return ("SaleID",), [(self._new_sale(order_type, payment_method, cashier, discount),)]
+
+    def _find_ingested_keys(self, params, sql):
+        keys = json.loads(params[0])
+        return ("IdempotencyKey", "SaleID"), [(k, self.idempotency_keys[k]) for k in keys if k in self.idempotency_keys]
+
+    def _insert_sale_headers(self, params, sql):
+        rows = []
+        for key, order_type, payment_method, cashier, discount, created_at, status in json.loads(params[0]):
+            sale_id = self._new_sale(order_type, payment_method, cashier, Decimal(discount),
+                                     status, datetime.fromisoformat(created_at))
+            self.idempotency_keys[key] = sale_id
+            rows.append((sale_id, key))
+        return ("SaleID", "IdempotencyKey"), rows
+
+    def _insert_sale_lines(self, params, sql):
+        items_json, discounts_json = params
+        for sale_id, name, quantity, unit_price, category, addons, addons_price in json.loads(items_json):
+            self._add_item(sale_id, name, quantity, unit_price, category, addons, addons_price)
+        self.sale_discounts += [tuple(row) for row in json.loads(discounts_json)]
+        return (), []
+
+    def _enqueue_outbox(self, params, sql):
+        if len(params) == 1:  # OPENJSON bulk form
+            rows = json.loads(params[0])
+        else:
+            rows = [params[i:i + 3] for i in range(0, len(params), 3)]
+        for sale_id, target, payload in rows:
+            self.outbox[self._next_outbox_id] = {
+                "OutboxID": self._next_outbox_id, "SaleID": sale_id, "Target": target, "Payload": payload,
+                "Status": "pending", "Attempts": 0, "NextAttemptAt": time.monotonic(),
+            }
+            self._next_outbox_id += 1
+        return (), []
+
+    def _outbox_failed(self, row, max_attempts: int, next_attempt_at: float):
+        row["Attempts"] += 1
+        row["Status"] = "dead" if row["Attempts"] >= max_attempts else "pending"
+        row["NextAttemptAt"] = next_attempt_at
+
+    def _claim_outbox(self, params, sql):
+        max_attempts, limit, lease_seconds = params
+        now = time.monotonic()
+        for row in self.outbox.values():
+            if row["Status"] == "sending" and row["NextAttemptAt"] <= now:
+                self._outbox_failed(row, max_attempts, now)
+        claimed = [row for row in self.outbox.values() if row["Status"] == "pending" and row["NextAttemptAt"] <= now][:limit]
+        for row in claimed:
+            row["Status"] = "sending"
+            row["NextAttemptAt"] = now + lease_seconds
+        return OUTBOX_COLUMNS, [tuple(row[c] for c in OUTBOX_COLUMNS) for row in claimed]
+
+    def _reschedule_outbox(self, params, sql):
+        max_attempts, updates = params[0], json.loads(params[1])
+        for outbox_id, delay_ms, _ in updates:
+            row = self.outbox.get(outbox_id)
+            if row is not None and row["Status"] == "sending":
+                self._outbox_failed(row, max_attempts, time.monotonic() + delay_ms / 1000)
+        return (), []
+
+    def _delete_outbox(self, params, sql):
+        for outbox_id in json.loads(params[0]):
+            self.outbox.pop(outbox_id, None)
+        return (), []
+
+    def _outbox_counts(self, params, sql):
+        counts: Dict[str, int] = {}
+        for row in self.outbox.values():
+            counts[row["Status"]] = counts.get(row["Status"], 0) + 1
+        return ("Status", "Total"), list(counts.items())
+
+    def _processing_probe(self, params, sql):
+        processing = [s for s in self.sales.values() if s["Status"] == "processing"]
+        newest = max((s["RowVer"] for s in processing), default=None)
+        return (None, None, None), [(
+            len(processing), _rowversion(newest) if newest else None, _rowversion(self._rowver),
+        )]
+
+    def _update_statuses(self, params, sql):
+        target, ids, from_statuses = params[0], json.loads(params[1]), json.loads(params[2])
+        now = datetime.utcnow()
+        rows = []
+        for sale_id in ids:
+            sale = self.sales.get(sale_id)
+            if sale is not None and sale["Status"] in from_statuses:
+                rows.append((sale_id, sale["Status"], target, now))
+                sale.update(Status=target, RowVer=self._bump())
+        return ("SaleID", "PreviousStatus", "Status", "StatusChangedAt"), rows
+
+    def _sale_statuses(self, params, sql):
+        ids = json.loads(params[0])
+        return ("SaleID", "Status"), [(i, self.sales[i]["Status"]) for i in ids if i in self.sales]
+
+    def _order_rows(self, sales, join_items) -> list:
+        rows = []
+        for sale in sorted(sales, key=lambda s: (s["CreatedAt"], s["SaleID"])):
+            head = tuple(sale[c] for c in ORDER_COLUMNS[:7])
+            items = self.sale_items.get(sale["SaleID"], []) if join_items(sale) else []
+            if not items:
+                rows.append(head + (None,) * 6)
+            rows += [head + tuple(item[c] for c in ORDER_COLUMNS[7:]) for item in items]
+        return rows
+
+    def _processing_snapshot(self, params, sql):
+        sales = [s for s in self.sales.values() if s["Status"] == "processing"]
+        return ORDER_COLUMNS, self._order_rows(sales, lambda s: True)
+
+    def _processing_delta(self, params, sql):
+        since, upper = (int.from_bytes(v, "big") for v in params)
+        sales = [s for s in self.sales.values() if since <= s["RowVer"] < upper]
+        return ORDER_COLUMNS, self._order_rows(sales, lambda s: s["Status"] == "processing")
+
+    def _list_discounts(self, params, sql):
+        match = re.search(r"SELECT (TOP \(\?\) )?([\w, ]+) FROM Discounts", sql)
+        columns = tuple(c.strip() for c in match.group(2).split(","))
+        params = list(params)
+        limit = params.pop(0) if match.group(1) else None
+        after_id = params.pop(0) if "DiscountID < ?" in sql else None
+        now = datetime.utcnow()
+        rows = []
+        for discount_id in sorted(self.discounts, reverse=True):
+            d = self.discounts[discount_id]
+            if after_id is not None and discount_id >= after_id:
+                continue
+            if "Status = 'Active'" in sql and not (d["Status"] == "Active" and d["ValidFrom"] <= now <= d["ValidTo"]):
+                continue
+            rows.append(tuple(d[c] for c in columns))
+            if limit is not None and len(rows) >= limit:
+                break
+        return columns, rows
+
+
+class InMemoryCursor:
+    def __init__(self, database: InMemoryDatabase):
+        self._database = database
+        self._rows: list = []
+        self.description = None
+        self.rowcount = -1
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, sql: str, *params):
+        await _sleep_ms(self._database.latency_ms)
+        columns, values = self._database.run(sql, params)
+        self.description = [(c,) for c in columns] if columns else None
+        self._rows = _rows([c or f"col{i}" for i, c in enumerate(columns)], values) if columns else []
+        self.rowcount = len(self._rows)
+        return self
+
+    async def fetchone(self):
+        return self._rows.pop(0) if self._rows else None
+
+    async def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    async def fetchmany(self, size: int):
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        return rows
+
+
+class InMemoryConnection:
+    def __init__(self, database: InMemoryDatabase):
+        self._database = database
+        self.closed = False
+        self.autocommit = True
+        self.last_usage = asyncio.get_running_loop().time()
+
+    def cursor(self) -> InMemoryCursor:
+        return InMemoryCursor(self._database)
+
+    async def commit(self):
+        self._database.round_trips += 1
+        await _sleep_ms(self._database.latency_ms)
+
+    async def rollback(self):
+        self._database.round_trips += 1
+        await _sleep_ms(self._database.latency_ms)
+
+    async def close(self):
+        self.closed = True
+
+
+class InMemoryPool:
+    """The slice of aioodbc.Pool that database.py uses, bounded to `maxsize` connections."""
+
+    def __init__(self, database: InMemoryDatabase, maxsize: int = 10):
+        self.database = database
+        self.maxsize = maxsize
+        self.size = 0
+        self._free: List[InMemoryConnection] = []
+        self._available = asyncio.Condition()
+
+    @property
+    def freesize(self) -> int:
+        return len(self._free)
+
+    def acquire(self):
+        return self._acquire()
+
+    async def _acquire(self) -> InMemoryConnection:
+        async with self._available:
+            while not self._free and self.size >= self.maxsize:
+                await self._available.wait()
+            if self._free:
+                return self._free.pop()
+            self.size += 1
+            return InMemoryConnection(self.database)
+
+    async def release(self, conn: InMemoryConnection):
+        async with self._available:
+            if conn.closed:
+                self.size -= 1
+            else:
+                conn.last_usage = asyncio.get_running_loop().time()
+                self._free.append(conn)
+            self._available.notify()
+
+    def close(self):
+        self._free.clear()
+
+    async def wait_closed(self):
+        pass
+
+
+# --- Fake upstream services ---
+
+def fake_user_service(latency_ms: float = 0.0, role: str = "admin") -> FastAPI:
+    """GET /auth/users/me for any bearer token, answering as the given role."""
+    app = FastAPI()
+    app.state.calls = 0
+
+    @app.get("/auth/users/me")
+    async def me(authorization: str = Header(...)):
+        app.state.calls += 1
+        await _sleep_ms(latency_ms)
+        return {"username": f"bench-{authorization[-6:]}", "userRole": role}
+
+    return app
+
+
+def fake_inventory_service(latency_ms: float = 0.0) -> FastAPI:
+    """Both deduct-from-sale endpoints; counts requests and deducted lines. Requests naming an item in `app.state.reject` get a 400."""
+    app = FastAPI()
+    app.state.calls = 0
+    app.state.lines = 0
+    app.state.reject = set()
+
+    async def deduct(payload: dict):
+        app.state.calls += 1
+        await _sleep_ms(latency_ms)
+        unknown = [item["name"] for item in payload.get("cartItems", []) if item["name"] in app.state.reject]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown items: {', '.join(unknown)}")
+        app.state.lines += len(payload.get("cartItems", []))
+        return {"message": "ok"}
+
+    app.post("/ingredients/ingredients/deduct-from-sale")(deduct)
+    app.post("/materials/materials/deduct-from-sale")(deduct)
+    return app
+
+
+class ServiceRouter(httpx.AsyncBaseTransport):
+    """Sends each outbound request to the in-process app registered for its host:port."""
+
+    def __init__(self, apps: Dict[str, Callable]):
+        self._transports = {netloc: httpx.ASGITransport(app=app) for netloc, app in apps.items()}
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        transport = self._transports.get(f"{request.url.host}:{request.url.port}")
+        if transport is None:
+            raise httpx.ConnectError(f"No stand-in registered for {request.url}", request=request)
+        return await transport.handle_async_request(request)
+
+
+# --- Load driver ---
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+async def run_load(send: Callable[[int], Awaitable[httpx.Response]], requests: int, concurrency: int,
+                   warmup: int = 0, ok_statuses=(200, 201, 304)) -> dict:
+    """Calls send(i) `requests` times from `concurrency` workers; the first `warmup` calls are not timed."""
+    for i in range(warmup):
+        await send(i)
+
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    counter = iter(range(warmup, warmup + requests))
+
+    async def worker():
+        for i in counter:
+            started = time.perf_counter()
+            response = await send(i)
+            latencies.append((time.perf_counter() - started) * 1000)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(requests / elapsed, 1) if elapsed else None,
+        "errors": sum(n for code, n in statuses.items() if code not in ok_statuses),
+        "status_codes": {str(code): n for code, n in sorted(statuses.items())},
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 3),
+            "p95": round(percentile(latencies, 95), 3),
+            "p99": round(percentile(latencies, 99), 3),
+            "max": round(latencies[-1], 3) if latencies else 0.0,
+            "mean": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+        },
+    }
@@ -1,4 +1,17 @@
 import aioodbc
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, NamedTuple, Optional
+
+from fastapi import HTTPException, Request, Response, status
+
+from metrics import instrument_connection, connection_pool_gauge, Counter, Gauge
+
+logger = logging.getLogger(__name__)
 
 # database config
 server = 'LAPTOP-8KPHOHE5\\SQLEXPRESS'
@@ -7,14 +20,471 @@ username = 'RanjelPOS'
 password = 'Ranjel123'
 driver = 'ODBC Driver 17 for SQL Server'
 
-# async function to get db connection
-async def get_db_connection():
-    dsn = (
+# pool config (override through environment variables when sizing the pool)
+POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+POOL_ACQUIRE_TIMEOUT = float(os.getenv("DB_POOL_ACQUIRE_TIMEOUT", "5"))
+POOL_RECYCLE_SECONDS = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800"))
+# connections idle for longer than this are pinged before being handed out
+POOL_PING_AFTER_SECONDS = float(os.getenv("DB_POOL_PING_AFTER_SECONDS", "30"))
+
+# replica config: with DB_REPLICA_SERVER set, read-intent connections go to a read-only copy of
+# the database (same login) while it stays within DB_REPLICA_MAX_LAG_SECONDS of the primary
+REPLICA_SERVER = os.getenv("DB_REPLICA_SERVER", "")
+REPLICA_DATABASE = os.getenv("DB_REPLICA_DATABASE", database)
+REPLICA_POOL_MIN_SIZE = int(os.getenv("DB_REPLICA_POOL_MIN_SIZE", str(POOL_MIN_SIZE)))
+REPLICA_POOL_MAX_SIZE = int(os.getenv("DB_REPLICA_POOL_MAX_SIZE", str(POOL_MAX_SIZE)))
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("DB_REPLICA_MAX_LAG_SECONDS", "5"))
+REPLICA_LAG_CHECK_SECONDS = float(os.getenv("DB_REPLICA_LAG_CHECK_SECONDS", "1"))
+# after a write, the same client's reads stay on the primary for at least this long
+READ_YOUR_WRITES_SECONDS = float(os.getenv("DB_READ_YOUR_WRITES_SECONDS", "5"))
+MAX_PINNED_CLIENTS = 10000
+# Write responses carry this cookie, so a read landing on another worker process still sees
+# the pin. Clients that do not send cookies back (a cross-origin UI fetching without
+# credentials) only have the per-process pin, which is why serve.py's multi-worker mode
+# keeps reads on the primary unless DB_REPLICA_MULTI_WORKER=1 says the clients send the cookie.
+READ_YOUR_WRITES_COOKIE = "db_primary_until"
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", "1"))  # exported by serve.py to its workers
+REPLICA_MULTI_WORKER = os.getenv("DB_REPLICA_MULTI_WORKER", "0") == "1"
+
+
+def _new_pool_stats():
+    return {
+        "acquired": 0,
+        "timeouts": 0,
+        "failed_health_checks": 0,
+        "total_wait_seconds": 0.0,
+        "max_wait_seconds": 0.0,
+    }
+
+
+_pool = None
+_pool_stats = _new_pool_stats()
+_replica_pool = None
+_replica_pool_stats = _new_pool_stats()
+_replica_lag_task: Optional[asyncio.Task] = None
+_replica_state = {"lag_seconds": None, "checked_at": None, "lag_check_errors": 0}
+# Where read-intent connections went, and why a read went to the primary while a replica is configured
+_read_routing = {"replica": 0, "primary_pinned": 0, "primary_lagging": 0, "primary_unavailable": 0}
+_pinned_until: Dict[str, float] = {}  # client key -> time.monotonic() when its reads may use the replica again
+
+# Replica lag is the age of the newest heartbeat the replica can see. The lag check writes one
+# on the primary and reads it back from the replica, and both timestamps come from the primary's
+# clock, so server clock skew does not matter. The reading is up to one check interval high.
+REPLICA_HEARTBEAT_DDL = """
+IF OBJECT_ID('dbo.ReplicaHeartbeat', 'U') IS NULL
+BEGIN
+    CREATE TABLE dbo.ReplicaHeartbeat (
+        HeartbeatID INT NOT NULL CONSTRAINT PK_ReplicaHeartbeat PRIMARY KEY,
+        BeatAt DATETIME2 NOT NULL
+    );
+    INSERT INTO dbo.ReplicaHeartbeat (HeartbeatID, BeatAt) VALUES (1, SYSUTCDATETIME());
+END
+"""
+SQL_WRITE_HEARTBEAT = "UPDATE ReplicaHeartbeat SET BeatAt = SYSUTCDATETIME() OUTPUT INSERTED.BeatAt WHERE HeartbeatID = 1"
+SQL_READ_HEARTBEAT = "SELECT BeatAt FROM ReplicaHeartbeat WHERE HeartbeatID = 1"
+
+
+def _build_dsn(target_server=server, target_database=database, read_only=False):
+    return (
         f"DRIVER={{{driver}}};"
-        f"SERVER={server};"
-        f"DATABASE={database};"
+        f"SERVER={target_server};"
+        f"DATABASE={target_database};"
         f"UID={username};"
         f"PWD={password};"
+        # lets an availability group listener route the connection to a readable secondary
+        + ("ApplicationIntent=ReadOnly;" if read_only else "")
     )
-    conn = await aioodbc.connect(dsn=dsn, autocommit=True)
-    return conn
\ No newline at end of file
+
+
+# --- Pool lifecycle (called from the FastAPI lifespan in main.py) ---
+async def init_db_pool(pool=None, replica_pool=None):
+    """
+    Opens the primary pool, and the replica pool when DB_REPLICA_SERVER is set. `pool` and
+    `replica_pool` install already-built ones instead (e.g. the benchmarks' in-memory stand-ins).
+    """
+    global _pool, _replica_pool, _replica_lag_task
+    if _pool is not None:
+        return _pool
+    if pool is not None:
+        _pool = pool
+    else:
+        _pool = await aioodbc.create_pool(
+            dsn=_build_dsn(),
+            minsize=POOL_MIN_SIZE,
+            maxsize=POOL_MAX_SIZE,
+            pool_recycle=POOL_RECYCLE_SECONDS,
+            autocommit=True,
+        )
+        logger.info(f"Database pool ready (min={POOL_MIN_SIZE}, max={POOL_MAX_SIZE}).")
+
+    _replica_pool = replica_pool
+    if REPLICA_SERVER and pool is None and WEB_WORKERS > 1 and not REPLICA_MULTI_WORKER:
+        logger.warning(f"Replica reads are off: {WEB_WORKERS} workers cannot share read-your-writes pins "
+                       "unless clients send the pin cookie back (set DB_REPLICA_MULTI_WORKER=1 if they do).")
+    elif replica_pool is not None or (REPLICA_SERVER and pool is None):
+        # Reads stay on the primary until the first lag check has passed.
+        _replica_lag_task = asyncio.create_task(_replica_lag_loop())
+    return _pool
+
+
+async def _open_replica_pool():
+    global _replica_pool
+    _replica_pool = await aioodbc.create_pool(
+        dsn=_build_dsn(REPLICA_SERVER, REPLICA_DATABASE, read_only=True),
+        minsize=REPLICA_POOL_MIN_SIZE,
+        maxsize=REPLICA_POOL_MAX_SIZE,
+        pool_recycle=POOL_RECYCLE_SECONDS,
+        autocommit=True,
+    )
+    logger.info(f"Replica pool ready on {REPLICA_SERVER} (min={REPLICA_POOL_MIN_SIZE}, max={REPLICA_POOL_MAX_SIZE}).")
+
+
+async def close_db_pool():
+    global _pool, _replica_pool, _replica_lag_task
+    if _replica_lag_task is not None:
+        task, _replica_lag_task = _replica_lag_task, None
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    _replica_state.update(lag_seconds=None, checked_at=None)
+    _pinned_until.clear()
+    if _replica_pool is not None:
+        replica_pool, _replica_pool = _replica_pool, None
+        replica_pool.close()
+        await replica_pool.wait_closed()
+        logger.info("Replica pool closed.")
+    if _pool is None:
+        return
+    pool, _pool = _pool, None
+    pool.close()
+    await pool.wait_closed()
+    logger.info("Database pool closed.")
+
+
+async def _is_healthy(conn):
+    if conn.closed:
+        return False
+    if asyncio.get_running_loop().time() - conn.last_usage < POOL_PING_AFTER_SECONDS:
+        return True
+    try:
+        async with conn.cursor() as cursor:
+            await cursor.execute("SELECT 1")
+            await cursor.fetchone()
+        return True
+    except Exception as e:
+        logger.warning(f"Discarding pooled connection that failed its health check: {e}")
+        return False
+
+
+_pending_releases = set()  # release tasks for abandoned acquires, kept referenced until done
+
+
+def _abandon_acquire(pool, acquiring: asyncio.Future):
+    """Cancels an acquire nobody waits for any more and releases the connection if it got one anyway."""
+    def release_if_acquired(task: asyncio.Future):
+        if task.cancelled() or task.exception() is not None:
+            return
+        release = asyncio.ensure_future(pool.release(task.result()))
+        _pending_releases.add(release)
+        release.add_done_callback(_pending_releases.discard)
+
+    acquiring.add_done_callback(release_if_acquired)
+    acquiring.cancel()
+
+
+async def _checkout(pool=None, stats=None):
+    """Takes a healthy connection from a pool (the primary by default), waiting at most POOL_ACQUIRE_TIMEOUT seconds."""
+    if pool is None:
+        pool, stats = _pool, _pool_stats
+    if pool is None:
+        raise RuntimeError("Database pool is not initialised. Call init_db_pool() on startup.")
+
+    started = time.perf_counter()
+    deadline = started + POOL_ACQUIRE_TIMEOUT
+    while True:
+        remaining = deadline - time.perf_counter()
+        # The acquire runs as its own task behind a shield, so a timeout (or the request being
+        # cancelled) never interrupts it halfway: whatever it still hands out is released.
+        acquiring = asyncio.ensure_future(pool.acquire())
+        try:
+            conn = await asyncio.wait_for(asyncio.shield(acquiring), timeout=max(remaining, 0))
+        except asyncio.TimeoutError:
+            stats["timeouts"] += 1
+            _abandon_acquire(pool, acquiring)
+            raise
+        except asyncio.CancelledError:
+            _abandon_acquire(pool, acquiring)
+            raise
+        if await _is_healthy(conn):
+            break
+        stats["failed_health_checks"] += 1
+        await conn.close()
+        await pool.release(conn)
+
+    waited = time.perf_counter() - started
+    stats["acquired"] += 1
+    stats["total_wait_seconds"] += waited
+    stats["max_wait_seconds"] = max(stats["max_wait_seconds"], waited)
+    return conn
+
+
+# --- Read/write routing ---
+class ReadClient(NamedTuple):
+    key: str               # bearer token (hashed), else the client's address
+    cookie_until: float    # wall-clock end of the pin the client sent back in its cookie, else 0
+
+
+def client_key(request: Request) -> ReadClient:
+    """Identifies the client for read-your-writes pinning, with the pin its cookie carries."""
+    authorization = request.headers.get("authorization")
+    if authorization:
+        key = hashlib.sha256(authorization.encode()).hexdigest()[:32]
+    else:
+        key = request.client.host if request.client else ""
+    try:
+        cookie_until = float(request.cookies.get(READ_YOUR_WRITES_COOKIE) or 0.0)
+    except ValueError:
+        cookie_until = 0.0
+    return ReadClient(key, cookie_until)
+
+
+def replica_configured() -> bool:
+    return _replica_pool is not None or _replica_lag_task is not None
+
+
+def pin_to_primary(client: Optional[ReadClient], response: Optional[Response] = None):
+    """
+    Keeps the client's reads on the primary until the replica has surely caught up with its
+    write: in this worker process, and, through `response`'s cookie, in every other worker.
+    """
+    if client is None or not replica_configured():
+        return
+    now = time.monotonic()
+    window = max(READ_YOUR_WRITES_SECONDS, (_replica_state["lag_seconds"] or 0.0) + REPLICA_LAG_CHECK_SECONDS)
+    if len(_pinned_until) >= MAX_PINNED_CLIENTS:
+        for key in [key for key, until in _pinned_until.items() if until <= now]:
+            del _pinned_until[key]
+    _pinned_until[client.key] = now + window
+    if response is not None:
+        response.set_cookie(READ_YOUR_WRITES_COOKIE, f"{time.time() + window:.3f}", max_age=int(window) + 1,
+                            httponly=True, samesite="lax")
+
+
+def _is_pinned(client: Optional[ReadClient]) -> bool:
+    if client is None:
+        return False
+    return _pinned_until.get(client.key, 0.0) > time.monotonic() or client.cookie_until > time.time()
+
+
+def replica_is_current() -> bool:
+    """True while the last lag check is recent and within REPLICA_MAX_LAG_SECONDS."""
+    lag, checked_at = _replica_state["lag_seconds"], _replica_state["checked_at"]
+    if _replica_pool is None or lag is None or checked_at is None:
+        return False
+    # a stalled lag check must not keep a replica in use that has since fallen behind
+    stale_after = REPLICA_MAX_LAG_SECONDS + REPLICA_LAG_CHECK_SECONDS
+    return lag <= REPLICA_MAX_LAG_SECONDS and time.monotonic() - checked_at <= stale_after
+
+
+def _count_read(target: str):
+    _read_routing[target] += 1
+    DB_READ_CONNECTIONS.inc(target)
+
+
+async def _checkout_for_read(client: Optional[ReadClient]):
+    """(pool, connection) for a read: the replica when it is current and the client is not pinned, else the primary."""
+    if replica_configured():
+        if _is_pinned(client):
+            _count_read("primary_pinned")
+        elif not replica_is_current():
+            _count_read("primary_lagging")
+        else:
+            try:
+                conn = await _checkout(_replica_pool, _replica_pool_stats)
+                _count_read("replica")
+                return _replica_pool, conn
+            except Exception as e:
+                _count_read("primary_unavailable")
+                logger.warning(f"Replica connection unavailable, reading from the primary: {e!r}")
+    return _pool, await _checkout()
+
+
+@asynccontextmanager
+async def acquire_connection(read_only: bool = False, client: Optional[ReadClient] = None):
+    """
+    Borrows a pooled connection for code that runs outside a request (background jobs, scripts,
+    streamed responses). `read_only` lets it come from the replica; pass the request's
+    client_key() as `client` so the client's own recent writes are visible.
+    """
+    if read_only:
+        pool, conn = await _checkout_for_read(client)
+    else:
+        pool, conn = _pool, await _checkout()
+    try:
+        yield instrument_connection(conn)
+    finally:
+        await pool.release(conn)
+
+
+@asynccontextmanager
+async def transaction(conn):
+    """Runs the enclosed statements as one transaction on an autocommit pooled connection."""
+    conn.autocommit = False
+    try:
+        yield conn
+        await conn.commit()
+    except BaseException:
+        await conn.rollback()
+        raise
+    finally:
+        conn.autocommit = True
+
+
+# --- Replica lag check (runs while a replica is configured) ---
+async def measure_replica_lag() -> float:
+    """Writes a heartbeat on the primary and returns how far behind it the replica's copy is, in seconds."""
+    async with acquire_connection() as conn:
+        async with conn.cursor() as cursor:
+            await cursor.execute(SQL_WRITE_HEARTBEAT)
+            written = (await cursor.fetchone())[0]
+    conn = await _checkout(_replica_pool, _replica_pool_stats)
+    try:
+        async with instrument_connection(conn).cursor() as cursor:
+            await cursor.execute(SQL_READ_HEARTBEAT)
+            seen = (await cursor.fetchone())[0]
+    finally:
+        await _replica_pool.release(conn)
+    return max(0.0, (written - seen).total_seconds())
+
+
+async def _replica_lag_loop():
+    was_current = failing = False
+    while True:
+        # sleeps first, so the startup migrations have created the heartbeat table
+        await asyncio.sleep(REPLICA_LAG_CHECK_SECONDS)
+        try:
+            if _replica_pool is None:
+                await _open_replica_pool()
+            # a check slower than the lag allowance counts as a failure
+            lag = await asyncio.wait_for(measure_replica_lag(), timeout=max(REPLICA_MAX_LAG_SECONDS, 1.0))
+            _replica_state.update(lag_seconds=lag, checked_at=time.monotonic())
+            failing = False
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            _replica_state.update(lag_seconds=None, checked_at=None)
+            _replica_state["lag_check_errors"] += 1
+            if not failing:
+                logger.warning(f"Replica lag check failed, reading from the primary until it passes: {e!r}")
+            failing = True
+        is_current = replica_is_current()
+        if is_current != was_current:
+            if is_current:
+                logger.info(f"Replica is current (lag {_replica_state['lag_seconds']:.3f}s), routing reads to it.")
+            elif _replica_state["lag_seconds"] is not None:
+                logger.warning(f"Replica lag {_replica_state['lag_seconds']:.3f}s is over "
+                               f"{REPLICA_MAX_LAG_SECONDS}s, reading from the primary.")
+            was_current = is_current
+
+
+# --- FastAPI dependencies that hand routers a pooled connection ---
+# Routers declare their intent by the dependency they use: get_db_connection for anything that
+# writes (always the primary), get_read_connection for reads that may be served by the replica.
+def _database_busy():
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="The database is busy. Please try again.",
+        headers={"Retry-After": "1"},
+    )
+
+
+async def get_db_connection(request: Request, response: Response):
+    """Write intent: a primary connection. The client's reads then stay on the primary for a while."""
+    client = client_key(request)
+    # Set up front: also covers reads the client sends while this write is in progress, and
+    # the cookie must be on the response before the endpoint's body is sent.
+    pin_to_primary(client, response)
+    try:
+        conn = await _checkout()
+    except asyncio.TimeoutError:
+        raise _database_busy()
+    try:
+        yield instrument_connection(conn)
+    finally:
+        await _pool.release(conn)
+        pin_to_primary(client)
+
+
+async def get_read_connection(request: Request):
+    """Read intent: a replica connection when one is current, otherwise a primary one."""
+    try:
+        pool, conn = await _checkout_for_read(client_key(request))
+    except asyncio.TimeoutError:
+        raise _database_busy()
+    try:
+        yield instrument_connection(conn)
+    finally:
+        await pool.release(conn)
+
+
+def _describe_pool(pool, stats, min_size, max_size):
+    acquired = stats["acquired"]
+    described = {
+        "min_size": min_size,
+        "max_size": max_size,
+        "size": 0,
+        "in_use": 0,
+        "idle": 0,
+        "acquired": acquired,
+        "timeouts": stats["timeouts"],
+        "failed_health_checks": stats["failed_health_checks"],
+        "avg_wait_ms": round(stats["total_wait_seconds"] / acquired * 1000, 3) if acquired else 0.0,
+        "max_wait_ms": round(stats["max_wait_seconds"] * 1000, 3),
+    }
+    if pool is not None:
+        described["size"] = pool.size
+        described["idle"] = pool.freesize
+        described["in_use"] = pool.size - pool.freesize
+    return described
+
+
+def get_pool_stats():
+    return _describe_pool(_pool, _pool_stats, POOL_MIN_SIZE, POOL_MAX_SIZE)
+
+
+def get_replica_stats():
+    lag, checked_at = _replica_state["lag_seconds"], _replica_state["checked_at"]
+    now = time.monotonic()
+    return {
+        "configured": replica_configured(),
+        "current": replica_is_current(),
+        "lag_seconds": round(lag, 3) if lag is not None else None,
+        "max_lag_seconds": REPLICA_MAX_LAG_SECONDS,
+        "last_check_seconds_ago": round(now - checked_at, 3) if checked_at is not None else None,
+        "lag_check_errors": _replica_state["lag_check_errors"],
+        "read_your_writes_seconds": READ_YOUR_WRITES_SECONDS,
+        "workers": WEB_WORKERS,
+        "pinned_clients": sum(1 for until in _pinned_until.values() if until > now),
+        "reads": dict(_read_routing),
+        "pool": _describe_pool(_replica_pool, _replica_pool_stats, REPLICA_POOL_MIN_SIZE, REPLICA_POOL_MAX_SIZE),
+    }
+
+
+DB_POOL_CONNECTIONS = connection_pool_gauge(
+    "db_pool_connections", "Pooled database connections by state.", get_pool_stats, ("size", "in_use", "idle"),
+)
+DB_REPLICA_POOL_CONNECTIONS = connection_pool_gauge(
+    "db_replica_pool_connections", "Pooled replica connections by state.",
+    lambda: get_replica_stats()["pool"], ("size", "in_use", "idle"),
+)
+DB_REPLICA_LAG_SECONDS = Gauge(
+    "db_replica_lag_seconds", "How far the replica is behind the primary, from the last lag check.",
+    collect=lambda: {(): _replica_state["lag_seconds"]} if _replica_state["lag_seconds"] is not None else {},
+    aggregate="max",
+)
+DB_READ_CONNECTIONS = Counter(
+    "db_read_connections_total", "Read-intent connections by where they went (replica, or primary and why).", ["target"],
+)
@@ -0,0 +1,216 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Dict, List, NamedTuple, Optional
+
+from database import acquire_connection
+from discount_engine import DiscountRules
+
+logger = logging.getLogger(__name__)
+
+# How often to run the cheap "did Discounts change?" probe, which also catches edits
+# made outside DiscountServices (SSMS, scripts).
+DISCOUNT_CATALOG_CHECK_SECONDS = float(os.getenv("DISCOUNT_CATALOG_CHECK_SECONDS", "15"))
+
+# Everything that is Active and not yet expired, so discounts that start later are
+# already in memory when their ValidFrom passes.
+SQL_LOAD_DISCOUNTS = """
+    SELECT DiscountID, DiscountName, ProductName, DiscountType, PercentageValue,
+           FixedValue, MinimumSpend, ValidFrom, ValidTo
+    FROM Discounts
+    WHERE Status = 'Active' AND ValidTo >= GETUTCDATE()
+"""
+
+# Fallback before the catalog has loaded: only the discounts a sale names. The names travel as
+# one JSON array, so the statement is the same whether one discount is named or ten.
+SQL_DISCOUNTS_BY_NAME = """
+    SELECT d.DiscountID, d.DiscountName, d.ProductName, d.DiscountType, d.PercentageValue,
+           d.FixedValue, d.MinimumSpend, d.ValidFrom, d.ValidTo
+    FROM OPENJSON(?) WITH (DiscountName NVARCHAR(255) '$') AS j
+    JOIN Discounts AS d ON d.DiscountName = j.DiscountName
+    WHERE d.Status = 'Active' AND GETUTCDATE() BETWEEN d.ValidFrom AND d.ValidTo
+"""
+
+# Discounts.RowVer (DiscountServices migration 5) moves on every insert and update, and the
+# count catches deletes. Both come from the narrow IX_Discounts_RowVer index: MAX is a
+# single seek to its last key, where a checksum over every column read the whole table.
+SQL_CHANGE_TOKEN = """
+    SELECT COUNT_BIG(*), MAX(RowVer)
+    FROM Discounts
+"""
+
+
+class ActiveDiscount(NamedTuple):
+    DiscountID: int
+    DiscountName: str
+    ProductName: Optional[str]
+    DiscountType: str
+    PercentageValue: Optional[Decimal]
+    FixedValue: Optional[Decimal]
+    MinimumSpend: Optional[Decimal]
+    ValidFrom: datetime
+    ValidTo: datetime
+
+
+def utc_now() -> datetime:
+    # Discounts store naive UTC datetimes (compared against GETUTCDATE()).
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class DiscountCatalog:
+    """
+    Versioned in-process copy of the active discounts. Lookups are evaluated against the
+    current time locally; the refresher wakes at the next ValidFrom/ValidTo boundary and on
+    every change-check interval, reloading only when the Discounts table actually changed.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self._by_name: Optional[Dict[str, ActiveDiscount]] = None
+        self._rules: Optional[DiscountRules] = None
+        self._change_token = None
+        self._checked_at: Optional[float] = None
+        self._loaded_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._reload_lock = asyncio.Lock()
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "reloads": 0,
+            "invalidations": 0,
+            "boundary_wakeups": 0,
+            "failed_checks": 0,
+        }
+
+    @property
+    def loaded(self) -> bool:
+        return self._by_name is not None
+
+    def rules(self) -> Optional[DiscountRules]:
+        """The loaded discounts compiled for pricing (callers pass the current time), or None when not loaded."""
+        rules = self._rules
+        if rules is None:
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        return rules
+
+    def active(self, now: Optional[datetime] = None) -> Optional[List[ActiveDiscount]]:
+        by_name = self._by_name
+        if by_name is None:
+            return None
+        now = now or utc_now()
+        return [d for d in by_name.values() if d.ValidFrom <= now <= d.ValidTo]
+
+    # --- Loading ---
+
+    async def _read_change_token(self, cursor):
+        await cursor.execute(SQL_CHANGE_TOKEN)
+        row = await cursor.fetchone()
+        return (row[0], row[1])
+
+    async def reload(self):
+        async with self._reload_lock:
+            async with acquire_connection() as conn:
+                async with conn.cursor() as cursor:
+                    token = await self._read_change_token(cursor)
+                    await cursor.execute(SQL_LOAD_DISCOUNTS)
+                    rows = await cursor.fetchall()
+            # Build the new map and its rules completely, then swap them in together.
+            by_name = {row.DiscountName: ActiveDiscount(*row) for row in rows}
+            self._by_name, self._rules = by_name, DiscountRules(by_name.values())
+            self._change_token = token
+            self._loaded_at = self._checked_at = time.monotonic()
+            self.version += 1
+            self.stats["reloads"] += 1
+            logger.info(f"Discount catalog v{self.version} loaded ({len(rows)} discounts).")
+        self._wakeup.set()
+
+    async def check_for_changes(self) -> bool:
+        async with acquire_connection() as conn:
+            async with conn.cursor() as cursor:
+                token = await self._read_change_token(cursor)
+        self._checked_at = time.monotonic()
+        if token != self._change_token:
+            await self.reload()
+            return True
+        return False
+
+    async def invalidate(self):
+        """Reloads right away; called after discount CRUD."""
+        self.stats["invalidations"] += 1
+        await self.reload()
+
+    # --- Background refresher ---
+
+    def _seconds_to_next_boundary(self) -> Optional[float]:
+        by_name = self._by_name
+        if not by_name:
+            return None
+        now = utc_now()
+        upcoming = [b for d in by_name.values() for b in (d.ValidFrom, d.ValidTo) if b > now]
+        if not upcoming:
+            return None
+        return max((min(upcoming) - now).total_seconds(), 0.0)
+
+    async def _run(self):
+        while True:
+            timeout = DISCOUNT_CATALOG_CHECK_SECONDS
+            boundary = self._seconds_to_next_boundary()
+            at_boundary = boundary is not None and boundary < timeout
+            if at_boundary:
+                timeout = boundary + 0.001
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                self._wakeup.clear()
+                continue  # reloaded elsewhere: recompute the next boundary
+            except asyncio.TimeoutError:
+                pass
+            if at_boundary:
+                # A discount just started or ended; lookups already honour the new
+                # window, so only the version moves.
+                self.version += 1
+                self.stats["boundary_wakeups"] += 1
+                continue
+            try:
+                await self.check_for_changes()
+            except Exception as e:
+                self.stats["failed_checks"] += 1
+                logger.warning(f"Discount catalog change check failed: {e}")
+
+    async def start(self):
+        try:
+            await self.reload()
+        except Exception as e:
+            # Sales fall back to querying Discounts until the next successful check.
+            logger.error(f"Could not load the discount catalog at startup: {e}")
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="discount-catalog-refresher")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def get_stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "version": self.version,
+            "loaded": self.loaded,
+            "discounts": len(self._by_name or {}),
+            "seconds_since_load": round(now - self._loaded_at, 3) if self._loaded_at else None,
+            "seconds_since_check": round(now - self._checked_at, 3) if self._checked_at else None,
+            "check_interval_seconds": DISCOUNT_CATALOG_CHECK_SECONDS,
+            **self.stats,
+        }
+
+
+discount_catalog = DiscountCatalog()
@@ -0,0 +1,105 @@
+import bisect
+import os
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# How discounts are picked for a sale:
+# - DISCOUNT_AUTO_APPLY=0 (default): only the discounts the cashier applied by name, as before.
+#   =1: every active discount the cart qualifies for, found through the indexes below.
+# - DISCOUNT_POLICY=stack (default): all qualifying discounts add up, capped at the subtotal.
+#   =best: only the single largest one.
+DISCOUNT_AUTO_APPLY = os.getenv("DISCOUNT_AUTO_APPLY", "0") == "1"
+DISCOUNT_POLICY = os.getenv("DISCOUNT_POLICY", "stack")
+DISCOUNT_POLICIES = ("stack", "best")
+if DISCOUNT_POLICY not in DISCOUNT_POLICIES:
+    raise ValueError(f"DISCOUNT_POLICY must be one of: {', '.join(DISCOUNT_POLICIES)}.")
+
+
+def _discount_amount(discount, base: Decimal, quantity: int) -> Decimal:
+    """Percentage of `base`, or the fixed value (per unit for product discounts, capped at `base`)."""
+    if discount.DiscountType == 'Percentage' and discount.PercentageValue is not None:
+        return (base * discount.PercentageValue) / Decimal('100')
+    if discount.DiscountType == 'Fixed' and discount.FixedValue is not None:
+        if discount.ProductName:
+            return min(discount.FixedValue * quantity, base)
+        return discount.FixedValue
+    return Decimal('0.0')
+
+
+class DiscountRules:
+    """
+    Active discounts compiled for pricing carts. A discount with a ProductName applies to the
+    cart lines for that product (its price times quantity, add-ons excluded); one without
+    applies to the order subtotal. MinimumSpend is always checked against the order subtotal.
+
+    Product discounts are indexed by product name and order discounts are sorted by
+    MinimumSpend, so finding the candidates for a cart is one probe per distinct product plus
+    one bisect: O(items + matches), however many discounts are active.
+
+    Requested names match case-insensitively (by their casefold), as they do in SQL Server
+    under the database's default collation.
+    """
+
+    def __init__(self, discounts: Iterable):
+        self.by_name = {}
+        self.by_product: Dict[str, list] = defaultdict(list)
+        order_level = []
+        for discount in discounts:
+            self.by_name[discount.DiscountName.casefold()] = discount
+            if discount.ProductName:
+                self.by_product[discount.ProductName].append(discount)
+            else:
+                order_level.append(discount)
+        order_level.sort(key=lambda d: d.MinimumSpend or Decimal('0.0'))
+        self.order_level = order_level
+        self._thresholds = [d.MinimumSpend or Decimal('0.0') for d in order_level]
+        self.by_product = dict(self.by_product)
+
+    def __len__(self) -> int:
+        return len(self.by_name)
+
+    def candidates(self, products: Iterable[str], subtotal: Decimal,
+                   requested: Optional[Sequence[str]] = None) -> list:
+        """Discounts that may apply to a cart: the requested names, or everything the index matches."""
+        if requested is not None:
+            keys = dict.fromkeys(name.casefold() for name in requested)
+            return [self.by_name[key] for key in keys if key in self.by_name]
+        found = []
+        for product in products:
+            found += self.by_product.get(product, ())
+        found += self.order_level[:bisect.bisect_right(self._thresholds, subtotal)]
+        return found
+
+    def price(self, cart_items, unit_prices: List[Decimal], subtotal: Decimal, now: datetime,
+              requested: Optional[Sequence[str]] = None, policy: str = DISCOUNT_POLICY) -> Tuple[Decimal, List[dict]]:
+        """
+        (total discount, [{"id", "amount"}] per applied discount) for a priced cart, with the
+        discounts valid at `now`. `requested=None` auto-applies every qualifying discount.
+        """
+        product_totals: Dict[str, list] = {}  # product -> [quantity, amount]
+        for item, unit_price in zip(cart_items, unit_prices):
+            totals = product_totals.setdefault(item.name, [0, Decimal('0.0')])
+            totals[0] += item.quantity
+            totals[1] += unit_price * item.quantity
+
+        applied = []
+        for discount in self.candidates(product_totals, subtotal, requested):
+            if not (discount.ValidFrom <= now <= discount.ValidTo):
+                continue
+            if subtotal < (discount.MinimumSpend or Decimal('0.0')):
+                continue
+            if discount.ProductName:
+                totals = product_totals.get(discount.ProductName)
+                if totals is None:
+                    continue
+                amount = _discount_amount(discount, totals[1], totals[0])
+            else:
+                amount = _discount_amount(discount, subtotal, 1)
+            applied.append({"id": discount.DiscountID, "amount": amount})
+
+        if policy == "best" and applied:
+            applied = [max(applied, key=lambda d: d["amount"])]
+        total_discount = sum((d["amount"] for d in applied), Decimal('0.0'))
+        return min(total_discount, subtotal), applied
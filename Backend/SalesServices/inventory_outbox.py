@@ -0,0 +1,327 @@
+import asyncio
+import json
+import logging
+import os
+import random
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import httpx
+
+from database import acquire_connection
+from http_client import get_http_client
+
+logger = logging.getLogger(__name__)
+
+# --- URLs for Inventory Deduction Endpoints ---
+# NOTE: Use the correct URLs for your services. The inventory service might be on one port.
+INGREDIENTS_DEDUCT_URL = "http://127.0.0.1:8002/ingredients/ingredients/deduct-from-sale"
+MATERIALS_DEDUCT_URL = "http://127.0.0.1:8003/materials/materials/deduct-from-sale"
+DEDUCTION_TARGETS = {
+    "ingredients": INGREDIENTS_DEDUCT_URL,
+    "materials": MATERIALS_DEDUCT_URL,
+}
+
+# The dispatcher authenticates to the inventory services with this service token; cashiers'
+# tokens are never stored with the rows. Required unless the dispatcher is disabled (e.g. on
+# workers that only take sales while another process delivers the outbox).
+OUTBOX_DISPATCHER_ENABLED = os.getenv("OUTBOX_DISPATCHER_ENABLED", "1") == "1"
+INVENTORY_SERVICE_TOKEN = os.getenv("INVENTORY_SERVICE_TOKEN")
+
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "25"))          # sales coalesced per request
+OUTBOX_CONCURRENCY = int(os.getenv("OUTBOX_CONCURRENCY", "4"))         # requests in flight at once
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "2"))
+OUTBOX_LEASE_SECONDS = int(os.getenv("OUTBOX_LEASE_SECONDS", "60"))    # claimed rows are hidden this long
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_BACKOFF_BASE_SECONDS = float(os.getenv("OUTBOX_BACKOFF_BASE_SECONDS", "2"))
+OUTBOX_BACKOFF_MAX_SECONDS = float(os.getenv("OUTBOX_BACKOFF_MAX_SECONDS", "600"))
+
+OUTBOX_TABLE_DDL = """
+IF OBJECT_ID('dbo.InventoryOutbox', 'U') IS NULL
+BEGIN
+    CREATE TABLE dbo.InventoryOutbox (
+        OutboxID BIGINT IDENTITY(1,1) PRIMARY KEY,
+        SaleID INT NOT NULL,
+        Target VARCHAR(20) NOT NULL,
+        Payload NVARCHAR(MAX) NOT NULL,
+        AuthToken NVARCHAR(2000) NULL,
+        Status VARCHAR(10) NOT NULL DEFAULT 'pending',
+        Attempts INT NOT NULL DEFAULT 0,
+        NextAttemptAt DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME(),
+        LastError NVARCHAR(1000) NULL,
+        CreatedAt DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME()
+    );
+    CREATE INDEX IX_InventoryOutbox_Pending
+        ON dbo.InventoryOutbox (NextAttemptAt)
+        WHERE Status = 'pending';
+END
+"""
+
+
+# Claimed rows move to 'sending' before their POST, with NextAttemptAt as the lease, and
+# Attempts counts the failed ones. A row still 'sending' when its lease runs out (the worker
+# died mid-delivery, or could not record the outcome for a whole lease) counts as a failed
+# attempt and goes back to 'pending', or to 'dead' once it reaches OUTBOX_MAX_ATTEMPTS, so it
+# is claimed again right away. READPAST lets several dispatchers claim disjoint rows. Seeks
+# IX_InventoryOutbox_Pending and IX_InventoryOutbox_Sending.
+SQL_CLAIM_DUE_ROWS = """
+    SET NOCOUNT ON;
+    UPDATE InventoryOutbox
+    SET Status = CASE WHEN Attempts + 1 >= ? THEN 'dead' ELSE 'pending' END,
+        Attempts = Attempts + 1,
+        LastError = 'Lease expired while sending.'
+    WHERE Status = 'sending' AND NextAttemptAt <= SYSUTCDATETIME();
+    UPDATE TOP (?) o WITH (ROWLOCK, READPAST)
+    SET Status = 'sending',
+        NextAttemptAt = DATEADD(SECOND, ?, SYSUTCDATETIME())
+    OUTPUT INSERTED.OutboxID, INSERTED.Target, INSERTED.Payload, INSERTED.Attempts
+    FROM InventoryOutbox AS o
+    WHERE o.Status = 'pending' AND o.NextAttemptAt <= SYSUTCDATETIME();
+"""
+
+# Failed rows of a dispatch round, as one JSON array of [OutboxID, delay in ms, error]:
+# back to 'pending' after their backoff, or 'dead' once out of attempts.
+SQL_RESCHEDULE_ROWS = """
+    UPDATE o
+    SET Status = CASE WHEN o.Attempts + 1 >= ? THEN 'dead' ELSE 'pending' END,
+        Attempts = o.Attempts + 1,
+        NextAttemptAt = DATEADD(MILLISECOND, j.DelayMs, SYSUTCDATETIME()),
+        LastError = j.LastError
+    FROM InventoryOutbox AS o
+    JOIN OPENJSON(?) WITH (OutboxID BIGINT '$[0]', DelayMs INT '$[1]', LastError NVARCHAR(1000) '$[2]') AS j
+        ON j.OutboxID = o.OutboxID
+    WHERE o.Status = 'sending';
+"""
+
+OUTBOX_SENDING_DDL = """
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE object_id = OBJECT_ID('dbo.InventoryOutbox') AND name = 'IX_InventoryOutbox_Sending')
+    CREATE INDEX IX_InventoryOutbox_Sending
+        ON dbo.InventoryOutbox (NextAttemptAt)
+        WHERE Status = 'sending';
+UPDATE dbo.InventoryOutbox SET AuthToken = NULL WHERE Status = 'dead' AND AuthToken IS NOT NULL;
+"""
+
+OUTBOX_DROP_AUTH_TOKEN_DDL = """
+IF COL_LENGTH('dbo.InventoryOutbox', 'AuthToken') IS NOT NULL
+    ALTER TABLE dbo.InventoryOutbox DROP COLUMN AuthToken;
+"""
+
+# 4xx answers that are about the request as a whole, not one sale in it.
+BATCH_WIDE_STATUSES = {401, 403, 408, 429}
+
+# Delivered rows, as one JSON array of ids: one statement text for any batch size.
+SQL_DELETE_SENT_ROWS = """
+    DELETE FROM InventoryOutbox
+    WHERE OutboxID IN (SELECT OutboxID FROM OPENJSON(?) WITH (OutboxID INT '$'))
+"""
+
+
+# --- Writing side: called inside the create_sale transaction ---
+
+def build_deduction_payload(cart_items) -> dict:
+    return {"cartItems": [{"name": item.name, "quantity": item.quantity} for item in cart_items]}
+
+
+async def enqueue_inventory_deductions(cursor, sale_id: int, cart_items):
+    """Records one outbox row per inventory target. Must run in the same transaction as the sale."""
+    payload = json.dumps(build_deduction_payload(cart_items))
+    await cursor.execute(
+        "INSERT INTO InventoryOutbox (SaleID, Target, Payload) VALUES (?, ?, ?), (?, ?, ?)",
+        sale_id, "ingredients", payload,
+        sale_id, "materials", payload,
+    )
+
+
+async def enqueue_inventory_deductions_bulk(cursor, sales: List[tuple]):
+    """Same as enqueue_inventory_deductions for many (sale_id, cart_items) pairs, in one statement."""
+    if not sales:
+        return
+    rows = [
+        [sale_id, target, json.dumps(build_deduction_payload(cart_items))]
+        for sale_id, cart_items in sales
+        for target in DEDUCTION_TARGETS
+    ]
+    await cursor.execute(
+        """
+        INSERT INTO InventoryOutbox (SaleID, Target, Payload)
+        SELECT j.SaleID, j.Target, j.Payload
+        FROM OPENJSON(?) WITH (SaleID INT '$[0]', Target VARCHAR(20) '$[1]', Payload NVARCHAR(MAX) '$[2]') AS j
+        """,
+        json.dumps(rows),
+    )
+
+
+# --- Dispatching side ---
+
+def coalesce_payloads(payloads: List[dict]) -> dict:
+    """Merges several sales into one deduction request, summing quantities per item name."""
+    totals: Dict[str, int] = OrderedDict()
+    for payload in payloads:
+        for item in payload.get("cartItems", []):
+            totals[item["name"]] = totals.get(item["name"], 0) + item["quantity"]
+    return {"cartItems": [{"name": name, "quantity": quantity} for name, quantity in totals.items()]}
+
+
+def backoff_seconds(attempts: int) -> float:
+    delay = min(OUTBOX_BACKOFF_BASE_SECONDS * (2 ** max(attempts - 1, 0)), OUTBOX_BACKOFF_MAX_SECONDS)
+    return delay * random.uniform(0.5, 1.0)
+
+
+class InventoryOutboxDispatcher:
+    """Background task that drains InventoryOutbox into the inventory services."""
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._semaphore = asyncio.Semaphore(OUTBOX_CONCURRENCY)
+        self._unconfirmed: List[int] = []  # delivered rows whose delete failed; retried every round
+        self.stats = {"sent_rows": 0, "sent_requests": 0, "failed_requests": 0, "split_batches": 0, "dead_lettered": 0}
+
+    def start(self):
+        if not OUTBOX_DISPATCHER_ENABLED:
+            logger.info("Inventory outbox dispatcher disabled (OUTBOX_DISPATCHER_ENABLED=0).")
+            return
+        if not INVENTORY_SERVICE_TOKEN:
+            raise RuntimeError("INVENTORY_SERVICE_TOKEN must be set while the inventory outbox dispatcher is enabled "
+                               "(set OUTBOX_DISPATCHER_ENABLED=0 on workers that should not deliver it).")
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run(), name="inventory-outbox-dispatcher")
+
+    async def stop(self):
+        """Finishes the round in progress, then exits."""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        await self._task
+        self._task = None
+
+    def notify(self):
+        """Wakes the dispatcher right away instead of waiting for the next poll."""
+        self._wakeup.set()
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                drained = await self.dispatch_once()
+            except Exception as e:
+                logger.error(f"Inventory outbox round failed: {e}", exc_info=True)
+                drained = 0
+            if drained and not self._stopping:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=OUTBOX_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def dispatch_once(self) -> int:
+        """Claims a round of due rows, sends them in coalesced batches, and records the outcome."""
+        if self._unconfirmed:
+            ids, self._unconfirmed = self._unconfirmed, []
+            await self._delete(ids)
+        async with acquire_connection() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(SQL_CLAIM_DUE_ROWS, OUTBOX_MAX_ATTEMPTS,
+                                     OUTBOX_BATCH_SIZE * OUTBOX_CONCURRENCY, OUTBOX_LEASE_SECONDS)
+                rows = await cursor.fetchall()
+        if not rows:
+            return 0
+
+        groups: Dict[str, list] = OrderedDict()
+        for row in rows:
+            groups.setdefault(row.Target, []).append(row)
+        batches = []
+        for target, group in groups.items():
+            for start in range(0, len(group), OUTBOX_BATCH_SIZE):
+                batches.append((target, group[start:start + OUTBOX_BATCH_SIZE]))
+
+        outcomes: Dict[int, Optional[str]] = {}  # OutboxID -> None when delivered, else the error
+        try:
+            for result in await asyncio.gather(*(self._send_batch(target, group, outcomes) for target, group in batches),
+                                               return_exceptions=True):
+                if isinstance(result, Exception):
+                    logger.error(f"Inventory outbox batch failed: {result}", exc_info=result)
+        finally:
+            # Every claimed row that was not delivered, including rows of a batch that was
+            # interrupted, is rescheduled in one statement.
+            failed = [(row, outcomes.get(row.OutboxID, "Delivery was interrupted.")) for row in rows
+                      if outcomes.get(row.OutboxID, "") is not None]
+            await self._reschedule(failed)
+        return len(rows)
+
+    async def _post(self, target: str, rows: list):
+        """Sends one coalesced request. Returns (error or None, whether the error is about a row rather than the batch)."""
+        payload = coalesce_payloads([json.loads(row.Payload) for row in rows])
+        headers = {"Authorization": f"Bearer {INVENTORY_SERVICE_TOKEN}"}
+
+        async with self._semaphore:
+            try:
+                response = await get_http_client().post(DEDUCTION_TARGETS[target], json=payload, headers=headers)
+                response.raise_for_status()
+            except httpx.HTTPStatusError as e:
+                code = e.response.status_code
+                return f"HTTP {code}: {e.response.text[:500]}", 400 <= code < 500 and code not in BATCH_WIDE_STATUSES
+            except Exception as e:
+                return f"{type(e).__name__}: {e}", False
+        return None, False
+
+    async def _send_batch(self, target: str, rows: list, outcomes: Dict[int, Optional[str]]):
+        error, row_specific = await self._post(target, rows)
+        if error is None:
+            self.stats["sent_requests"] += 1
+            self.stats["sent_rows"] += len(rows)
+            logger.info(f"Deducted {target} for {len(rows)} outbox row(s).")
+            outcomes.update((row.OutboxID, None) for row in rows)
+            await self._delete([row.OutboxID for row in rows])
+        elif row_specific and len(rows) > 1:
+            # One bad sale (e.g. an unknown item) rejects the whole request. Halve the batch until
+            # it is isolated, so the good sales go through and only the bad row is retried.
+            self.stats["split_batches"] += 1
+            middle = len(rows) // 2
+            await self._send_batch(target, rows[:middle], outcomes)
+            await self._send_batch(target, rows[middle:], outcomes)
+        else:
+            self.stats["failed_requests"] += 1
+            logger.warning(f"{target.upper()}-SYNC-RETRY: deduction for {len(rows)} outbox row(s) failed. Error: {error}")
+            outcomes.update((row.OutboxID, error) for row in rows)
+
+    async def _delete(self, ids: List[int]):
+        try:
+            async with acquire_connection() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(SQL_DELETE_SENT_ROWS, json.dumps(ids))
+        except Exception as e:
+            # The rows stay 'sending', so they are not sent again; the delete is retried next round.
+            logger.error(f"Could not delete {len(ids)} delivered outbox row(s), retrying next round: {e}")
+            self._unconfirmed.extend(ids)
+
+    async def _reschedule(self, failed: List[tuple]):
+        """Puts (row, error) pairs back to 'pending' after their backoff, or dead-letters them."""
+        if not failed:
+            return
+        for row, error in failed:
+            if row.Attempts + 1 >= OUTBOX_MAX_ATTEMPTS:
+                self.stats["dead_lettered"] += 1
+                logger.critical(f"{row.Target.upper()}-SYNC-FAILURE: outbox row {row.OutboxID} dead-lettered after {row.Attempts + 1} attempts. Error: {error}")
+        updates = [[row.OutboxID, int(backoff_seconds(row.Attempts + 1) * 1000), error[:1000]] for row, error in failed]
+        try:
+            async with acquire_connection() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(SQL_RESCHEDULE_ROWS, OUTBOX_MAX_ATTEMPTS, json.dumps(updates))
+        except Exception as e:
+            # The rows stay 'sending' and come back once their lease runs out.
+            logger.error(f"Could not reschedule {len(failed)} outbox row(s); they are retried when their lease expires: {e}")
+
+
+dispatcher = InventoryOutboxDispatcher()
+
+
+async def get_outbox_stats() -> dict:
+    async with acquire_connection() as conn:
+        async with conn.cursor() as cursor:
+            await cursor.execute("SELECT Status, COUNT(*) AS Total FROM InventoryOutbox GROUP BY Status")
+            counts = {row.Status: row.Total for row in await cursor.fetchall()}
+    return {"pending": counts.get("pending", 0), "dead": counts.get("dead", 0), **dispatcher.stats}
@@ -0,0 +1,28 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Readiness as seen by load balancers: "starting" until the lifespan has opened the pools and
+# loaded the caches, "ready" while serving, and "draining" from the moment shutdown begins.
+_state = "starting"
+
+
+def mark_ready():
+    global _state
+    _state = "ready"
+    logger.info("Service is ready.")
+
+
+def mark_draining():
+    global _state
+    if _state != "draining":
+        _state = "draining"
+        logger.info("Service is draining; readiness now reports 503.")
+
+
+def get_state() -> str:
+    return _state
+
+
+def is_ready() -> bool:
+    return _state == "ready"
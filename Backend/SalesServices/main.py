@@ -1,14 +1,60 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 
 # --- FIX: Correct the imports to match your filenames EXACTLY ---
 # We are importing the modules 'sales_router' and 'purchase_order' from the 'routers' package.
 from routers import pos_router, purchase_order
+from database import init_db_pool, close_db_pool, get_pool_stats, get_replica_stats
+from http_client import init_http_client, close_http_client
+from admission import (
+    ADMISSION_ENABLED, ADMISSION_REPORT_CONCURRENCY, AdmissionMiddleware, get_admission_stats, route_limit,
+    PRIORITY_WRITE, PRIORITY_READ, PRIORITY_REPORT,
+)
+from metrics import (
+    METRICS_ENABLED, MetricsMiddleware, render_metrics, snapshot_writer, CONTENT_TYPE as METRICS_CONTENT_TYPE,
+)
+from inventory_outbox import get_outbox_stats, dispatcher as outbox_dispatcher
+from discount_catalog import discount_catalog
+from price_catalog import price_catalog
+from order_stream import order_hub
+from sales_archive import archiver as sales_archiver
+from migrations import apply_migrations
+import lifecycle
+
+
+# --- Startup / shutdown: open the shared DB pool and HTTP client, run the outbox dispatcher ---
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await init_db_pool()
+    await init_http_client()
+    await apply_migrations()
+    outbox_dispatcher.start()
+    await discount_catalog.start()
+    await price_catalog.start()
+    order_hub.start()
+    sales_archiver.start()
+    snapshot_writer.start()
+    lifecycle.mark_ready()
+    yield
+    lifecycle.mark_draining()
+    await sales_archiver.stop()
+    await order_hub.stop()
+    await price_catalog.stop()
+    await discount_catalog.stop()
+    await outbox_dispatcher.stop()
+    await close_http_client()
+    await close_db_pool()
+    await snapshot_writer.stop()
+
 
 app = FastAPI(
     title="POS and Order Service API",
     description="Handles sales creation and retrieves processing orders.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # --- Include routers using the correct imported objects ---
@@ -21,6 +67,22 @@ app.include_router(pos_router.router_sales)
 app.include_router(purchase_order.router_purchase_order)
 
 
+# Admission control: tills first, then order boards, then admin reports (first match wins).
+ADMISSION_LIMITS = [
+    route_limit("sales write", "/auth/sales", PRIORITY_WRITE, methods=["POST"], queue_timeout=5.0),
+    route_limit("order status update", "/auth/purchase_orders/status", PRIORITY_WRITE, methods=["PATCH"], queue_timeout=5.0),
+    route_limit("sales export", "/auth/sales/export", PRIORITY_REPORT, max_concurrency=1, queue_timeout=1.0),
+    route_limit("sales summary", "/auth/sales/summary", PRIORITY_REPORT,
+                max_concurrency=ADMISSION_REPORT_CONCURRENCY, queue_timeout=1.0),
+    route_limit("order history", "/auth/purchase_orders/history", PRIORITY_REPORT,
+                max_concurrency=ADMISSION_REPORT_CONCURRENCY, queue_timeout=1.0),
+    route_limit("order board", "/auth/purchase_orders", PRIORITY_READ),
+]
+
+# Inside CORS, so a 503 from admission control still carries the CORS headers the browser needs
+if ADMISSION_ENABLED:
+    app.add_middleware(AdmissionMiddleware, limits=ADMISSION_LIMITS)
+
 # Your CORS middleware is good. No changes needed here.
 app.add_middleware(
     CORSMiddleware,
@@ -40,13 +102,77 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outermost, so the timings include CORS handling
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 # A simple root endpoint to easily check if the server is running
 @app.get("/", tags=["Health Check"])
 def read_root():
     return {"status": "ok", "message": "POS Service is running."}
 
+# Liveness: the worker's event loop is answering
+@app.get("/health/live", tags=["Health Check"])
+def read_liveness():
+    return {"status": "alive"}
+
+# Readiness: 503 while the worker is warming up or draining, or cannot price sales yet,
+# so load balancers skip it
+@app.get("/health/ready", tags=["Health Check"])
+def read_readiness():
+    if not lifecycle.is_ready():
+        return JSONResponse(status_code=503, content={"status": lifecycle.get_state()})
+    if not price_catalog.is_ready():
+        return JSONResponse(status_code=503, content={"status": "price_catalog_empty"})
+    return {"status": "ready"}
+
+# Connection pool usage, for sizing DB_POOL_MIN_SIZE / DB_POOL_MAX_SIZE
+@app.get("/health/db-pool", tags=["Health Check"])
+def read_db_pool_stats():
+    return get_pool_stats()
+
+# Replica lag, read-your-writes pins and where read-intent connections went
+@app.get("/health/db-replica", tags=["Health Check"])
+def read_db_replica_stats():
+    return get_replica_stats()
+
+# Pending / dead-lettered inventory deductions and dispatcher counters
+@app.get("/health/inventory-outbox", tags=["Health Check"])
+async def read_inventory_outbox_stats():
+    return await get_outbox_stats()
+
+# Discount catalog version, hit/miss and staleness counters
+@app.get("/health/discount-catalog", tags=["Health Check"])
+def read_discount_catalog_stats():
+    return discount_catalog.get_stats()
+
+# Price catalog version and reload counters
+@app.get("/health/price-catalog", tags=["Health Check"])
+def read_price_catalog_stats():
+    return price_catalog.get_stats()
+
+# Connected order screens, queue depth and slow-consumer resyncs
+@app.get("/health/order-stream", tags=["Health Check"])
+def read_order_stream_stats():
+    return order_hub.get_stats()
+
+# Archival runs, batches and sales moved to the history tables
+@app.get("/health/sales-archive", tags=["Health Check"])
+def read_sales_archive_stats():
+    return sales_archiver.get_stats()
+
+# Admission slots in use, queue depth and shed requests
+@app.get("/health/admission", tags=["Health Check"])
+def read_admission_stats():
+    return get_admission_stats()
+
+# Prometheus scrape target: request, SQL statement and outbound call timings
+@app.get("/metrics", tags=["Health Check"], response_class=PlainTextResponse)
+def read_metrics():
+    return PlainTextResponse(render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
 
-# Run app
+# Run app (single-process dev server with reload; production uses serve.py)
 if __name__ == "__main__":
     import uvicorn
     
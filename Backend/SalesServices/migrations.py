@@ -0,0 +1,104 @@
+"""
+Schema of the tables the sales service writes, and the indexes its hot queries need, as
+versioned steps (runner: schema_migrations.py). Applied at startup from the main.py lifespan.
+
+    python migrations.py status|apply
+"""
+from typing import List
+
+import schema_migrations
+from schema_migrations import Migration, create_index
+from database import REPLICA_HEARTBEAT_DDL
+from inventory_outbox import OUTBOX_TABLE_DDL, OUTBOX_SENDING_DDL, OUTBOX_DROP_AUTH_TOKEN_DDL
+from price_catalog import PRICE_TABLES_DDL, DEFAULT_ADDON_PRICES
+from sale_writes import SALE_WRITE_TABLES_DDL
+from sales_rollups import ROLLUP_TABLES_DDL
+from sales_archive import SALES_HISTORY_DDL, SALE_LINE_ADDONS_PRICE_DDL
+from routers.purchase_order import ORDER_CHANGE_TRACKING_DDL
+
+SERVICE = "sales"
+
+CORE_SALES_TABLES_DDL = """
+IF OBJECT_ID('dbo.Sales', 'U') IS NULL
+    CREATE TABLE dbo.Sales (
+        SaleID INT IDENTITY(1,1) PRIMARY KEY,
+        OrderType NVARCHAR(50) NOT NULL,
+        PaymentMethod NVARCHAR(50) NOT NULL,
+        CashierName NVARCHAR(100) NOT NULL,
+        TotalDiscountAmount DECIMAL(18, 2) NOT NULL DEFAULT 0,
+        Status VARCHAR(20) NOT NULL DEFAULT 'processing',
+        CreatedAt DATETIME NOT NULL DEFAULT GETDATE()
+    );
+IF OBJECT_ID('dbo.SaleItems', 'U') IS NULL
+    CREATE TABLE dbo.SaleItems (
+        SaleItemID INT IDENTITY(1,1) PRIMARY KEY,
+        SaleID INT NOT NULL REFERENCES dbo.Sales (SaleID),
+        ItemName NVARCHAR(255) NOT NULL,
+        Quantity INT NOT NULL,
+        UnitPrice DECIMAL(18, 2) NOT NULL,
+        Category NVARCHAR(100) NULL,
+        Addons NVARCHAR(MAX) NULL
+    );
+IF OBJECT_ID('dbo.SaleDiscounts', 'U') IS NULL
+    CREATE TABLE dbo.SaleDiscounts (
+        SaleDiscountID INT IDENTITY(1,1) PRIMARY KEY,
+        SaleID INT NOT NULL REFERENCES dbo.Sales (SaleID),
+        DiscountID INT NOT NULL,
+        DiscountAppliedAmount DECIMAL(18, 2) NOT NULL
+    );
+"""
+
+# The processing board (snapshot, probe and ETag) only reads processing sales, in CreatedAt
+# order. This filtered index carries every Sales column in ORDER_COLUMNS plus RowVer, so it
+# is read in order with no sort and no lookups, and it stays small as closed sales pile up.
+# The queries compare Status to the literal 'processing', which is what lets the optimizer
+# match the filter.
+HOT_QUERY_INDEXES_DDL = "".join([
+    create_index(
+        "Sales", "IX_Sales_Processing",
+        "(CreatedAt, SaleID) INCLUDE (OrderType, PaymentMethod, CashierName, TotalDiscountAmount, Status, RowVer) "
+        "WHERE Status = 'processing'",
+    ),
+    # Delta polls: RowVer >= ? AND RowVer < ? across every status.
+    create_index(
+        "Sales", "IX_Sales_RowVer",
+        "(RowVer) INCLUDE (CreatedAt, OrderType, PaymentMethod, CashierName, TotalDiscountAmount, Status)",
+    ),
+    # Rollup rebuilds and other date-range reads.
+    create_index(
+        "Sales", "IX_Sales_CreatedAt",
+        "(CreatedAt) INCLUDE (OrderType, PaymentMethod, CashierName, TotalDiscountAmount, Status)",
+    ),
+    # Sale lines are always read per sale, with all of their columns.
+    create_index(
+        "SaleItems", "IX_SaleItems_SaleID",
+        "(SaleID) INCLUDE (ItemName, Quantity, UnitPrice, Category, Addons)",
+    ),
+    create_index(
+        "SaleDiscounts", "IX_SaleDiscounts_SaleID",
+        "(SaleID) INCLUDE (DiscountID, DiscountAppliedAmount)",
+    ),
+])
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "core sales tables", CORE_SALES_TABLES_DDL),
+    Migration(2, "price tables", PRICE_TABLES_DDL, [v for pair in DEFAULT_ADDON_PRICES.items() for v in pair]),
+    Migration(3, "inventory outbox", OUTBOX_TABLE_DDL),
+    Migration(4, "sale idempotency keys", SALE_WRITE_TABLES_DDL),
+    Migration(5, "order change tracking columns", ORDER_CHANGE_TRACKING_DDL),
+    Migration(6, "sales rollup tables", ROLLUP_TABLES_DDL),
+    Migration(7, "hot query indexes", HOT_QUERY_INDEXES_DDL),
+    Migration(8, "monthly sales history tables", SALES_HISTORY_DDL),
+    Migration(9, "replica heartbeat", REPLICA_HEARTBEAT_DDL),
+    Migration(10, "inventory outbox sending state", OUTBOX_SENDING_DDL),
+    Migration(11, "sale line add-on prices", SALE_LINE_ADDONS_PRICE_DDL),
+    Migration(12, "inventory outbox without stored user tokens", OUTBOX_DROP_AUTH_TOKEN_DDL),
+]
+
+
+async def apply_migrations() -> List[int]:
+    return await schema_migrations.apply_migrations(SERVICE, MIGRATIONS)
+
+
+if __name__ == "__main__":
+    schema_migrations.main_cli(SERVICE, MIGRATIONS)
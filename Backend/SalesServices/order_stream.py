@@ -0,0 +1,174 @@
+import asyncio
+import json
+import logging
+import os
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ORDER_STREAM_POLL_SECONDS = float(os.getenv("ORDER_STREAM_POLL_SECONDS", "1"))
+ORDER_STREAM_QUEUE_SIZE = int(os.getenv("ORDER_STREAM_QUEUE_SIZE", "100"))
+ORDER_STREAM_HEARTBEAT_SECONDS = float(os.getenv("ORDER_STREAM_HEARTBEAT_SECONDS", "25"))
+
+# Loader signatures supplied by the purchase order router:
+#   load_snapshot() -> (cursor, [order dict, ...])
+#   load_delta(cursor) -> (new cursor, [changed processing order dict, ...], [removed id, ...])
+SnapshotLoader = Callable[[], Awaitable[Tuple[str, List[dict]]]]
+DeltaLoader = Callable[[str], Awaitable[Tuple[str, List[dict], List[str]]]]
+
+_RESYNC = object()  # queued in place of dropped events when a subscriber falls behind
+
+
+class Subscriber:
+    def __init__(self):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=ORDER_STREAM_QUEUE_SIZE)
+        self.resyncs = 0
+
+    def offer(self, message: str) -> bool:
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            # Slow consumer: drop its backlog and have it resend a fresh snapshot instead.
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(_RESYNC)
+            self.resyncs += 1
+            return False
+
+
+class OrderStreamHub:
+    """
+    In-process fan-out of processing-order events. One poller per process follows the
+    Sales rowversion feed (so it also sees sales and status changes made by other workers)
+    and keeps a mirror of the processing orders; every connected screen is served from it.
+    """
+
+    def __init__(self):
+        self._load_snapshot: Optional[SnapshotLoader] = None
+        self._load_delta: Optional[DeltaLoader] = None
+        self._orders: Dict[str, dict] = {}
+        self._cursor: Optional[str] = None
+        self._subscribers = set()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"events": 0, "polls": 0, "failed_polls": 0, "slow_consumer_resyncs": 0}
+
+    def configure(self, load_snapshot: SnapshotLoader, load_delta: DeltaLoader):
+        self._load_snapshot = load_snapshot
+        self._load_delta = load_delta
+
+    def notify(self):
+        """Polls right away, e.g. after create_sale commits or an order changes status."""
+        self._wakeup.set()
+
+    # --- Subscribers ---
+
+    def subscribe(self) -> Subscriber:
+        subscriber = Subscriber()
+        self._subscribers.add(subscriber)
+        self._wakeup.set()
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self._subscribers.discard(subscriber)
+
+    async def snapshot_message(self) -> str:
+        if self._cursor is None:
+            await self._initialise()
+        return json.dumps({"type": "snapshot", "cursor": self._cursor, "orders": list(self._orders.values())})
+
+    async def resume_messages(self, since: str) -> List[str]:
+        """Events a reconnecting client missed since its last cursor, read from the database."""
+        if since == self._cursor:
+            return []
+        cursor, orders, removed = await self._load_delta(since)
+        messages = [json.dumps({"type": "order.updated", "cursor": cursor, "order": order}) for order in orders]
+        messages += [json.dumps({"type": "order.removed", "cursor": cursor, "id": order_id}) for order_id in removed]
+        return messages
+
+    # --- Poller ---
+
+    async def _initialise(self):
+        self._cursor, orders = await self._load_snapshot()
+        self._orders = {order["id"]: order for order in orders}
+
+    def _broadcast(self, event: dict):
+        message = json.dumps(event)  # serialised once for every subscriber
+        self.stats["events"] += 1
+        for subscriber in list(self._subscribers):
+            if not subscriber.offer(message):
+                self.stats["slow_consumer_resyncs"] += 1
+
+    async def poll_once(self):
+        if self._cursor is None:
+            await self._initialise()
+            return
+        cursor, orders, removed = await self._load_delta(self._cursor)
+        self.stats["polls"] += 1
+        for order in orders:
+            previous = self._orders.get(order["id"])
+            if previous == order:
+                continue  # overlap between consecutive windows
+            self._orders[order["id"]] = order
+            event_type = "order.created" if previous is None else "order.updated"
+            self._broadcast({"type": event_type, "cursor": cursor, "order": order})
+        for order_id in removed:
+            if self._orders.pop(order_id, None) is not None:
+                self._broadcast({"type": "order.removed", "cursor": cursor, "id": order_id})
+        self._cursor = cursor
+
+    async def _run(self):
+        while True:
+            if not self._subscribers:
+                # Nobody is listening: sleep until a subscriber arrives.
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+            try:
+                await self.poll_once()
+            except Exception as e:
+                self.stats["failed_polls"] += 1
+                logger.warning(f"Order stream poll failed: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=ORDER_STREAM_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="order-stream-hub")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._subscribers.clear()
+
+    def get_stats(self) -> dict:
+        return {
+            "subscribers": len(self._subscribers),
+            "processing_orders": len(self._orders),
+            "cursor": self._cursor,
+            "max_queue_depth": max((s.queue.qsize() for s in self._subscribers), default=0),
+            **self.stats,
+        }
+
+
+async def next_message(subscriber: Subscriber, hub: OrderStreamHub) -> str:
+    """Waits for the subscriber's next message, turning resync markers into a fresh snapshot."""
+    try:
+        item = await asyncio.wait_for(subscriber.queue.get(), timeout=ORDER_STREAM_HEARTBEAT_SECONDS)
+    except asyncio.TimeoutError:
+        return json.dumps({"type": "heartbeat"})
+    if item is _RESYNC:
+        return await hub.snapshot_message()
+    return item
+
+
+order_hub = OrderStreamHub()
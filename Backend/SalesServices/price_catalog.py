@@ -0,0 +1,259 @@
+"""
+Product and add-on prices for server-side pricing. ProductPrices is filled by the loader
+(or the PRICE_CATALOG_PRODUCTS_SQL query can read the product service's own table):
+
+    python price_catalog.py load prices.csv     # header: ProductName,Price
+    python price_catalog.py status
+
+A cart line whose product has no price is handled per PRICE_CATALOG_UNLISTED_PRODUCTS:
+"reject" (default) fails the sale with a 400; "client" logs it and uses the till's price.
+An add-on with no price always fails the sale. Under "reject", the service reports itself
+not ready (/health/ready) until the catalog has loaded with at least one product price.
+"""
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+import time
+from decimal import Decimal
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from database import acquire_connection, init_db_pool, close_db_pool
+
+logger = logging.getLogger(__name__)
+
+PRICE_CATALOG_REFRESH_SECONDS = float(os.getenv("PRICE_CATALOG_REFRESH_SECONDS", "60"))
+PRICE_CATALOG_UNLISTED_PRODUCTS = os.getenv("PRICE_CATALOG_UNLISTED_PRODUCTS", "reject")  # reject | client
+if PRICE_CATALOG_UNLISTED_PRODUCTS not in ("reject", "client"):
+    raise ValueError("PRICE_CATALOG_UNLISTED_PRODUCTS must be 'reject' or 'client'.")
+
+# The queries are configurable so the catalog can read the product service's tables
+# directly (e.g. a three-part name such as IS_DB.dbo.ProductDetails).
+PRODUCT_PRICES_SQL = os.getenv(
+    "PRICE_CATALOG_PRODUCTS_SQL",
+    "SELECT ProductName, Price FROM ProductPrices WHERE IsActive = 1",
+)
+ADDON_PRICES_SQL = os.getenv(
+    "PRICE_CATALOG_ADDONS_SQL",
+    "SELECT AddonKey, Price FROM AddonPrices WHERE IsActive = 1",
+)
+
+# Used to seed AddonPrices the first time the table is created.
+DEFAULT_ADDON_PRICES = {
+    'espressoShots': Decimal('25.00'),
+    'seaSaltCream': Decimal('30.00'),
+    'syrupSauces': Decimal('20.00'),
+}
+
+PRICE_TABLES_DDL = """
+IF OBJECT_ID('dbo.ProductPrices', 'U') IS NULL
+    CREATE TABLE dbo.ProductPrices (
+        ProductName NVARCHAR(255) NOT NULL PRIMARY KEY,
+        Price DECIMAL(18, 2) NOT NULL,
+        IsActive BIT NOT NULL DEFAULT 1,
+        UpdatedAt DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME()
+    );
+IF OBJECT_ID('dbo.AddonPrices', 'U') IS NULL
+BEGIN
+    CREATE TABLE dbo.AddonPrices (
+        AddonKey VARCHAR(50) NOT NULL PRIMARY KEY,
+        Price DECIMAL(18, 2) NOT NULL,
+        IsActive BIT NOT NULL DEFAULT 1,
+        UpdatedAt DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME()
+    );
+    INSERT INTO dbo.AddonPrices (AddonKey, Price) VALUES (?, ?), (?, ?), (?, ?);
+END
+"""
+
+
+class PriceTables(NamedTuple):
+    version: int
+    products: Dict[str, Decimal]
+    addons: Dict[str, Decimal]
+
+
+class PricedCart(NamedTuple):
+    subtotal: Decimal
+    unit_prices: List[Decimal]   # product price per unit, per line
+    addon_prices: List[Decimal]  # add-on price per unit, per line
+
+
+class UnknownProductError(ValueError):
+    pass
+
+
+class UnknownAddonError(UnknownProductError):
+    pass
+
+
+def _addons_price(item, addons: Dict[str, Decimal]) -> Decimal:
+    price = Decimal('0.0')
+    if item.addons:
+        for addon_name, quantity in item.addons.items():
+            addon_price = addons.get(addon_name)
+            if addon_price is None:
+                raise UnknownAddonError(f"Add-on '{addon_name}' is not in the price catalog.")
+            price += addon_price * quantity
+    return price
+
+
+class PriceCatalog:
+    """
+    Product and add-on prices held in memory. A background task rebuilds the lookup
+    tables off the request path and swaps them in with one assignment, so a sale always
+    prices against a single consistent snapshot.
+    """
+
+    def __init__(self):
+        self._tables = PriceTables(0, {}, dict(DEFAULT_ADDON_PRICES))
+        self._loaded_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"reloads": 0, "failed_reloads": 0, "client_price_fallbacks": 0}
+
+    @property
+    def tables(self) -> PriceTables:
+        return self._tables
+
+    def is_ready(self) -> bool:
+        """Whether sales can be priced: always under "client", otherwise once product prices are loaded."""
+        return PRICE_CATALOG_UNLISTED_PRODUCTS == "client" or bool(self._tables.products)
+
+    def price_cart(self, cart_items) -> PricedCart:
+        """
+        Prices the cart from one snapshot of the tables, one dict probe per line and add-on.
+        An item with no catalog price raises UnknownProductError, or, when
+        PRICE_CATALOG_UNLISTED_PRODUCTS is "client", is priced at the client's price and logged.
+        An add-on with no catalog price raises UnknownAddonError.
+        """
+        tables = self._tables
+        products, addons = tables.products, tables.addons
+        subtotal = Decimal('0.0')
+        unit_prices, addon_prices = [], []
+        for item in cart_items:
+            unit_price = products.get(item.name)
+            if unit_price is None:
+                if PRICE_CATALOG_UNLISTED_PRODUCTS == "reject":
+                    raise UnknownProductError(f"'{item.name}' is not in the price catalog.")
+                self.stats["client_price_fallbacks"] += 1
+                unit_price = Decimal(str(item.price))
+                logger.warning(f"'{item.name}' is not in the price catalog; using the client price {unit_price}.")
+            addons_price = _addons_price(item, addons)
+            unit_prices.append(unit_price)
+            addon_prices.append(addons_price)
+            subtotal += (unit_price + addons_price) * item.quantity
+        return PricedCart(subtotal, unit_prices, addon_prices)
+
+    async def reload(self):
+        async with acquire_connection() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(PRODUCT_PRICES_SQL)
+                products = {row[0]: Decimal(row[1]) for row in await cursor.fetchall()}
+                await cursor.execute(ADDON_PRICES_SQL)
+                addons = {row[0]: Decimal(row[1]) for row in await cursor.fetchall()}
+        self._tables = PriceTables(self._tables.version + 1, products, addons)
+        self._loaded_at = time.monotonic()
+        self.stats["reloads"] += 1
+        logger.info(f"Price catalog v{self._tables.version} loaded ({len(products)} products, {len(addons)} add-ons).")
+        if not self.is_ready():
+            logger.error("No product prices are configured, so the service reports not ready. "
+                         "Load them with 'python price_catalog.py load prices.csv'.")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(PRICE_CATALOG_REFRESH_SECONDS)
+            try:
+                await self.reload()
+            except Exception as e:
+                self.stats["failed_reloads"] += 1
+                logger.warning(f"Price catalog refresh failed, keeping v{self._tables.version}: {e}")
+
+    async def start(self):
+        try:
+            await self.reload()
+        except Exception as e:
+            self.stats["failed_reloads"] += 1
+            logger.error(f"Could not load the price catalog at startup: {e}")
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="price-catalog-refresher")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def get_stats(self) -> dict:
+        tables = self._tables
+        return {
+            "version": tables.version,
+            "products": len(tables.products),
+            "addons": len(tables.addons),
+            "seconds_since_load": round(time.monotonic() - self._loaded_at, 3) if self._loaded_at else None,
+            "unlisted_products": PRICE_CATALOG_UNLISTED_PRODUCTS,
+            "ready": self.is_ready(),
+            **self.stats,
+        }
+
+
+price_catalog = PriceCatalog()
+
+
+# --- Loader ---
+
+SQL_UPSERT_PRODUCT_PRICES = """
+    MERGE ProductPrices AS t
+    USING (
+        SELECT * FROM OPENJSON(?) WITH (ProductName NVARCHAR(255) '$[0]', Price DECIMAL(18, 2) '$[1]')
+    ) AS src
+    ON t.ProductName = src.ProductName
+    WHEN MATCHED THEN UPDATE SET t.Price = src.Price, t.IsActive = 1, t.UpdatedAt = SYSUTCDATETIME()
+    WHEN NOT MATCHED THEN INSERT (ProductName, Price) VALUES (src.ProductName, src.Price);
+"""
+
+
+def read_price_file(path: str) -> List[Tuple[str, Decimal]]:
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        rows = [(row["ProductName"].strip(), Decimal(row["Price"])) for row in csv.DictReader(f)]
+    bad = [name for name, price in rows if not name or price < 0]
+    if bad:
+        raise ValueError(f"Rows without a product name or with a negative price: {bad}")
+    return rows
+
+
+async def load_product_prices(rows: List[Tuple[str, Decimal]]):
+    """Upserts the prices in one statement. Running services pick them up on their next refresh."""
+    async with acquire_connection() as conn:
+        async with conn.cursor() as cursor:
+            await cursor.execute(SQL_UPSERT_PRODUCT_PRICES, json.dumps([[name, str(price)] for name, price in rows]))
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description="Product price maintenance.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    load = sub.add_parser("load", help="Insert or update product prices from a CSV file.")
+    load.add_argument("path", help="CSV with a ProductName,Price header.")
+    sub.add_parser("status", help="Show how many product and add-on prices are configured.")
+    return parser.parse_args()
+
+
+async def _main(args):
+    await init_db_pool()
+    try:
+        if args.command == "load":
+            rows = read_price_file(args.path)
+            await load_product_prices(rows)
+            print(f"Loaded {len(rows)} product prices.")
+        await price_catalog.reload()
+        print(json.dumps(price_catalog.get_stats()))
+    finally:
+        await close_db_pool()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main(_parse_args()))
@@ -1,14 +1,14 @@
 # sales_router.py
 
-from fastapi import APIRouter, HTTPException, status, Depends
-from fastapi.security import OAuth2PasswordBearer
-from pydantic import BaseModel, Field
-from typing import List
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field, conint
+from typing import Dict, List, Literal, Optional
+from datetime import datetime, timedelta
 from decimal import Decimal
 import json
 import sys
 import os
-import httpx
 import logging 
 
 # --- Configure logging
@@ -16,31 +16,27 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from database import get_db_connection
-
-# --- Auth and Service URL Configuration ---
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="http://127.0.0.1:4000/auth/token")
-USER_SERVICE_ME_URL = "http://localhost:4000/auth/users/me"
-
-# --- URLs for Inventory Deduction Endpoints ---
-# NOTE: Use the correct URLs for your services. The inventory service might be on one port.
-INGREDIENTS_DEDUCT_URL = "http://127.0.0.1:8002/ingredients/ingredients/deduct-from-sale"
-MATERIALS_DEDUCT_URL = "http://127.0.0.1:8003/materials/materials/deduct-from-sale"
+from database import get_db_connection, get_read_connection, transaction, client_key
+from auth import get_current_active_user
+from inventory_outbox import enqueue_inventory_deductions, enqueue_inventory_deductions_bulk, dispatcher as outbox_dispatcher
+from sale_writes import (
+    insert_sale_lines, sale_item_rows, sale_discount_rows, insert_sale_headers, find_ingested_keys,
+)
+from discount_catalog import discount_catalog, utc_now, SQL_LOAD_DISCOUNTS, SQL_DISCOUNTS_BY_NAME
+from discount_engine import DiscountRules, DISCOUNT_AUTO_APPLY
+from price_catalog import price_catalog, UnknownProductError
+from order_stream import order_hub
+from sales_rollups import rollup_rows_for_sale, apply_rollups, query_summary, DIMENSIONS
+from sales_export import ExportFilters, export_sales, gzip_stream, EXPORT_MEDIA_TYPES
 
 router_sales = APIRouter(prefix="/auth/sales", tags=["sales"])
 
-ADDON_PRICES = {
-    'espressoShots': Decimal('25.00'),
-    'seaSaltCream': Decimal('30.00'),
-    'syrupSauces': Decimal('20.00'),
-}
-
 class SaleItem(BaseModel):
     name: str
-    quantity: int
-    price: float
+    quantity: int = Field(..., ge=1)
+    price: float  # display only; the sale is priced from the server-side price catalog
     category: str
-    addons: dict
+    addons: Dict[str, conint(ge=0)]  # add-on key -> count per unit; keys must be in the price catalog
 
 class Sale(BaseModel):
     cartItems: List[SaleItem]
@@ -48,103 +44,89 @@ class Sale(BaseModel):
     paymentMethod: str
     appliedDiscounts: List[str]
 
-# --- Authorization Helper Function ---
-async def get_current_active_user(token: str = Depends(oauth2_scheme)):
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(USER_SERVICE_ME_URL, headers={"Authorization": f"Bearer {token}"})
-            response.raise_for_status()
-        except httpx.HTTPStatusError as e:
-            raise HTTPException(
-                status_code=e.response.status_code,
-                detail=f"Invalid token or user not found: {e.response.text}",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        except httpx.RequestError:
-            raise HTTPException(
-                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                detail="Could not connect to the authentication service."
-            )
-    return response.json()
+# --- Batch ingestion (offline terminal sync) ---
+MAX_BATCH_SALES = int(os.getenv("MAX_BATCH_SALES", "1000"))
+BATCH_TRANSACTION_SIZE = int(os.getenv("BATCH_TRANSACTION_SIZE", "100"))  # sales committed per transaction
+# How far a replayed sale's createdAt may lie in the past, and ahead of the server's clock
+BATCH_SALE_MAX_AGE_HOURS = float(os.getenv("BATCH_SALE_MAX_AGE_HOURS", "168"))
+BATCH_SALE_MAX_CLOCK_SKEW_SECONDS = float(os.getenv("BATCH_SALE_MAX_CLOCK_SKEW_SECONDS", "300"))
 
-# --- Helper functions to call Inventory Services ---
+class BatchSale(Sale):
+    idempotencyKey: str = Field(..., min_length=1, max_length=100)
+    # When the sale was rung up. A time without an offset is taken as the server's local time,
+    # like Sales.CreatedAt itself.
+    createdAt: datetime
+    # "completed" for orders the terminal already handed over: they skip the order board.
+    status: Literal["processing", "completed"] = "processing"
 
-async def trigger_ingredients_deduction(cart_items: List[SaleItem], token: str):
-    """Calls the Inventory Service to deduct INGREDIENTS for the sold items."""
-    logger.info("Triggering INGREDIENT deduction.")
-    payload = {"cartItems": [{"name": item.name, "quantity": item.quantity} for item in cart_items]}
-    headers = {"Authorization": f"Bearer {token}"}
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(INGREDIENTS_DEDUCT_URL, json=payload, headers=headers)
-            response.raise_for_status()
-            logger.info("Successfully requested INGREDIENT deduction.")
-    except Exception as e:
-        logger.critical(f"INGREDIENT-SYNC-FAILURE: Sale processed, but failed to deduct ingredients. Error: {e}")
+class SaleBatch(BaseModel):
+    sales: List[BatchSale] = Field(..., min_length=1, max_length=MAX_BATCH_SALES)
 
-async def trigger_materials_deduction(cart_items: List[SaleItem], token: str):
-    """Calls the Inventory Service to deduct MATERIALS for the sold items."""
-    logger.info("Triggering MATERIAL deduction.")
-    payload = {"cartItems": [{"name": item.name, "quantity": item.quantity} for item in cart_items]}
-    headers = {"Authorization": f"Bearer {token}"}
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(MATERIALS_DEDUCT_URL, json=payload, headers=headers)
-            response.raise_for_status()
-            logger.info("Successfully requested MATERIAL deduction.")
-    except Exception as e:
-        logger.critical(f"MATERIAL-SYNC-FAILURE: Sale processed, but failed to deduct materials. Error: {e}")
+class BatchSaleResult(BaseModel):
+    idempotencyKey: str
+    status: str                      # "created", "duplicate", "rejected" or "failed"
+    saleId: Optional[int] = None
+    subtotal: Optional[float] = None
+    discountAmount: Optional[float] = None
+    finalTotal: Optional[float] = None
+    error: Optional[str] = None
+
+# --- Helper functions for calculations ---
+
+def batch_sale_time(sale: BatchSale, now: datetime) -> datetime:
+    """The sale's createdAt as a naive local time. Raises ValueError when it is outside the
+    accepted window (older than BATCH_SALE_MAX_AGE_HOURS or ahead of the clock)."""
+    created_at = sale.createdAt
+    if created_at.tzinfo is not None:
+        created_at = created_at.astimezone().replace(tzinfo=None)
+    if created_at > now + timedelta(seconds=BATCH_SALE_MAX_CLOCK_SKEW_SECONDS):
+        raise ValueError("createdAt is in the future.")
+    if created_at < now - timedelta(hours=BATCH_SALE_MAX_AGE_HOURS):
+        raise ValueError(f"createdAt is more than {BATCH_SALE_MAX_AGE_HOURS:g} hours old.")
+    return created_at
+
+async def fetch_discount_rules(names: List[str], cursor) -> DiscountRules:
+    """Compiled rules for the active discounts. Served from the in-memory catalog; only
+    queries Discounts (the named ones, or all active ones when auto-applying) if the
+    catalog has not loaded yet."""
+    rules = discount_catalog.rules()
+    if rules is None:
+        if DISCOUNT_AUTO_APPLY:
+            await cursor.execute(SQL_LOAD_DISCOUNTS)
+        else:
+            await cursor.execute(SQL_DISCOUNTS_BY_NAME, json.dumps(names))
+        rules = DiscountRules(await cursor.fetchall())
+    return rules
+
+
+def requested_discounts(sale: Sale) -> Optional[List[str]]:
+    """The names to consider for a sale, or None to let the engine find every qualifying discount."""
+    return None if DISCOUNT_AUTO_APPLY else sale.appliedDiscounts
 
-# --- Helper function for calculations ---
 
 async def calculate_totals_and_discounts(sale_data: Sale, cursor):
-    subtotal = Decimal('0.0')
-    for item in sale_data.cartItems:
-        item_price = Decimal(str(item.price))
-        addons_price = Decimal('0.0')
-        if item.addons:
-            for addon_name, quantity in item.addons.items():
-                addons_price += ADDON_PRICES.get(addon_name, Decimal('0.0')) * quantity
-        subtotal += (item_price + addons_price) * item.quantity
-
-    total_discount_amount = Decimal('0.0')
-    applied_discounts_details = []
-
-    if not sale_data.appliedDiscounts:
-        return subtotal, total_discount_amount, applied_discounts_details
-
-    placeholders = ','.join(['?' for _ in sale_data.appliedDiscounts])
-    sql_fetch_discounts = f"""
-        SELECT DiscountID, DiscountName, DiscountType, PercentageValue, FixedValue, MinimumSpend
-        FROM Discounts
-        WHERE DiscountName IN ({placeholders}) AND Status = 'Active' AND GETUTCDATE() BETWEEN ValidFrom AND ValidTo
-    """
-    await cursor.execute(sql_fetch_discounts, sale_data.appliedDiscounts)
-    valid_discounts = await cursor.fetchall()
-
-    for discount in valid_discounts:
-        min_spend = discount.MinimumSpend or Decimal('0.0')
-        if subtotal >= min_spend:
-            discount_value = Decimal('0.0')
-            if discount.DiscountType == 'Percentage' and discount.PercentageValue is not None:
-                discount_value = (subtotal * discount.PercentageValue) / Decimal('100')
-            elif discount.DiscountType == 'Fixed' and discount.FixedValue is not None:
-                discount_value = discount.FixedValue
-            total_discount_amount += discount_value
-            applied_discounts_details.append({"id": discount.DiscountID, "amount": discount_value})
-
-    final_discount = min(total_discount_amount, subtotal)
-    return subtotal, final_discount, applied_discounts_details
+    # Prices come from the in-memory catalog: no per-sale catalog queries.
+    cart = price_catalog.price_cart(sale_data.cartItems)
+
+    if not sale_data.appliedDiscounts and not DISCOUNT_AUTO_APPLY:
+        return cart, Decimal('0.0'), []
+
+    rules = await fetch_discount_rules(sale_data.appliedDiscounts, cursor)
+    final_discount, applied_discounts_details = rules.price(
+        sale_data.cartItems, cart.unit_prices, cart.subtotal, utc_now(), requested_discounts(sale_data),
+    )
+    return cart, final_discount, applied_discounts_details
 
 # --- API Endpoint to Create a Sale ---
 @router_sales.post("/", status_code=status.HTTP_201_CREATED)
 async def create_sale(
     sale: Sale, 
-    token: str = Depends(oauth2_scheme),
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_active_user),
+    conn = Depends(get_db_connection)
 ):
     """
-    Creates a new sale record and triggers both ingredient and material inventory deduction.
+    Creates a new sale record and queues both ingredient and material inventory deduction.
+    The deductions are written to the outbox in the sale's transaction and sent in the background.
     """
     allowed_roles = ["admin", "manager", "staff", "cashier"]
     if current_user.get("userRole") not in allowed_roles:
@@ -153,11 +135,12 @@ async def create_sale(
             detail="You do not have permission to create a sale."
         )
 
-    conn = None
     try:
-        conn = await get_db_connection()
-        async with conn.cursor() as cursor:
-            subtotal, total_discount, discount_details = await calculate_totals_and_discounts(sale, cursor)
+        async with transaction(conn), conn.cursor() as cursor:
+            try:
+                cart, total_discount, discount_details = await calculate_totals_and_discounts(sale, cursor)
+            except UnknownProductError as e:
+                raise HTTPException(status_code=400, detail=str(e))
             cashier_name = current_user.get("username", "SystemUser")
 
             sql_sale = "INSERT INTO Sales (OrderType, PaymentMethod, CashierName, TotalDiscountAmount) OUTPUT INSERTED.SaleID VALUES (?, ?, ?, ?)"
@@ -167,35 +150,234 @@ async def create_sale(
                 raise HTTPException(status_code=500, detail="Failed to create sale record.")
             sale_id = sale_id_row[0]
 
-            for item in sale.cartItems:
-                sql_item = "INSERT INTO SaleItems (SaleID, ItemName, Quantity, UnitPrice, Category, Addons) VALUES (?, ?, ?, ?, ?, ?)"
-                addons_str = json.dumps(item.addons) if item.addons else None
-                await cursor.execute(sql_item, sale_id, item.name, item.quantity, Decimal(str(item.price)), item.category, addons_str)
-
-            for discount in discount_details:
-                sql_sale_discount = "INSERT INTO SaleDiscounts (SaleID, DiscountID, DiscountAppliedAmount) VALUES (?, ?, ?)"
-                await cursor.execute(sql_sale_discount, sale_id, discount['id'], discount['amount'])
-
-            # If all DB steps succeed, commit the changes.
-            await conn.commit()
-            
-            # After committing the sale, trigger inventory deductions.
-            # This is a "fire-and-forget" approach. We log failures but don't roll back the sale.
-            await trigger_ingredients_deduction(cart_items=sale.cartItems, token=token)
-            await trigger_materials_deduction(cart_items=sale.cartItems, token=token)
-            
-            final_total = subtotal - total_discount
-            return {
-                "saleId": sale_id,
-                "subtotal": float(subtotal),
-                "discountAmount": float(total_discount),
-                "finalTotal": float(final_total)
-            }
+            # All cart lines and applied discounts go in one set-based statement.
+            await insert_sale_lines(
+                cursor,
+                sale_item_rows(sale_id, sale.cartItems, cart.unit_prices, cart.addon_prices),
+                sale_discount_rows(sale_id, discount_details),
+            )
+
+            # The deduction intent and the rollups commit (or roll back) together with the sale.
+            await enqueue_inventory_deductions(cursor, sale_id, sale.cartItems)
+            await apply_rollups(cursor, rollup_rows_for_sale(
+                sale_id, sale.cartItems, cart, sale.orderType, sale.paymentMethod, cashier_name, total_discount,
+            ))
+
+        # Committed: let the background dispatcher push the deductions to inventory.
+        outbox_dispatcher.notify()
+        # Push the new order to connected order screens without waiting for the next poll.
+        order_hub.notify()
+
+        final_total = cart.subtotal - total_discount
+        return {
+            "saleId": sale_id,
+            "subtotal": float(cart.subtotal),
+            "discountAmount": float(total_discount),
+            "finalTotal": float(final_total)
+        }
     except Exception as e:
-        if conn: await conn.rollback()
         logger.error(f"Error processing sale: {e}", exc_info=True)
         if not isinstance(e, HTTPException):
              raise HTTPException(status_code=500, detail=f"An unexpected error occurred while processing the sale.")
         raise e
-    finally:
-        if conn: await conn.close()
\ No newline at end of file
+
+
+# --- API Endpoint to Ingest Queued Sales in Bulk ---
+@router_sales.post("/batch", response_model=List[BatchSaleResult])
+async def create_sales_batch(
+    batch: SaleBatch,
+    current_user: dict = Depends(get_current_active_user),
+    conn = Depends(get_db_connection)
+):
+    """
+    Replays sales queued by an offline terminal. Each sale carries a client-generated
+    idempotencyKey, so a batch can be retried safely: keys that were already ingested come
+    back as "duplicate" with their original saleId. Each sale is stored with its createdAt
+    and status; one whose createdAt is outside the accepted window is "rejected". Sales are priced in one pass from the
+    in-memory catalogs and written in transactions of BATCH_TRANSACTION_SIZE sales, each
+    costing a fixed number of set-based statements.
+    """
+    allowed_roles = ["admin", "manager", "staff", "cashier"]
+    if current_user.get("userRole") not in allowed_roles:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You do not have permission to create a sale."
+        )
+    cashier_name = current_user.get("username", "SystemUser")
+
+    results: Dict[str, BatchSaleResult] = {}
+    order = []  # result for each sale in request order
+    pending: List[BatchSale] = []
+    for sale in batch.sales:
+        key = sale.idempotencyKey
+        if key in results:
+            order.append(BatchSaleResult(idempotencyKey=key, status="duplicate", error="Repeated within this batch."))
+            continue
+        results[key] = BatchSaleResult(idempotencyKey=key, status="failed")
+        order.append(results[key])
+        pending.append(sale)
+
+    try:
+        async with conn.cursor() as cursor:
+            # One indexed lookup for every key in the batch.
+            ingested = await find_ingested_keys(cursor, [sale.idempotencyKey for sale in pending])
+            for key, sale_id in ingested.items():
+                results[key].status, results[key].saleId = "duplicate", sale_id
+            pending = [sale for sale in pending if sale.idempotencyKey not in ingested]
+
+            # Price everything in one pass. Discounts come from the catalog's compiled rules,
+            # or from a single query for the whole batch if it is not loaded.
+            all_names = list(dict.fromkeys(name for sale in pending for name in sale.appliedDiscounts))
+            rules = DiscountRules(())
+            if all_names or DISCOUNT_AUTO_APPLY:
+                rules = await fetch_discount_rules(all_names, cursor)
+            now, local_now = utc_now(), datetime.now()
+
+            priced = []
+            for sale in pending:
+                try:
+                    created_at = batch_sale_time(sale, local_now)
+                    cart = price_catalog.price_cart(sale.cartItems)
+                except ValueError as e:  # includes UnknownProductError
+                    results[sale.idempotencyKey].status, results[sale.idempotencyKey].error = "rejected", str(e)
+                    continue
+                total_discount, discount_details = rules.price(
+                    sale.cartItems, cart.unit_prices, cart.subtotal, now, requested_discounts(sale),
+                )
+                priced.append((sale, cart, total_discount, discount_details, created_at))
+
+            for start in range(0, len(priced), BATCH_TRANSACTION_SIZE):
+                chunk = priced[start:start + BATCH_TRANSACTION_SIZE]
+                try:
+                    async with transaction(conn):
+                        sale_ids = await insert_sale_headers(cursor, [
+                            (sale.idempotencyKey, sale.orderType, sale.paymentMethod, cashier_name, total_discount,
+                             created_at, sale.status)
+                            for sale, _, total_discount, _, created_at in chunk
+                        ])
+                        item_rows, discount_rows, deductions, rollup_rows = [], [], [], []
+                        for sale, cart, total_discount, discount_details, _ in chunk:
+                            sale_id = sale_ids[sale.idempotencyKey]
+                            item_rows += sale_item_rows(sale_id, sale.cartItems, cart.unit_prices, cart.addon_prices)
+                            discount_rows += sale_discount_rows(sale_id, discount_details)
+                            deductions.append((sale_id, sale.cartItems))
+                            rollup_rows += rollup_rows_for_sale(
+                                sale_id, sale.cartItems, cart, sale.orderType, sale.paymentMethod,
+                                cashier_name, total_discount,
+                            )
+                        await insert_sale_lines(cursor, item_rows, discount_rows)
+                        await enqueue_inventory_deductions_bulk(cursor, deductions)
+                        await apply_rollups(cursor, rollup_rows)
+                except Exception as e:
+                    # Typically a concurrent replay of the same keys; retrying the batch dedupes them.
+                    logger.error(f"Error ingesting sales batch chunk: {e}", exc_info=True)
+                    for sale, *_ in chunk:
+                        results[sale.idempotencyKey].error = "Could not be saved; retry this sale."
+                    continue
+
+                for sale, cart, total_discount, *_ in chunk:
+                    result = results[sale.idempotencyKey]
+                    result.status, result.saleId = "created", sale_ids[sale.idempotencyKey]
+                    result.subtotal = float(cart.subtotal)
+                    result.discountAmount = float(total_discount)
+                    result.finalTotal = float(cart.subtotal - total_discount)
+    except Exception as e:
+        logger.error(f"Error processing sales batch: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="An unexpected error occurred while processing the sales batch.")
+
+    created = [sale for sale, *_ in priced if results[sale.idempotencyKey].status == "created"]
+    if created:
+        outbox_dispatcher.notify()
+    if any(sale.status == "processing" for sale in created):
+        order_hub.notify()
+    return order
+
+
+# --- API Endpoint for Sales Summaries ---
+# Answered from the SalesRollupHourly/SalesRollupDaily tables, never from raw sales.
+@router_sales.get("/summary")
+async def get_sales_summary(
+    start: datetime,
+    end: datetime,
+    grain: Literal["hour", "day"] = "day",
+    dimension: str = Query("total", description=f"One of: {', '.join(DIMENSIONS)}"),
+    value: Optional[str] = None,
+    by_bucket: bool = True,
+    current_user: dict = Depends(get_current_active_user),
+    conn = Depends(get_read_connection)
+):
+    """
+    Sales totals for [start, end) per hour or day bucket (or for the whole range when
+    by_bucket is false), grouped by the chosen dimension and optionally filtered to one value.
+    Buckets are included when their start falls inside the range.
+    """
+    if current_user.get("userRole") not in ["admin", "manager"]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You do not have permission to view sales summaries."
+        )
+    if dimension not in DIMENSIONS:
+        raise HTTPException(status_code=400, detail=f"dimension must be one of: {', '.join(DIMENSIONS)}.")
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end must be after start.")
+
+    try:
+        async with conn.cursor() as cursor:
+            rows = await query_summary(cursor, grain, dimension, start, end, by_bucket, value)
+    except Exception as e:
+        logger.error(f"Error fetching sales summary: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to fetch the sales summary.")
+    return {"grain": grain, "dimension": dimension, "start": start, "end": end, "rows": rows}
+
+
+# --- API Endpoint for Transaction Exports ---
+# Streams every sale in [start, end), archived ones included, one sale per CSV row or NDJSON line.
+@router_sales.get("/export")
+async def export_sales_range(
+    request: Request,
+    start: datetime,
+    end: datetime,
+    format: Literal["csv", "ndjson"] = "csv",
+    gzip: bool = False,
+    status_filter: Optional[str] = Query(None, alias="status"),
+    paymentMethod: Optional[str] = None,
+    orderType: Optional[str] = None,
+    cashier: Optional[str] = None,
+    current_user: dict = Depends(get_current_active_user),
+):
+    if current_user.get("userRole") not in ["admin", "manager"]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You do not have permission to export sales."
+        )
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end must be after start.")
+
+    filters = ExportFilters(start, end, status_filter, paymentMethod, orderType, cashier)
+    body = export_sales(filters, format, client=client_key(request))
+    filename = f"sales-{start:%Y%m%d}-{end:%Y%m%d}.{format}"
+    media_type = EXPORT_MEDIA_TYPES[format]
+    if gzip:
+        # A .gz download rather than Content-Encoding, so the file is saved compressed.
+        body, filename, media_type = gzip_stream(body), filename + ".gz", "application/gzip"
+    return StreamingResponse(
+        body, media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+# --- Discount catalog invalidation ---
+# DiscountServices calls this after creating, updating or deleting a discount.
+@router_sales.post("/discount-catalog/refresh")
+async def refresh_discount_catalog(current_user: dict = Depends(get_current_active_user)):
+    if current_user.get("userRole") not in ["admin", "manager"]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You do not have permission to refresh the discount catalog."
+        )
+    try:
+        await discount_catalog.invalidate()
+    except Exception as e:
+        logger.error(f"Error refreshing discount catalog: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to refresh the discount catalog.")
+    return {"version": discount_catalog.version}
\ No newline at end of file
@@ -1,15 +1,14 @@
 # purchase_order_router.py
 
-from fastapi import APIRouter, HTTPException, status, Depends
-from fastapi.security import OAuth2PasswordBearer
-from pydantic import BaseModel
-from typing import List, Dict, Optional
+from fastapi import APIRouter, HTTPException, status, Depends, Header, Query, Response, WebSocket, WebSocketDisconnect
+from pydantic import BaseModel, Field, field_validator
+from typing import List, Dict, Optional, Union
 from decimal import Decimal
 import json
 import sys
 import os
-import httpx
 import logging
+import asyncio
 from datetime import datetime
 
 # --- Configure logging
@@ -18,12 +17,10 @@ logger = logging.getLogger(__name__)
 
 # --- Ensure the database module can be found
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from database import get_db_connection
-
-# --- Auth and Service URL Configuration ---
-# These are necessary for the authentication dependency
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="http://127.0.0.1:4000/auth/token")
-USER_SERVICE_ME_URL = "http://localhost:4000/auth/users/me"
+from database import get_db_connection, get_read_connection, acquire_connection
+from auth import get_current_active_user, verify_token
+from order_stream import order_hub, next_message
+from fast_json import FastJSONResponse
 
 # --- Define the new router ---
 # Note the different prefix and tags
@@ -32,30 +29,6 @@ router_purchase_order = APIRouter(
     tags=["Purchase Orders"]
 )
 
-# --- Authorization Helper Function ---
-# This is required for the endpoint dependency
-async def get_current_active_user(token: str = Depends(oauth2_scheme)):
-    """
-    Validates the user's token by calling the User service.
-    This function is copied here to make this router self-contained.
-    """
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(USER_SERVICE_ME_URL, headers={"Authorization": f"Bearer {token}"})
-            response.raise_for_status()
-        except httpx.HTTPStatusError as e:
-            raise HTTPException(
-                status_code=e.response.status_code,
-                detail=f"Invalid token or user not found: {e.response.text}",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        except httpx.RequestError:
-            raise HTTPException(
-                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                detail="Could not connect to the authentication service."
-            )
-    return response.json()
-
 # --- Pydantic Models for the "Processing Orders" response ---
 # These models are structured to match what your React frontend expects.
 
@@ -77,18 +50,175 @@ class ProcessingOrder(BaseModel):
     cashierName: str
     orderItems: List[ProcessingSaleItem]
 
+class ProcessingOrdersDelta(BaseModel):
+    cursor: str                  # pass back as ?since= on the next poll
+    orders: List[ProcessingOrder]  # processing orders added or changed since the cursor
+    removed: List[str]           # ids of orders that are no longer processing
+
+# --- Change tracking ---
+# Sales.RowVer is a ROWVERSION, bumped by SQL Server on every insert/update of a sale.
+# Cursors are exclusive upper bounds taken from MIN_ACTIVE_ROWVERSION(), so a sale whose
+# transaction is still open when a client polls is picked up by the next poll.
+
+ORDER_CHANGE_TRACKING_DDL = """
+IF COL_LENGTH('dbo.Sales', 'RowVer') IS NULL
+    ALTER TABLE dbo.Sales ADD RowVer ROWVERSION;
+IF COL_LENGTH('dbo.Sales', 'StatusChangedAt') IS NULL
+    ALTER TABLE dbo.Sales ADD StatusChangedAt DATETIME2 NULL,
+                              ReadyAt DATETIME2 NULL,
+                              CompletedAt DATETIME2 NULL,
+                              CancelledAt DATETIME2 NULL;
+"""
+
+ORDER_COLUMNS = """
+    s.SaleID, s.OrderType, s.PaymentMethod, s.CreatedAt, s.CashierName,
+    s.TotalDiscountAmount, s.Status,
+    si.SaleItemID, si.ItemName, si.Quantity, si.UnitPrice, si.Category, si.Addons
+"""
+
+# Status is compared to the literal 'processing' (not a parameter) so these match the
+# filtered index IX_Sales_Processing (migrations.py).
+SQL_PROCESSING_SNAPSHOT = f"""
+    SELECT {ORDER_COLUMNS}
+    FROM
+        Sales AS s
+    LEFT JOIN
+        SaleItems AS si ON s.SaleID = si.SaleID
+    WHERE
+        s.Status = 'processing'
+    ORDER BY
+        s.CreatedAt ASC, s.SaleID ASC;
+"""
+
+# Items are only joined for sales that are still processing; the others just need their id.
+SQL_PROCESSING_DELTA = f"""
+    SELECT {ORDER_COLUMNS}
+    FROM
+        Sales AS s
+    LEFT JOIN
+        SaleItems AS si ON s.SaleID = si.SaleID AND s.Status = 'processing'
+    WHERE
+        s.RowVer >= ? AND s.RowVer < ?
+    ORDER BY
+        s.CreatedAt ASC, s.SaleID ASC;
+"""
+
+# One cheap probe: the processing set is identified by its size and newest RowVer.
+SQL_PROCESSING_PROBE = """
+    SELECT COUNT_BIG(*), MAX(RowVer), CAST(MIN_ACTIVE_ROWVERSION() AS BINARY(8))
+    FROM Sales
+    WHERE Status = 'processing'
+"""
+
+
+def _encode_cursor(rowversion: bytes) -> str:
+    return rowversion.hex()
+
+
+def _decode_cursor(cursor_value: str) -> bytes:
+    try:
+        decoded = bytes.fromhex(cursor_value)
+    except ValueError:
+        decoded = b""
+    if len(decoded) != 8:
+        raise HTTPException(status_code=400, detail="Invalid 'since' cursor.")
+    return decoded
+
+
+def _group_order_rows(rows) -> List[dict]:
+    """
+    Groups flat Sales x SaleItems rows (ordered by sale) into ProcessingOrder-shaped dicts.
+    The dicts are built once, in the models' field order, and written by FastJSONResponse
+    without another validation pass.
+    """
+    # The database returns a flat list. We need to group items by SaleID.
+    orders_dict: Dict[int, dict] = {}
+    item_subtotals: Dict[int, Decimal] = {}
+
+    for row in rows:
+        sale_id = row.SaleID
+
+        if sale_id not in orders_dict:
+            # First time seeing this SaleID: create the main order object
+            item_subtotals[sale_id] = Decimal('0.0')
+            orders_dict[sale_id] = {
+                "id": f"SO-{sale_id}",  # Format ID to match frontend expectation
+                "date": row.CreatedAt.strftime("%B %d, %Y %I:%M %p"), # Format date
+                "items": 0,  # Sum of quantities, calculated below
+                "total": 0.0,  # Filled in once all items are summed
+                "status": row.Status,
+                "orderType": row.OrderType,
+                "paymentMethod": row.PaymentMethod,
+                "cashierName": row.CashierName,
+                "orderItems": [],
+                "_totalDiscount": row.TotalDiscountAmount, # Temp field for final calculation
+            }
+
+        # If the order has items (LEFT JOIN can result in NULLs)
+        if row.SaleItemID:
+            item_quantity = row.Quantity or 0
+            item_price = row.UnitPrice or Decimal('0.0')
+
+            # Add to the total number of items for the order
+            orders_dict[sale_id]["items"] += item_quantity
+            # Add to the running subtotal for the order
+            item_subtotals[sale_id] += item_price * item_quantity
+
+            # Append the detailed item object
+            orders_dict[sale_id]["orderItems"].append({
+                "name": row.ItemName,
+                "quantity": item_quantity,
+                "price": float(item_price),
+                "category": row.Category,
+                "addons": json.loads(row.Addons) if row.Addons else {},
+            })
+
+    # Now, calculate the final total for each order and format the final list
+    response_list = []
+    for sale_id, order_data in orders_dict.items():
+        subtotal = item_subtotals.get(sale_id, Decimal('0.0'))
+        total_discount = order_data.pop("_totalDiscount", Decimal('0.0'))
+        final_total = subtotal - total_discount
+        order_data["total"] = float(final_total)
+        response_list.append(order_data)
+
+    return response_list
+
+
+async def _fetch_processing_snapshot(cursor):
+    await cursor.execute(SQL_PROCESSING_SNAPSHOT)
+    return _group_order_rows(await cursor.fetchall())
+
+
+async def _fetch_processing_delta(cursor, since: bytes, upper: bytes) -> dict:
+    await cursor.execute(SQL_PROCESSING_DELTA, since, upper)
+    rows = await cursor.fetchall()
+    changed = [row for row in rows if row.Status == 'processing']
+    removed = list(dict.fromkeys(f"SO-{row.SaleID}" for row in rows if row.Status != 'processing'))
+    return {"cursor": _encode_cursor(upper), "orders": _group_order_rows(changed), "removed": removed}
+
+
 # --- API Endpoint to Get Processing Orders ---
 @router_purchase_order.get(
     "/status/processing",
-    response_model=List[ProcessingOrder],
-    summary="Get All Processing Orders"
+    response_model=Union[List[ProcessingOrder], ProcessingOrdersDelta],
+    summary="Get All Processing Orders",
+    responses={304: {"description": "The processing orders have not changed since the given ETag."}},
 )
 async def get_processing_orders(
-    current_user: dict = Depends(get_current_active_user)
+    response: Response,
+    since: Optional[str] = Query(None, description="Cursor from a previous poll; returns only the changes since then."),
+    if_none_match: Optional[str] = Header(None),
+    current_user: dict = Depends(get_current_active_user),
+    conn = Depends(get_read_connection)
 ):
     """
     Retrieves all sales (referred to as purchase orders here) with the status 'processing'.
     The response is formatted specifically for the orders page on the frontend.
+
+    Full responses carry an ETag (send it back as If-None-Match to get a 304 when nothing
+    changed) and an X-Order-Cursor header. Passing that cursor as `since` returns only the
+    orders added or changed after it, plus the ids of orders that left 'processing'.
     """
     allowed_roles = ["admin", "manager", "staff", "cashier"]
     if current_user.get("userRole") not in allowed_roles:
@@ -97,87 +227,316 @@ async def get_processing_orders(
             detail="You do not have permission to view orders."
         )
 
-    conn = None
+    since_value = _decode_cursor(since) if since is not None else None
+
     try:
-        conn = await get_db_connection()
         async with conn.cursor() as cursor:
-            # A single, efficient query to fetch all processing sales and their corresponding items
-            sql = """
-                SELECT
-                    s.SaleID, s.OrderType, s.PaymentMethod, s.CreatedAt, s.CashierName,
-                    s.TotalDiscountAmount, s.Status,
-                    si.SaleItemID, si.ItemName, si.Quantity, si.UnitPrice, si.Category, si.Addons
-                FROM
-                    Sales AS s
-                LEFT JOIN
-                    SaleItems AS si ON s.SaleID = si.SaleID
-                WHERE
-                    s.Status = 'processing'
-                ORDER BY
-                    s.CreatedAt ASC, s.SaleID ASC;
-            """
-            await cursor.execute(sql)
-            rows = await cursor.fetchall()
-
-            # The database returns a flat list. We need to group items by SaleID.
-            orders_dict: Dict[int, dict] = {}
-            item_subtotals: Dict[int, Decimal] = {}
-
-            for row in rows:
-                sale_id = row.SaleID
-
-                if sale_id not in orders_dict:
-                    # First time seeing this SaleID: create the main order object
-                    item_subtotals[sale_id] = Decimal('0.0')
-                    orders_dict[sale_id] = {
-                        "id": f"SO-{sale_id}",  # Format ID to match frontend expectation
-                        "date": row.CreatedAt.strftime("%B %d, %Y %I:%M %p"), # Format date
-                        "status": row.Status,
-                        "orderType": row.OrderType,
-                        "paymentMethod": row.PaymentMethod,
-                        "cashierName": row.CashierName,
-                        "items": 0,  # Sum of quantities, calculated below
-                        "orderItems": [],
-                        "_totalDiscount": row.TotalDiscountAmount, # Temp field for final calculation
-                    }
-
-                # If the order has items (LEFT JOIN can result in NULLs)
-                if row.SaleItemID:
-                    item_quantity = row.Quantity or 0
-                    item_price = row.UnitPrice or Decimal('0.0')
-
-                    # Add to the total number of items for the order
-                    orders_dict[sale_id]["items"] += item_quantity
-                    # Add to the running subtotal for the order
-                    item_subtotals[sale_id] += item_price * item_quantity
-
-                    # Append the detailed item object
-                    orders_dict[sale_id]["orderItems"].append(
-                        ProcessingSaleItem(
-                            name=row.ItemName,
-                            quantity=item_quantity,
-                            price=float(item_price),
-                            category=row.Category,
-                            addons=json.loads(row.Addons) if row.Addons else {}
-                        )
-                    )
-
-            # Now, calculate the final total for each order and format the final list
-            response_list = []
-            for sale_id, order_data in orders_dict.items():
-                subtotal = item_subtotals.get(sale_id, Decimal('0.0'))
-                total_discount = order_data.pop("_totalDiscount", Decimal('0.0'))
-                final_total = subtotal - total_discount
-                order_data["total"] = float(final_total)
-
-                # Validate with Pydantic model and append to the final list
-                response_list.append(ProcessingOrder(**order_data))
-
-            return response_list
+            await cursor.execute(SQL_PROCESSING_PROBE)
+            count, max_rowver, upper = await cursor.fetchone()
+            cursor_value = _encode_cursor(upper)
+            response.headers["X-Order-Cursor"] = cursor_value
+            response.headers["Cache-Control"] = "no-cache"
+
+            if since_value is not None:
+                delta = await _fetch_processing_delta(cursor, since_value, upper)
+                return FastJSONResponse(delta, headers=dict(response.headers))
+
+            etag = f'"po-{count}-{max_rowver.hex() if max_rowver else "0"}"'
+            client_tags = [tag.strip().removeprefix("W/") for tag in (if_none_match or "").split(",")]
+            if etag in client_tags:
+                return Response(
+                    status_code=status.HTTP_304_NOT_MODIFIED,
+                    headers={"ETag": etag, "X-Order-Cursor": cursor_value, "Cache-Control": "no-cache"},
+                )
+            response.headers["ETag"] = etag
+
+            orders = await _fetch_processing_snapshot(cursor)
+            return FastJSONResponse(orders, headers=dict(response.headers))
 
     except Exception as e:
         logger.error(f"Error fetching processing orders: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to fetch processing orders.")
+
+
+# --- Bulk status transitions (kitchen/bar workflow) ---
+# Target status -> statuses an order may move from. 'ready' is shown as FOR PICK UP.
+ORDER_STATUS_TRANSITIONS = {
+    "ready": ["processing"],
+    "completed": ["processing", "ready"],
+    "cancelled": ["processing", "ready"],
+}
+# Timestamp column stamped for each target status (whitelisted: interpolated into the SQL)
+ORDER_STATUS_STAMPS = {"ready": "ReadyAt", "completed": "CompletedAt", "cancelled": "CancelledAt"}
+MAX_STATUS_BATCH = int(os.getenv("MAX_STATUS_BATCH", "200"))
+
+
+class OrderStatusUpdate(BaseModel):
+    orderIds: List[str] = Field(..., min_length=1, max_length=MAX_STATUS_BATCH)  # "SO-123" or "123"
+    status: str
+
+    @field_validator('status')
+    def status_must_be_a_target(cls, v: str) -> str:
+        v = v.strip().lower()
+        if v not in ORDER_STATUS_TRANSITIONS:
+            raise ValueError(f"status must be one of: {', '.join(ORDER_STATUS_TRANSITIONS)}")
+        return v
+
+class OrderStatusChange(BaseModel):
+    id: str
+    previousStatus: str
+    status: str
+    changedAt: datetime
+
+class OrderStatusRejection(BaseModel):
+    id: str
+    currentStatus: Optional[str] = None
+    reason: str
+
+class OrderStatusUpdateResult(BaseModel):
+    updated: List[OrderStatusChange]
+    rejected: List[OrderStatusRejection]
+
+
+def _parse_order_id(order_id: str) -> Optional[int]:
+    value = order_id.strip().upper().removeprefix("SO-")
+    return int(value) if value.isdigit() else None
+
+
+def _status_update_sql(target: str) -> str:
+    # Orders whose current status cannot move to the target are left out by the WHERE clause.
+    return f"""
+        UPDATE s
+        SET Status = ?,
+            StatusChangedAt = SYSUTCDATETIME(),
+            {ORDER_STATUS_STAMPS[target]} = SYSUTCDATETIME()
+        OUTPUT INSERTED.SaleID, DELETED.Status AS PreviousStatus, INSERTED.Status, INSERTED.StatusChangedAt
+        FROM Sales AS s
+        JOIN OPENJSON(?) WITH (SaleID INT '$') AS j ON j.SaleID = s.SaleID
+        WHERE s.Status IN (SELECT value FROM OPENJSON(?));
+    """
+
+
+@router_purchase_order.patch("/status", response_model=OrderStatusUpdateResult)
+async def update_order_statuses(
+    update: OrderStatusUpdate,
+    current_user: dict = Depends(get_current_active_user),
+    conn = Depends(get_db_connection)
+):
+    """
+    Moves many orders to one status in a single UPDATE, e.g. completing ten orders at once.
+    Orders that do not exist or cannot make the transition are returned under `rejected`
+    with their current status; the rest are changed and returned under `updated`.
+    """
+    allowed_roles = ["admin", "manager", "staff", "cashier"]
+    if current_user.get("userRole") not in allowed_roles:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You do not have permission to update orders."
+        )
+
+    rejected = []
+    sale_ids = []
+    for order_id in dict.fromkeys(update.orderIds):
+        sale_id = _parse_order_id(order_id)
+        if sale_id is None:
+            rejected.append(OrderStatusRejection(id=order_id, reason="Invalid order id."))
+        elif sale_id not in sale_ids:
+            sale_ids.append(sale_id)
+
+    updated, changed = [], set()
+    try:
+        async with conn.cursor() as cursor:
+            if sale_ids:
+                await cursor.execute(
+                    _status_update_sql(update.status),
+                    update.status, json.dumps(sale_ids), json.dumps(ORDER_STATUS_TRANSITIONS[update.status]),
+                )
+                rows = await cursor.fetchall()
+                changed = {row.SaleID for row in rows}
+                updated = [
+                    OrderStatusChange(id=f"SO-{row.SaleID}", previousStatus=row.PreviousStatus,
+                                      status=row.Status, changedAt=row.StatusChangedAt)
+                    for row in rows
+                ]
+
+            # Only when something was refused: one lookup to say why.
+            missing = [sale_id for sale_id in sale_ids if sale_id not in changed]
+            if missing:
+                await cursor.execute(
+                    "SELECT s.SaleID, s.Status FROM Sales AS s JOIN OPENJSON(?) WITH (SaleID INT '$') AS j ON j.SaleID = s.SaleID",
+                    json.dumps(missing),
+                )
+                current = {row.SaleID: row.Status for row in await cursor.fetchall()}
+                for sale_id in missing:
+                    if sale_id not in current:
+                        rejected.append(OrderStatusRejection(id=f"SO-{sale_id}", reason="Order not found."))
+                    else:
+                        rejected.append(OrderStatusRejection(
+                            id=f"SO-{sale_id}", currentStatus=current[sale_id],
+                            reason=f"Cannot change a '{current[sale_id]}' order to '{update.status}'.",
+                        ))
+    except Exception as e:
+        logger.error(f"Error updating order statuses: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to update order statuses.")
+
+    if updated:
+        # Changed rows got a new RowVer: order screens drop them on the next poll, so poll now.
+        order_hub.notify()
+    return OrderStatusUpdateResult(updated=updated, rejected=rejected)
+
+
+# --- Order history (recent and archived sales) ---
+MAX_HISTORY_PAGE = int(os.getenv("MAX_HISTORY_PAGE", "1000"))
+
+# The views union Sales/SaleItems with their monthly history tables (sales_archive.py), so a
+# range spanning the archive cut-off reads both without the caller knowing where rows live.
+SQL_ORDER_HISTORY = f"""
+    WITH page AS (
+        SELECT TOP (?) SaleID, OrderType, PaymentMethod, CreatedAt, CashierName, TotalDiscountAmount, Status
+        FROM SalesWithHistory
+        WHERE CreatedAt >= ? AND CreatedAt < ? AND SaleID > ?
+        ORDER BY SaleID
+    )
+    SELECT {ORDER_COLUMNS}
+    FROM
+        page AS s
+    LEFT JOIN
+        SaleItemsWithHistory AS si ON s.SaleID = si.SaleID
+    ORDER BY
+        s.SaleID ASC, si.SaleItemID ASC;
+"""
+
+
+@router_purchase_order.get("/history", response_model=List[ProcessingOrder])
+async def get_order_history(
+    start: datetime = Query(..., description="Inclusive start of the CreatedAt range."),
+    end: datetime = Query(..., description="Exclusive end of the CreatedAt range."),
+    limit: int = Query(200, ge=1, le=MAX_HISTORY_PAGE, description="Orders per page. The next page's cursor is returned in X-Next-Cursor."),
+    after_id: Optional[str] = Query(None, description="Cursor: return orders with a higher id than this."),
+    current_user: dict = Depends(get_current_active_user),
+    conn = Depends(get_read_connection)
+):
+    """Orders of every status created in [start, end), oldest id first, whether or not they are archived."""
+    if current_user.get("userRole") not in ["admin", "manager"]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You do not have permission to view order history."
+        )
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end must be after start.")
+    after_sale_id = 0
+    if after_id is not None:
+        after_sale_id = _parse_order_id(after_id)
+        if after_sale_id is None:
+            raise HTTPException(status_code=400, detail="Invalid 'after_id' cursor.")
+
+    try:
+        async with conn.cursor() as cursor:
+            await cursor.execute(SQL_ORDER_HISTORY, limit, start, end, after_sale_id)
+            orders = _group_order_rows(await cursor.fetchall())
+    except Exception as e:
+        logger.error(f"Error fetching order history: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to fetch order history.")
+
+    headers = {"X-Next-Cursor": orders[-1]["id"]} if len(orders) == limit else {}
+    return FastJSONResponse(orders, headers=headers)
+
+
+# --- Push feed for the orders screens ---
+
+async def _read_upper_bound(cursor) -> bytes:
+    await cursor.execute("SELECT CAST(MIN_ACTIVE_ROWVERSION() AS BINARY(8))")
+    return (await cursor.fetchone())[0]
+
+
+async def _load_stream_snapshot():
+    async with acquire_connection() as conn:
+        async with conn.cursor() as cursor:
+            upper = await _read_upper_bound(cursor)
+            orders = await _fetch_processing_snapshot(cursor)
+    return _encode_cursor(upper), orders
+
+
+async def _load_stream_delta(since: str):
+    async with acquire_connection() as conn:
+        async with conn.cursor() as cursor:
+            upper = await _read_upper_bound(cursor)
+            delta = await _fetch_processing_delta(cursor, _decode_cursor(since), upper)
+    return delta["cursor"], delta["orders"], delta["removed"]
+
+
+order_hub.configure(load_snapshot=_load_stream_snapshot, load_delta=_load_stream_delta)
+
+
+STREAM_AUTH_TIMEOUT_SECONDS = float(os.getenv("STREAM_AUTH_TIMEOUT_SECONDS", "10"))
+
+
+async def _authenticate_stream(websocket: WebSocket) -> Optional[dict]:
+    """The user behind the stream's first message, {"type": "auth", "token": "<access token>"},
+    or None if it is missing, late, malformed or not a valid token for an orders-screen role."""
+    try:
+        message = await asyncio.wait_for(websocket.receive_json(), STREAM_AUTH_TIMEOUT_SECONDS)
+    except (asyncio.TimeoutError, WebSocketDisconnect, ValueError, KeyError):
+        return None
+    if not isinstance(message, dict) or message.get("type") != "auth" or not isinstance(message.get("token"), str):
+        return None
+    try:
+        current_user = await verify_token(message["token"])
+    except HTTPException:
+        return None
+    if current_user.get("userRole") not in ["admin", "manager", "staff", "cashier"]:
+        return None
+    return current_user
+
+
+@router_purchase_order.websocket("/stream")
+async def stream_processing_orders(websocket: WebSocket, since: Optional[str] = Query(None)):
+    """
+    Pushes processing-order events: a snapshot on connect (or, with `since`, only what was
+    missed after that cursor), then order.created / order.updated / order.removed as they
+    happen. Browsers cannot set headers on a WebSocket, and a token in the URL would end up in
+    access logs and proxies, so the client sends it as the first message instead:
+    {"type": "auth", "token": "<access token>"}. Without a valid one within
+    STREAM_AUTH_TIMEOUT_SECONDS the socket is closed with 1008 and nothing is sent.
+    """
+    await websocket.accept()
+    if await _authenticate_stream(websocket) is None:
+        try:
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        except RuntimeError:
+            pass  # the client already went away
+        return
+
+    # Subscribe before reading the backlog so nothing published in between is lost.
+    subscriber = order_hub.subscribe()
+
+    async def send_events():
+        if since:
+            for message in await order_hub.resume_messages(since):
+                await websocket.send_text(message)
+        else:
+            await websocket.send_text(await order_hub.snapshot_message())
+        while True:
+            await websocket.send_text(await next_message(subscriber, order_hub))
+
+    async def wait_for_disconnect():
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+
+    sender = asyncio.create_task(send_events())
+    receiver = asyncio.create_task(wait_for_disconnect())
+    try:
+        done, pending = await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+        error = sender.exception() if sender in done else None
+        if error is not None and not isinstance(error, WebSocketDisconnect):
+            logger.warning(f"Order stream closed with error: {error}")
+            try:
+                await websocket.close(code=status.WS_1011_INTERNAL_ERROR)
+            except RuntimeError:
+                pass  # the socket is already closed
     finally:
-        if conn:
-            await conn.close()
\ No newline at end of file
+        order_hub.unsubscribe(subscriber)
\ No newline at end of file
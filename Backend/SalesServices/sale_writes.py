@@ -0,0 +1,157 @@
+import json
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Set-based writers for sale lines. Each call is a single statement whose SQL text and
+# parameter count never change: the rows travel as one JSON document that SQL Server
+# shreds with OPENJSON. A cart with 2 lines and one with 200 lines both cost one round
+# trip, and the plan cache holds one plan instead of one per cart size.
+
+# (SaleID, ItemName, Quantity, UnitPrice, Category, Addons-as-JSON-text or None, AddonsPrice per unit)
+SaleItemRow = Tuple[int, str, int, Decimal, str, Optional[str], Decimal]
+# (SaleID, DiscountID, DiscountAppliedAmount)
+SaleDiscountRow = Tuple[int, int, Decimal]
+# (IdempotencyKey, OrderType, PaymentMethod, CashierName, TotalDiscountAmount, CreatedAt, Status)
+SaleHeaderRow = Tuple[str, str, str, str, Decimal, datetime, str]
+
+# Client-generated keys of sales ingested through the batch endpoint. No foreign key,
+# so the header insert can fill it with OUTPUT ... INTO.
+SALE_WRITE_TABLES_DDL = """
+IF OBJECT_ID('dbo.SaleIdempotencyKeys', 'U') IS NULL
+    CREATE TABLE dbo.SaleIdempotencyKeys (
+        IdempotencyKey NVARCHAR(100) NOT NULL PRIMARY KEY,
+        SaleID INT NOT NULL,
+        CreatedAt DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME()
+    );
+"""
+
+SQL_FIND_INGESTED_KEYS = """
+    SELECT k.IdempotencyKey, k.SaleID
+    FROM OPENJSON(?) WITH (IdempotencyKey NVARCHAR(100) '$') AS j
+    JOIN SaleIdempotencyKeys AS k ON k.IdempotencyKey = j.IdempotencyKey;
+"""
+
+# MERGE ... ON 1 = 0 is a plain insert that may OUTPUT source columns, which maps each
+# generated SaleID back to the idempotency key it was created for. Replayed sales keep the
+# time they were rung up, and ones the terminal already completed are stamped as such so
+# they never show up among the processing orders.
+SQL_INSERT_SALE_HEADERS = """
+    MERGE INTO Sales AS t
+    USING (
+        SELECT * FROM OPENJSON(?) WITH (
+            IdempotencyKey NVARCHAR(100) '$[0]',
+            OrderType NVARCHAR(50) '$[1]',
+            PaymentMethod NVARCHAR(50) '$[2]',
+            CashierName NVARCHAR(100) '$[3]',
+            TotalDiscountAmount DECIMAL(18, 2) '$[4]',
+            CreatedAt DATETIME2(3) '$[5]',
+            Status VARCHAR(20) '$[6]'
+        )
+    ) AS src
+    ON 1 = 0
+    WHEN NOT MATCHED THEN
+        INSERT (OrderType, PaymentMethod, CashierName, TotalDiscountAmount, CreatedAt, Status,
+                StatusChangedAt, CompletedAt)
+        VALUES (src.OrderType, src.PaymentMethod, src.CashierName, src.TotalDiscountAmount, src.CreatedAt, src.Status,
+                CASE WHEN src.Status = 'completed' THEN SYSUTCDATETIME() END,
+                CASE WHEN src.Status = 'completed' THEN SYSUTCDATETIME() END)
+    OUTPUT inserted.SaleID, src.IdempotencyKey INTO SaleIdempotencyKeys (SaleID, IdempotencyKey)
+    OUTPUT inserted.SaleID, src.IdempotencyKey;
+"""
+
+SQL_INSERT_SALE_LINES = """
+    INSERT INTO SaleItems (SaleID, ItemName, Quantity, UnitPrice, Category, Addons, AddonsPrice)
+    SELECT j.SaleID, j.ItemName, j.Quantity, j.UnitPrice, j.Category, j.Addons, j.AddonsPrice
+    FROM OPENJSON(?) WITH (
+        SaleID INT '$[0]',
+        ItemName NVARCHAR(255) '$[1]',
+        Quantity INT '$[2]',
+        UnitPrice DECIMAL(18, 2) '$[3]',
+        Category NVARCHAR(100) '$[4]',
+        Addons NVARCHAR(MAX) '$[5]',
+        AddonsPrice DECIMAL(18, 2) '$[6]'
+    ) AS j;
+
+    INSERT INTO SaleDiscounts (SaleID, DiscountID, DiscountAppliedAmount)
+    SELECT j.SaleID, j.DiscountID, j.DiscountAppliedAmount
+    FROM OPENJSON(?) WITH (
+        SaleID INT '$[0]',
+        DiscountID INT '$[1]',
+        DiscountAppliedAmount DECIMAL(18, 2) '$[2]'
+    ) AS j;
+"""
+
+
+def _encode_value(v):
+    if isinstance(v, Decimal):
+        return str(v)
+    if isinstance(v, datetime):
+        return v.isoformat(timespec="milliseconds")
+    return v
+
+
+def _encode_rows(rows: Iterable[tuple]) -> str:
+    # Decimals go over as strings so OPENJSON converts them without float rounding;
+    # datetimes as ISO 8601, which OPENJSON converts regardless of the session's date format.
+    return json.dumps(
+        [[_encode_value(v) for v in row] for row in rows],
+        separators=(",", ":"),
+    )
+
+
+def sale_item_rows(sale_id: int, cart_items, unit_prices: Optional[List[Decimal]] = None,
+                   addon_prices: Optional[List[Decimal]] = None) -> List[SaleItemRow]:
+    """
+    Builds SaleItems rows from request cart items (anything with name/quantity/price/category/addons).
+    `unit_prices`, when given, are the server-side prices for each line and replace item.price;
+    `addon_prices` are the per-unit add-on prices charged on each line (0 when not given).
+    """
+    if unit_prices is None:
+        unit_prices = [Decimal(str(item.price)) for item in cart_items]
+    if addon_prices is None:
+        addon_prices = [Decimal('0.0')] * len(cart_items)
+    return [
+        (
+            sale_id,
+            item.name,
+            item.quantity,
+            unit_price,
+            item.category,
+            json.dumps(item.addons) if item.addons else None,
+            addons_price,
+        )
+        for item, unit_price, addons_price in zip(cart_items, unit_prices, addon_prices)
+    ]
+
+
+def sale_discount_rows(sale_id: int, discount_details: List[dict]) -> List[SaleDiscountRow]:
+    return [(sale_id, d["id"], d["amount"]) for d in discount_details]
+
+
+async def insert_sale_lines(cursor, item_rows: List[SaleItemRow], discount_rows: List[SaleDiscountRow]) -> int:
+    """
+    Inserts SaleItems and SaleDiscounts rows for one or many sales in one round trip.
+    Returns the number of statements sent (0 when there is nothing to write, otherwise 1).
+    """
+    if not item_rows and not discount_rows:
+        return 0
+    await cursor.execute(SQL_INSERT_SALE_LINES, _encode_rows(item_rows), _encode_rows(discount_rows))
+    return 1
+
+
+async def find_ingested_keys(cursor, keys: List[str]) -> Dict[str, int]:
+    """One indexed lookup: which of `keys` were already ingested, and as which SaleID."""
+    if not keys:
+        return {}
+    await cursor.execute(SQL_FIND_INGESTED_KEYS, json.dumps(keys))
+    return {row.IdempotencyKey: row.SaleID for row in await cursor.fetchall()}
+
+
+async def insert_sale_headers(cursor, header_rows: List[SaleHeaderRow]) -> Dict[str, int]:
+    """Inserts Sales rows for many sales in one statement and records their idempotency keys.
+    Returns {IdempotencyKey: SaleID}."""
+    if not header_rows:
+        return {}
+    await cursor.execute(SQL_INSERT_SALE_HEADERS, _encode_rows(header_rows))
+    return {row.IdempotencyKey: row.SaleID for row in await cursor.fetchall()}
@@ -0,0 +1,299 @@
+"""
+Hot/cold split of sales. Sales closed (completed or cancelled) more than ARCHIVE_AFTER_DAYS
+ago are moved, with their items and discounts, into SalesHistory / SaleItemsHistory /
+SaleDiscountsHistory. Those tables are partitioned by month of the sale's CreatedAt, so
+Sales, SaleItems and SaleDiscounts only hold recent and open orders.
+
+Moves run in small transactions with a short lock timeout and low deadlock priority. Rows
+the till has locked are skipped (READPAST), and the job pauses between batches for at least
+as long as the last batch took. Reads that need every sale go through the
+SalesWithHistory / SaleItemsWithHistory views.
+
+    python sales_archive.py run     # one archival run now, regardless of ARCHIVE_ENABLED
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+from typing import Optional
+
+from database import init_db_pool, close_db_pool, acquire_connection, transaction
+from schema_migrations import create_index
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_ENABLED = os.getenv("ARCHIVE_ENABLED", "1") == "1"
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "90"))              # closed this long ago
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))             # sales per transaction
+ARCHIVE_BATCH_PAUSE_SECONDS = float(os.getenv("ARCHIVE_BATCH_PAUSE_SECONDS", "0.5"))
+ARCHIVE_MAX_BATCHES_PER_RUN = int(os.getenv("ARCHIVE_MAX_BATCHES_PER_RUN", "200"))
+ARCHIVE_LOCK_TIMEOUT_MS = int(os.getenv("ARCHIVE_LOCK_TIMEOUT_MS", "2000"))
+ARCHIVE_START_DELAY_SECONDS = float(os.getenv("ARCHIVE_START_DELAY_SECONDS", "60"))
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", "3600"))
+
+# --- Schema (applied by migrations.py) ---
+
+SALES_HISTORY_DDL = """
+IF NOT EXISTS (SELECT 1 FROM sys.partition_functions WHERE name = 'pf_SalesHistoryMonth')
+    CREATE PARTITION FUNCTION pf_SalesHistoryMonth (DATETIME) AS RANGE RIGHT FOR VALUES ();
+IF NOT EXISTS (SELECT 1 FROM sys.partition_schemes WHERE name = 'ps_SalesHistoryMonth')
+    CREATE PARTITION SCHEME ps_SalesHistoryMonth AS PARTITION pf_SalesHistoryMonth ALL TO ([PRIMARY]);
+IF OBJECT_ID('dbo.SalesHistory', 'U') IS NULL
+    CREATE TABLE dbo.SalesHistory (
+        SaleID INT NOT NULL,
+        OrderType NVARCHAR(50) NOT NULL,
+        PaymentMethod NVARCHAR(50) NOT NULL,
+        CashierName NVARCHAR(100) NOT NULL,
+        TotalDiscountAmount DECIMAL(18, 2) NOT NULL,
+        Status VARCHAR(20) NOT NULL,
+        CreatedAt DATETIME NOT NULL,
+        StatusChangedAt DATETIME2 NULL,
+        ReadyAt DATETIME2 NULL,
+        CompletedAt DATETIME2 NULL,
+        CancelledAt DATETIME2 NULL,
+        ArchivedAt DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME(),
+        CONSTRAINT PK_SalesHistory PRIMARY KEY CLUSTERED (CreatedAt, SaleID)
+    ) ON ps_SalesHistoryMonth (CreatedAt);
+IF OBJECT_ID('dbo.SaleItemsHistory', 'U') IS NULL
+    CREATE TABLE dbo.SaleItemsHistory (
+        SaleItemID INT NOT NULL,
+        SaleID INT NOT NULL,
+        SaleCreatedAt DATETIME NOT NULL,
+        ItemName NVARCHAR(255) NOT NULL,
+        Quantity INT NOT NULL,
+        UnitPrice DECIMAL(18, 2) NOT NULL,
+        Category NVARCHAR(100) NULL,
+        Addons NVARCHAR(MAX) NULL,
+        CONSTRAINT PK_SaleItemsHistory PRIMARY KEY CLUSTERED (SaleCreatedAt, SaleID, SaleItemID)
+    ) ON ps_SalesHistoryMonth (SaleCreatedAt);
+IF OBJECT_ID('dbo.SaleDiscountsHistory', 'U') IS NULL
+    CREATE TABLE dbo.SaleDiscountsHistory (
+        SaleDiscountID INT NOT NULL,
+        SaleID INT NOT NULL,
+        SaleCreatedAt DATETIME NOT NULL,
+        DiscountID INT NOT NULL,
+        DiscountAppliedAmount DECIMAL(18, 2) NOT NULL,
+        CONSTRAINT PK_SaleDiscountsHistory PRIMARY KEY CLUSTERED (SaleCreatedAt, SaleID, SaleDiscountID)
+    ) ON ps_SalesHistoryMonth (SaleCreatedAt);
+""" + "".join([
+    # Lookups by id; partition-aligned, so one seek per month.
+    create_index("SalesHistory", "IX_SalesHistory_SaleID", "(SaleID)"),
+    create_index("SaleItemsHistory", "IX_SaleItemsHistory_SaleID",
+                 "(SaleID) INCLUDE (ItemName, Quantity, UnitPrice, Category, Addons)"),
+    # What the archiver looks for: closed sales, oldest id first.
+    create_index("Sales", "IX_Sales_Closed",
+                 "(SaleID) INCLUDE (CreatedAt, StatusChangedAt, CompletedAt, CancelledAt) "
+                 "WHERE Status IN ('completed', 'cancelled')"),
+]) + """
+IF OBJECT_ID('dbo.SalesWithHistory', 'V') IS NULL
+    EXEC('CREATE VIEW dbo.SalesWithHistory AS
+        SELECT SaleID, OrderType, PaymentMethod, CashierName, TotalDiscountAmount, Status, CreatedAt,
+               CAST(0 AS BIT) AS Archived
+        FROM dbo.Sales
+        UNION ALL
+        SELECT SaleID, OrderType, PaymentMethod, CashierName, TotalDiscountAmount, Status, CreatedAt,
+               CAST(1 AS BIT) AS Archived
+        FROM dbo.SalesHistory');
+IF OBJECT_ID('dbo.SaleItemsWithHistory', 'V') IS NULL
+    EXEC('CREATE VIEW dbo.SaleItemsWithHistory AS
+        SELECT SaleItemID, SaleID, ItemName, Quantity, UnitPrice, Category, Addons FROM dbo.SaleItems
+        UNION ALL
+        SELECT SaleItemID, SaleID, ItemName, Quantity, UnitPrice, Category, Addons FROM dbo.SaleItemsHistory');
+"""
+
+# Per-unit add-on price charged on each line, so rollup rebuilds total exactly what the sale
+# recorded. Lines written before this column existed read as 0. The view is redefined through
+# EXEC so it compiles after the columns exist.
+SALE_LINE_ADDONS_PRICE_DDL = """
+IF COL_LENGTH('dbo.SaleItems', 'AddonsPrice') IS NULL
+    ALTER TABLE dbo.SaleItems ADD AddonsPrice DECIMAL(18, 2) NULL;
+IF COL_LENGTH('dbo.SaleItemsHistory', 'AddonsPrice') IS NULL
+    ALTER TABLE dbo.SaleItemsHistory ADD AddonsPrice DECIMAL(18, 2) NULL;
+EXEC('ALTER VIEW dbo.SaleItemsWithHistory AS
+    SELECT SaleItemID, SaleID, ItemName, Quantity, UnitPrice, Category, Addons, AddonsPrice FROM dbo.SaleItems
+    UNION ALL
+    SELECT SaleItemID, SaleID, ItemName, Quantity, UnitPrice, Category, Addons, AddonsPrice FROM dbo.SaleItemsHistory');
+"""
+
+# --- Statements ---
+
+# Only one worker process archives at a time; the others skip the run.
+SQL_TRY_ARCHIVE_LOCK = """
+DECLARE @Result INT;
+EXEC @Result = sp_getapplock @Resource = 'SalesArchive', @LockMode = 'Exclusive', @LockOwner = 'Session', @LockTimeout = 0;
+SELECT @Result;
+"""
+SQL_RELEASE_ARCHIVE_LOCK = "EXEC sp_releaseapplock @Resource = 'SalesArchive', @LockOwner = 'Session'"
+
+# Adds a monthly boundary for every month from the oldest sale to next month, so rows are
+# always moved into an existing, empty-until-now partition (SPLIT is then metadata only).
+SQL_ENSURE_PARTITIONS = """
+DECLARE @Month DATETIME = DATEADD(MONTH, DATEDIFF(MONTH, 0, (SELECT MIN(CreatedAt) FROM Sales)), 0);
+DECLARE @Last DATETIME = DATEADD(MONTH, DATEDIFF(MONTH, 0, GETDATE()) + 1, 0);
+WHILE @Month IS NOT NULL AND @Month <= @Last
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM sys.partition_range_values AS v
+        JOIN sys.partition_functions AS f ON f.function_id = v.function_id
+        WHERE f.name = 'pf_SalesHistoryMonth' AND CAST(v.value AS DATETIME) = @Month
+    )
+    BEGIN
+        ALTER PARTITION SCHEME ps_SalesHistoryMonth NEXT USED [PRIMARY];
+        ALTER PARTITION FUNCTION pf_SalesHistoryMonth() SPLIT RANGE (@Month);
+    END
+    SET @Month = DATEADD(MONTH, 1, @Month);
+END
+"""
+
+# One batch: pick closed sales (skipping rows the till holds), copy them with their lines,
+# then delete the originals children first. The SET options end with the parameterized batch.
+SQL_ARCHIVE_BATCH = f"""
+SET NOCOUNT ON;
+SET LOCK_TIMEOUT {ARCHIVE_LOCK_TIMEOUT_MS};
+SET DEADLOCK_PRIORITY LOW;
+DECLARE @Cutoff DATETIME2 = DATEADD(DAY, -?, SYSUTCDATETIME());
+DECLARE @Batch TABLE (SaleID INT PRIMARY KEY, CreatedAt DATETIME NOT NULL);
+
+INSERT INTO @Batch (SaleID, CreatedAt)
+SELECT TOP (?) SaleID, CreatedAt
+FROM Sales WITH (UPDLOCK, ROWLOCK, READPAST)
+WHERE Status IN ('completed', 'cancelled')
+  AND COALESCE(CompletedAt, CancelledAt, StatusChangedAt, CreatedAt) < @Cutoff
+ORDER BY SaleID;
+
+INSERT INTO SalesHistory (SaleID, OrderType, PaymentMethod, CashierName, TotalDiscountAmount, Status, CreatedAt,
+                          StatusChangedAt, ReadyAt, CompletedAt, CancelledAt)
+SELECT s.SaleID, s.OrderType, s.PaymentMethod, s.CashierName, s.TotalDiscountAmount, s.Status, s.CreatedAt,
+       s.StatusChangedAt, s.ReadyAt, s.CompletedAt, s.CancelledAt
+FROM Sales AS s JOIN @Batch AS b ON b.SaleID = s.SaleID;
+
+INSERT INTO SaleItemsHistory (SaleItemID, SaleID, SaleCreatedAt, ItemName, Quantity, UnitPrice, Category, Addons,
+                              AddonsPrice)
+SELECT si.SaleItemID, si.SaleID, b.CreatedAt, si.ItemName, si.Quantity, si.UnitPrice, si.Category, si.Addons,
+       si.AddonsPrice
+FROM SaleItems AS si JOIN @Batch AS b ON b.SaleID = si.SaleID;
+
+INSERT INTO SaleDiscountsHistory (SaleDiscountID, SaleID, SaleCreatedAt, DiscountID, DiscountAppliedAmount)
+SELECT sd.SaleDiscountID, sd.SaleID, b.CreatedAt, sd.DiscountID, sd.DiscountAppliedAmount
+FROM SaleDiscounts AS sd JOIN @Batch AS b ON b.SaleID = sd.SaleID;
+
+DELETE si FROM SaleItems AS si JOIN @Batch AS b ON b.SaleID = si.SaleID;
+DELETE sd FROM SaleDiscounts AS sd JOIN @Batch AS b ON b.SaleID = sd.SaleID;
+DELETE s FROM Sales AS s JOIN @Batch AS b ON b.SaleID = s.SaleID;
+
+SELECT COUNT(*) FROM @Batch;
+"""
+
+LOCK_TIMEOUT_ERROR = "1222"
+
+
+class SalesArchiver:
+    """Background task that moves old closed sales into the history tables."""
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._last_run_at: Optional[float] = None
+        self.stats = {"runs": 0, "skipped_runs": 0, "batches": 0, "archived_sales": 0, "lock_timeouts": 0,
+                      "failed_runs": 0}
+
+    def start(self):
+        if ARCHIVE_ENABLED and self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run(), name="sales-archiver")
+
+    async def stop(self):
+        """Stops after the batch in progress."""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        await self._task
+        self._task = None
+
+    async def _sleep(self, seconds: float):
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _run(self):
+        await self._sleep(ARCHIVE_START_DELAY_SECONDS)
+        while not self._stopping:
+            try:
+                await self.run_once()
+            except Exception as e:
+                self.stats["failed_runs"] += 1
+                logger.error(f"Sales archival run failed: {e}", exc_info=True)
+            await self._sleep(ARCHIVE_INTERVAL_SECONDS)
+
+    async def run_once(self) -> int:
+        """Archives up to ARCHIVE_MAX_BATCHES_PER_RUN batches and returns the number of sales moved."""
+        moved_total = 0
+        async with acquire_connection() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(SQL_TRY_ARCHIVE_LOCK)
+                row = await cursor.fetchone()
+                if row is None or row[0] < 0:
+                    self.stats["skipped_runs"] += 1
+                    return 0
+                try:
+                    self.stats["runs"] += 1
+                    async with transaction(conn):
+                        await cursor.execute(SQL_ENSURE_PARTITIONS)
+                    for _ in range(ARCHIVE_MAX_BATCHES_PER_RUN):
+                        if self._stopping:
+                            break
+                        started = time.perf_counter()
+                        try:
+                            async with transaction(conn):
+                                await cursor.execute(SQL_ARCHIVE_BATCH, ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE)
+                                moved = (await cursor.fetchone())[0]
+                        except Exception as e:
+                            if LOCK_TIMEOUT_ERROR not in str(e):
+                                raise
+                            # The till held a lock we needed: give way and retry next run.
+                            self.stats["lock_timeouts"] += 1
+                            break
+                        elapsed = time.perf_counter() - started
+                        self.stats["batches"] += 1
+                        self.stats["archived_sales"] += moved
+                        moved_total += moved
+                        if moved < ARCHIVE_BATCH_SIZE:
+                            break
+                        # Spend at most half of the time holding locks.
+                        await asyncio.sleep(max(ARCHIVE_BATCH_PAUSE_SECONDS, elapsed))
+                finally:
+                    await cursor.execute(SQL_RELEASE_ARCHIVE_LOCK)
+        self._last_run_at = time.monotonic()
+        if moved_total:
+            logger.info(f"Archived {moved_total} sales closed more than {ARCHIVE_AFTER_DAYS} days ago.")
+        return moved_total
+
+    def get_stats(self) -> dict:
+        return {
+            "enabled": ARCHIVE_ENABLED,
+            "archive_after_days": ARCHIVE_AFTER_DAYS,
+            "seconds_since_run": round(time.monotonic() - self._last_run_at, 3) if self._last_run_at else None,
+            **self.stats,
+        }
+
+
+archiver = SalesArchiver()
+
+
+async def _main(command: str):
+    await init_db_pool()
+    try:
+        print(f"Archived {await archiver.run_once()} sales.")
+    finally:
+        await close_db_pool()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Sales archival.")
+    parser.add_argument("command", choices=["run"])
+    asyncio.run(_main(parser.parse_args().command))
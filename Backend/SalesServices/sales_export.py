@@ -0,0 +1,153 @@
+import csv
+import io
+import json
+import logging
+import os
+import zlib
+from datetime import datetime
+from decimal import Decimal
+from typing import AsyncIterator, List, NamedTuple, Optional
+
+from database import acquire_connection, ReadClient
+
+logger = logging.getLogger(__name__)
+
+# Transaction dumps for the admin pages and accounting. Rows are read with fetchmany from a
+# forward-only cursor, which SQL Server streams, and are grouped into sales as they arrive
+# (they come ordered by SaleID). Memory holds one batch and one sale, whatever the range.
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "500"))
+
+EXPORT_MEDIA_TYPES = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
+CSV_COLUMNS = [
+    "saleId", "createdAt", "status", "orderType", "paymentMethod", "cashierName",
+    "itemCount", "subtotal", "discount", "total", "items",
+]
+
+# Archived sales included (SalesWithHistory); every filter is optional but the SQL shape is fixed.
+SQL_EXPORT_SALES = """
+    SELECT s.SaleID, s.CreatedAt, s.Status, s.OrderType, s.PaymentMethod, s.CashierName, s.TotalDiscountAmount,
+           si.ItemName, si.Quantity, si.UnitPrice, si.Category, si.Addons
+    FROM SalesWithHistory AS s
+    LEFT JOIN SaleItemsWithHistory AS si ON si.SaleID = s.SaleID
+    WHERE s.CreatedAt >= ? AND s.CreatedAt < ?
+      AND (? IS NULL OR s.Status = ?)
+      AND (? IS NULL OR s.PaymentMethod = ?)
+      AND (? IS NULL OR s.OrderType = ?)
+      AND (? IS NULL OR s.CashierName = ?)
+    ORDER BY s.SaleID, si.SaleItemID
+"""
+
+
+class ExportFilters(NamedTuple):
+    start: datetime
+    end: datetime
+    status: Optional[str] = None
+    payment_method: Optional[str] = None
+    order_type: Optional[str] = None
+    cashier: Optional[str] = None
+
+    def params(self) -> list:
+        params = [self.start, self.end]
+        for value in (self.status, self.payment_method, self.order_type, self.cashier):
+            params += [value, value]
+        return params
+
+
+def _new_sale(row) -> dict:
+    return {
+        "saleId": row.SaleID,
+        "createdAt": row.CreatedAt.isoformat(),
+        "status": row.Status,
+        "orderType": row.OrderType,
+        "paymentMethod": row.PaymentMethod,
+        "cashierName": row.CashierName,
+        "itemCount": 0,
+        "subtotal": Decimal('0.0'),
+        "discount": row.TotalDiscountAmount or Decimal('0.0'),
+        "total": Decimal('0.0'),
+        "items": [],
+    }
+
+
+def _add_item(sale: dict, row):
+    quantity = row.Quantity or 0
+    price = row.UnitPrice or Decimal('0.0')
+    sale["itemCount"] += quantity
+    sale["subtotal"] += price * quantity
+    sale["items"].append({
+        "name": row.ItemName,
+        "quantity": quantity,
+        "price": str(price),
+        "category": row.Category,
+        "addons": json.loads(row.Addons) if row.Addons else {},
+    })
+
+
+def _encode_ndjson(sales: List[dict]) -> bytes:
+    lines = []
+    for sale in sales:
+        sale["total"] = sale["subtotal"] - sale["discount"]
+        lines.append(json.dumps(sale, default=str))
+    return ("\n".join(lines) + "\n").encode() if lines else b""
+
+
+def _encode_csv(sales: List[dict]) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for sale in sales:
+        items = "; ".join(f"{item['quantity']}x {item['name']}" for item in sale["items"])
+        writer.writerow([
+            sale["saleId"], sale["createdAt"], sale["status"], sale["orderType"], sale["paymentMethod"],
+            sale["cashierName"], sale["itemCount"], sale["subtotal"], sale["discount"],
+            sale["subtotal"] - sale["discount"], items,
+        ])
+    return buffer.getvalue().encode()
+
+
+async def export_sales(filters: ExportFilters, fmt: str, client: Optional[ReadClient] = None) -> AsyncIterator[bytes]:
+    """
+    Yields the export one fetchmany batch at a time, as CSV (with a header row) or NDJSON.
+    Read from the replica when it is current; `client` is the requester's client_key().
+    """
+    encode = _encode_csv if fmt == "csv" else _encode_ndjson
+    if fmt == "csv":
+        header = io.StringIO()
+        csv.writer(header).writerow(CSV_COLUMNS)
+        yield header.getvalue().encode()
+
+    # The request's pooled connection is released before a streamed body is sent,
+    # so the export borrows its own for as long as it runs.
+    exported = 0
+    async with acquire_connection(read_only=True, client=client) as conn:
+        async with conn.cursor() as cursor:
+            await cursor.execute(SQL_EXPORT_SALES, *filters.params())
+            current = None
+            while True:
+                rows = await cursor.fetchmany(EXPORT_BATCH_SIZE)
+                if not rows:
+                    break
+                finished = []
+                for row in rows:
+                    if current is None or current["saleId"] != row.SaleID:
+                        if current is not None:
+                            finished.append(current)
+                        current = _new_sale(row)
+                    if row.ItemName is not None:
+                        _add_item(current, row)
+                # The last sale may continue in the next batch, so it is held back.
+                if finished:
+                    exported += len(finished)
+                    yield encode(finished)
+            if current is not None:
+                exported += 1
+                yield encode([current])
+    logger.info(f"Exported {exported} sales ({fmt}) for {filters.start} .. {filters.end}.")
+
+
+async def gzip_stream(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
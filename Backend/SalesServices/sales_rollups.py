@@ -0,0 +1,239 @@
+"""
+Hourly and daily sales rollups, keyed by (BucketStart, Dimension, DimensionValue).
+GrossAmount is (UnitPrice + AddonsPrice) * Quantity as stored on SaleItems, the same subtotal
+the discounts are computed on; DiscountAmount is only tracked on the sale-level dimensions.
+Sales apply their deltas in their own transaction. Repair drift with:
+    python sales_rollups.py rebuild --start 2025-05-01 --end 2025-06-01
+"""
+import argparse
+import asyncio
+import json
+import logging
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+from database import acquire_connection, init_db_pool, close_db_pool, transaction
+from price_catalog import PricedCart
+
+logger = logging.getLogger(__name__)
+
+GRAINS = {
+    "hour": ("SalesRollupHourly", "DATEADD(HOUR, DATEDIFF(HOUR, 0, {col}), 0)"),
+    "day": ("SalesRollupDaily", "CAST(CAST({col} AS DATE) AS DATETIME2)"),
+}
+DIMENSIONS = ["total", "item", "category", "paymentMethod", "orderType", "cashier"]
+
+ROLLUP_TABLES_DDL = "\n".join(f"""
+IF OBJECT_ID('dbo.{table}', 'U') IS NULL
+    CREATE TABLE dbo.{table} (
+        BucketStart DATETIME2 NOT NULL,
+        Dimension VARCHAR(20) NOT NULL,
+        DimensionValue NVARCHAR(255) NOT NULL,
+        SaleCount INT NOT NULL,
+        ItemQuantity INT NOT NULL,
+        GrossAmount DECIMAL(18, 2) NOT NULL,
+        DiscountAmount DECIMAL(18, 2) NOT NULL,
+        CONSTRAINT PK_{table} PRIMARY KEY (Dimension, BucketStart, DimensionValue)
+    );
+""" for table, _ in GRAINS.values())
+
+# (SaleID, Dimension, DimensionValue, SaleCount, ItemQuantity, GrossAmount, DiscountAmount)
+RollupRow = Tuple[int, str, str, int, int, Decimal, Decimal]
+
+
+def _merge_sql(table: str, bucket_expr: str) -> str:
+    # The bucket comes from Sales.CreatedAt so incremental rows land exactly where a rebuild puts them.
+    bucket = bucket_expr.format(col="s.CreatedAt")
+    return f"""
+    MERGE {table} WITH (HOLDLOCK) AS t
+    USING (
+        SELECT {bucket} AS BucketStart, j.Dimension, j.DimensionValue,
+               SUM(j.SaleCount) AS SaleCount, SUM(j.ItemQuantity) AS ItemQuantity,
+               SUM(j.GrossAmount) AS GrossAmount, SUM(j.DiscountAmount) AS DiscountAmount
+        FROM OPENJSON(?) WITH (
+            SaleID INT '$[0]',
+            Dimension VARCHAR(20) '$[1]',
+            DimensionValue NVARCHAR(255) '$[2]',
+            SaleCount INT '$[3]',
+            ItemQuantity INT '$[4]',
+            GrossAmount DECIMAL(18, 2) '$[5]',
+            DiscountAmount DECIMAL(18, 2) '$[6]'
+        ) AS j
+        JOIN Sales AS s ON s.SaleID = j.SaleID
+        GROUP BY {bucket}, j.Dimension, j.DimensionValue
+    ) AS src
+    ON t.Dimension = src.Dimension AND t.BucketStart = src.BucketStart AND t.DimensionValue = src.DimensionValue
+    WHEN MATCHED THEN UPDATE SET
+        t.SaleCount = t.SaleCount + src.SaleCount,
+        t.ItemQuantity = t.ItemQuantity + src.ItemQuantity,
+        t.GrossAmount = t.GrossAmount + src.GrossAmount,
+        t.DiscountAmount = t.DiscountAmount + src.DiscountAmount
+    WHEN NOT MATCHED THEN
+        INSERT (BucketStart, Dimension, DimensionValue, SaleCount, ItemQuantity, GrossAmount, DiscountAmount)
+        VALUES (src.BucketStart, src.Dimension, src.DimensionValue, src.SaleCount, src.ItemQuantity,
+                src.GrossAmount, src.DiscountAmount);
+"""
+
+
+SQL_APPLY_ROLLUPS = "".join(_merge_sql(table, bucket) for table, bucket in GRAINS.values())
+
+
+def _rebuild_sql(table: str, bucket_expr: str) -> str:
+    bucket = bucket_expr.format(col="s.CreatedAt")
+    sale_dims = "\n".join(f"""
+        UNION ALL
+        SELECT BucketStart, '{dim}', COALESCE({col}, ''), COUNT(*), SUM(Qty), SUM(Gross), SUM(Discount)
+        FROM sale_totals GROUP BY BucketStart, COALESCE({col}, '')"""
+        for dim, col in [("paymentMethod", "PaymentMethod"), ("orderType", "OrderType"), ("cashier", "CashierName")])
+    line_dims = "\n".join(f"""
+        UNION ALL
+        SELECT BucketStart, '{dim}', COALESCE({col}, ''), COUNT(DISTINCT SaleID), SUM(Quantity),
+               SUM(Quantity * (UnitPrice + AddonsPrice)), 0
+        FROM lines GROUP BY BucketStart, COALESCE({col}, '')"""
+        for dim, col in [("item", "ItemName"), ("category", "Category")])
+    return f"""
+    DELETE FROM {table} WHERE BucketStart >= ? AND BucketStart < ?;
+
+    WITH sale_totals AS (
+        SELECT s.SaleID, {bucket} AS BucketStart, s.PaymentMethod, s.OrderType, s.CashierName,
+               COALESCE(s.TotalDiscountAmount, 0) AS Discount,
+               COALESCE(SUM(si.Quantity), 0) AS Qty,
+               COALESCE(SUM(si.Quantity * (si.UnitPrice + COALESCE(si.AddonsPrice, 0))), 0) AS Gross
+        FROM SalesWithHistory AS s
+        LEFT JOIN SaleItemsWithHistory AS si ON si.SaleID = s.SaleID
+        WHERE s.CreatedAt >= ? AND s.CreatedAt < ?
+        GROUP BY s.SaleID, s.CreatedAt, s.PaymentMethod, s.OrderType, s.CashierName, s.TotalDiscountAmount
+    ),
+    lines AS (
+        SELECT {bucket} AS BucketStart, si.SaleID, si.ItemName, si.Category,
+               COALESCE(si.Quantity, 0) AS Quantity, COALESCE(si.UnitPrice, 0) AS UnitPrice,
+               COALESCE(si.AddonsPrice, 0) AS AddonsPrice
+        FROM SalesWithHistory AS s
+        JOIN SaleItemsWithHistory AS si ON si.SaleID = s.SaleID
+        WHERE s.CreatedAt >= ? AND s.CreatedAt < ?
+    )
+    INSERT INTO {table} (BucketStart, Dimension, DimensionValue, SaleCount, ItemQuantity, GrossAmount, DiscountAmount)
+    SELECT BucketStart, 'total', 'all', COUNT(*), SUM(Qty), SUM(Gross), SUM(Discount)
+    FROM sale_totals GROUP BY BucketStart{sale_dims}{line_dims};
+"""
+
+
+# --- Incremental maintenance (inside the sale's transaction) ---
+
+def rollup_rows_for_sale(sale_id: int, cart_items, cart: PricedCart, order_type: str,
+                         payment_method: str, cashier_name: str, total_discount: Decimal) -> List[RollupRow]:
+    """Lines are priced as they are stored on SaleItems (product plus add-ons), so a rebuild agrees."""
+    line_prices = [unit + addons for unit, addons in zip(cart.unit_prices, cart.addon_prices)]
+    quantity = sum(item.quantity for item in cart_items)
+    gross = sum((price * item.quantity for item, price in zip(cart_items, line_prices)), Decimal('0.0'))
+    rows: List[RollupRow] = [
+        (sale_id, "total", "all", 1, quantity, gross, total_discount),
+        (sale_id, "paymentMethod", payment_method or "", 1, quantity, gross, total_discount),
+        (sale_id, "orderType", order_type or "", 1, quantity, gross, total_discount),
+        (sale_id, "cashier", cashier_name or "", 1, quantity, gross, total_discount),
+    ]
+    for dimension, key in (("item", lambda i: i.name), ("category", lambda i: i.category)):
+        totals: Dict[str, list] = OrderedDict()
+        for item, price in zip(cart_items, line_prices):
+            entry = totals.setdefault(key(item) or "", [0, Decimal('0.0')])
+            entry[0] += item.quantity
+            entry[1] += price * item.quantity
+        rows += [(sale_id, dimension, value, 1, qty, amount, Decimal('0.0')) for value, (qty, amount) in totals.items()]
+    return rows
+
+
+async def apply_rollups(cursor, rows: List[RollupRow]):
+    """Adds the rows to both grains in one round trip. Run it in the transaction that writes the sales."""
+    if not rows:
+        return
+    payload = json.dumps([[str(v) if isinstance(v, Decimal) else v for v in row] for row in rows])
+    await cursor.execute(SQL_APPLY_ROLLUPS, *([payload] * len(GRAINS)))
+
+
+# --- Rebuild from raw data ---
+
+def _align(grain: str, start: datetime, end: datetime) -> Tuple[datetime, datetime]:
+    if grain == "hour":
+        start = start.replace(minute=0, second=0, microsecond=0)
+        if end != end.replace(minute=0, second=0, microsecond=0):
+            end = end.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    else:
+        start = datetime.combine(start.date(), datetime.min.time())
+        if end != datetime.combine(end.date(), datetime.min.time()):
+            end = datetime.combine(end.date(), datetime.min.time()) + timedelta(days=1)
+    return start, end
+
+
+async def rebuild_rollups(start: datetime, end: datetime):
+    """Recomputes every rollup bucket overlapping [start, end) from all sales, archived ones included."""
+    async with acquire_connection() as conn:
+        for grain, (table, bucket) in GRAINS.items():
+            bucket_start, bucket_end = _align(grain, start, end)
+            async with transaction(conn), conn.cursor() as cursor:
+                await cursor.execute(_rebuild_sql(table, bucket), *([bucket_start, bucket_end] * 3))
+            logger.info(f"Rebuilt {table} for {bucket_start} .. {bucket_end}.")
+
+
+async def ensure_rollup_tables():
+    async with acquire_connection() as conn:
+        async with conn.cursor() as cursor:
+            await cursor.execute(ROLLUP_TABLES_DDL)
+
+
+# --- Reads ---
+
+def _summary_sql(table: str, by_bucket: bool) -> str:
+    bucket_col = "BucketStart, " if by_bucket else ""
+    return f"""
+        SELECT {bucket_col}DimensionValue, SUM(SaleCount) AS SaleCount, SUM(ItemQuantity) AS ItemQuantity,
+               SUM(GrossAmount) AS GrossAmount, SUM(DiscountAmount) AS DiscountAmount
+        FROM {table}
+        WHERE Dimension = ? AND BucketStart >= ? AND BucketStart < ? AND (? IS NULL OR DimensionValue = ?)
+        GROUP BY {bucket_col}DimensionValue
+        ORDER BY {bucket_col}GrossAmount DESC
+    """
+
+
+async def query_summary(cursor, grain: str, dimension: str, start: datetime, end: datetime,
+                        by_bucket: bool, value: Optional[str] = None) -> List[dict]:
+    table, _ = GRAINS[grain]
+    await cursor.execute(_summary_sql(table, by_bucket), dimension, start, end, value, value)
+    results = []
+    for row in await cursor.fetchall():
+        entry = {"bucket": row.BucketStart.isoformat()} if by_bucket else {}
+        entry.update({
+            "value": row.DimensionValue,
+            "saleCount": row.SaleCount,
+            "itemQuantity": row.ItemQuantity,
+            "grossAmount": float(row.GrossAmount),
+            "discountAmount": float(row.DiscountAmount),
+            "netAmount": float(row.GrossAmount - row.DiscountAmount),
+        })
+        results.append(entry)
+    return results
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description="Sales rollup maintenance.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rebuild = sub.add_parser("rebuild", help="Recompute rollups for a date range from raw sales.")
+    rebuild.add_argument("--start", type=date.fromisoformat, required=True, help="First day (YYYY-MM-DD).")
+    rebuild.add_argument("--end", type=date.fromisoformat, required=True, help="Day after the last day (YYYY-MM-DD).")
+    return parser.parse_args()
+
+
+async def _main(args):
+    await init_db_pool()
+    try:
+        await ensure_rollup_tables()
+        await rebuild_rollups(datetime.combine(args.start, datetime.min.time()),
+                              datetime.combine(args.end, datetime.min.time()))
+    finally:
+        await close_db_pool()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main(_parse_args()))
@@ -0,0 +1,126 @@
+"""
+Production entry point (main.py's __main__ block is the single-process dev server with reload):
+
+    python serve.py [--workers 4] [--host 0.0.0.0] [--port 9000]
+
+- WEB_CONCURRENCY worker processes share one listening socket. Each worker opens its own DB
+  pool (DB_POOL_MIN_SIZE..DB_POOL_MAX_SIZE connections), so size the pool per worker.
+- WEB_LOOP / WEB_HTTP default to "auto": uvloop and httptools when installed, asyncio and h11 otherwise.
+  requirements.txt installs both, except uvloop on Windows, which it does not support.
+- A worker answers /health/ready with 503 until its lifespan has warmed the pools and caches.
+- With several workers, each one's metrics are pooled in METRICS_MULTIPROC_DIR (a temporary
+  directory unless set), so /metrics on whichever worker takes the scrape covers all of them.
+- On SIGTERM/SIGINT a worker first reports "draining" for DRAIN_DELAY_SECONDS so load balancers
+  stop routing to it. Then it stops accepting connections and waits up to
+  SHUTDOWN_TIMEOUT_SECONDS for in-flight requests. Last, it runs the lifespan shutdown, which
+  stops the background workers. A second signal exits at once.
+"""
+import argparse
+import glob
+import importlib.util
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+import uvicorn
+from uvicorn.supervisors import Multiprocess
+
+import lifecycle
+
+logger = logging.getLogger("uvicorn.error")
+
+WEB_HOST = os.getenv("WEB_HOST", "0.0.0.0")
+WEB_PORT = int(os.getenv("WEB_PORT", "9000"))
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+WEB_LOOP = os.getenv("WEB_LOOP", "auto")                 # auto | asyncio | uvloop
+WEB_HTTP = os.getenv("WEB_HTTP", "auto")                 # auto | h11 | httptools
+WEB_ACCESS_LOG = os.getenv("WEB_ACCESS_LOG", "0") == "1"  # per-request timings are on /metrics
+WEB_KEEPALIVE_SECONDS = int(os.getenv("WEB_KEEPALIVE_SECONDS", "5"))
+DRAIN_DELAY_SECONDS = float(os.getenv("DRAIN_DELAY_SECONDS", "5"))
+SHUTDOWN_TIMEOUT_SECONDS = int(os.getenv("SHUTDOWN_TIMEOUT_SECONDS", "30"))
+
+
+class DrainingServer(uvicorn.Server):
+    """uvicorn.Server that flips readiness to "draining" and keeps serving for a while before exiting."""
+
+    def __init__(self, config: uvicorn.Config, drain_delay: float):
+        super().__init__(config)
+        self.drain_delay = drain_delay
+        self._drain_until = None
+
+    def handle_exit(self, sig, frame):
+        if self._drain_until is None and self.drain_delay > 0 and self.started:
+            self._captured_signals.append(sig)
+            lifecycle.mark_draining()
+            self._drain_until = time.monotonic() + self.drain_delay
+            return
+        super().handle_exit(sig, frame)
+
+    async def on_tick(self, counter: int) -> bool:
+        if self._drain_until is not None and time.monotonic() >= self._drain_until:
+            self.should_exit = True
+        return await super().on_tick(counter)
+
+
+def _describe_stack(loop: str, http: str) -> str:
+    if loop == "auto":
+        loop = "uvloop" if importlib.util.find_spec("uvloop") and os.name != "nt" else "asyncio"
+    if http == "auto":
+        http = "httptools" if importlib.util.find_spec("httptools") else "h11"
+    return f"loop={loop}, http={http}"
+
+
+def _metrics_dir() -> tuple:
+    """The directory the workers pool their metrics in, emptied so a previous run's numbers are
+    not added to this one's, and whether it was created here (and is removed on exit)."""
+    path = os.getenv("METRICS_MULTIPROC_DIR")
+    if not path:
+        return tempfile.mkdtemp(prefix="metrics-"), True
+    os.makedirs(path, exist_ok=True)
+    for stale in glob.glob(os.path.join(path, "*.json")):
+        os.remove(stale)
+    return path, False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=WEB_HOST)
+    parser.add_argument("--port", type=int, default=WEB_PORT)
+    parser.add_argument("--workers", type=int, default=WEB_CONCURRENCY)
+    parser.add_argument("--loop", choices=["auto", "asyncio", "uvloop"], default=WEB_LOOP)
+    parser.add_argument("--http", choices=["auto", "h11", "httptools"], default=WEB_HTTP)
+    args = parser.parse_args()
+
+    config = uvicorn.Config(
+        "main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        loop=args.loop,
+        http=args.http,
+        lifespan="on",  # a worker that cannot warm up exits instead of serving cold
+        access_log=WEB_ACCESS_LOG,
+        proxy_headers=True,
+        timeout_keep_alive=WEB_KEEPALIVE_SECONDS,
+        timeout_graceful_shutdown=SHUTDOWN_TIMEOUT_SECONDS,
+    )
+    # Workers read this to know their in-process state (read-your-writes pins) is not shared.
+    os.environ["WEB_WORKERS"] = str(config.workers)
+    server = DrainingServer(config, DRAIN_DELAY_SECONDS)
+    logger.info(f"Starting {config.workers} worker(s) on {args.host}:{args.port} ({_describe_stack(args.loop, args.http)}).")
+    if config.workers > 1:
+        metrics_dir, created = _metrics_dir()
+        os.environ["METRICS_MULTIPROC_DIR"] = metrics_dir
+        try:
+            Multiprocess(config, target=server.run, sockets=[config.bind_socket()]).run()
+        finally:
+            if created:
+                shutil.rmtree(metrics_dir, ignore_errors=True)
+    else:
+        server.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Shared fixtures. The endpoint tests run the app in-process against the stand-ins from
+benchmarks/stand_ins.py; see tests/test_sale_writes.py for the SQL Server test.
+
+Run from SalesServices/:  python -m pytest tests
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("INVENTORY_SERVICE_TOKEN", "test-service-token")
+
+
+@pytest.fixture(scope="session")
+def run():
+    """Runs a coroutine to completion. One event loop for the whole session, because the
+    service's module-level singletons keep loop-bound primitives between tests."""
+    loop = asyncio.new_event_loop()
+    yield loop.run_until_complete
+    loop.close()
+
+
+@pytest.fixture
+def service(run):
+    """Starts the app over a fresh stand-in database and returns `use(scenario, background=True)`,
+    which awaits `scenario(client, db)` while the app is up. With background=False the outbox
+    dispatcher, sales archiver and order hub are stopped first, so the database sees only the
+    scenario's own requests."""
+    from benchmarks.bench_load import stand_in_service
+    from inventory_outbox import dispatcher as outbox_dispatcher
+    from order_stream import order_hub
+    from sales_archive import archiver as sales_archiver
+
+    args = argparse.Namespace(db_latency_ms=0.0, auth_latency_ms=0.0, inventory_latency_ms=0.0,
+                              pool_size=2, processing_orders=0, items=1)
+
+    def use(scenario, background=True):
+        async def go():
+            async with stand_in_service(args) as (client, db, *_):
+                if not background:
+                    for worker in (outbox_dispatcher, sales_archiver, order_hub):
+                        await worker.stop()
+                return await scenario(client, db)
+        return run(go())
+
+    logging.disable(logging.WARNING)
+    yield use
+    logging.disable(logging.NOTSET)
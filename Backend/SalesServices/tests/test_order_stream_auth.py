@@ -0,0 +1,63 @@
+"""
+The orders-screen WebSocket takes its access token in the first message, never in the URL.
+"""
+import asyncio
+import json
+
+from fastapi import HTTPException
+from starlette.websockets import WebSocketDisconnect
+
+from routers import purchase_order
+
+
+class FirstMessage:
+    """Just enough of a WebSocket for _authenticate_stream: one message, then nothing."""
+
+    def __init__(self, message=None, text=None, disconnect=False):
+        self._text = json.dumps(message) if text is None and message is not None else text
+        self._disconnect = disconnect
+
+    async def receive_json(self):
+        if self._disconnect:
+            raise WebSocketDisconnect(1000)
+        if self._text is None:
+            await asyncio.sleep(3600)
+        return json.loads(self._text)
+
+
+def authenticate(service, socket):
+    async def scenario(client, db):
+        return await purchase_order._authenticate_stream(socket)
+    return service(scenario)
+
+
+def test_first_message_token_authenticates(service):
+    user = authenticate(service, FirstMessage({"type": "auth", "token": "test-token"}))
+    assert user is not None and user["userRole"] in ["admin", "manager", "staff", "cashier"]
+
+
+def test_stream_rejects_missing_or_malformed_auth(service, monkeypatch):
+    monkeypatch.setattr(purchase_order, "STREAM_AUTH_TIMEOUT_SECONDS", 0.01)
+    for socket in (FirstMessage(),  # never sends
+                   FirstMessage(disconnect=True),
+                   FirstMessage(text="not json"),
+                   FirstMessage(["auth", "test-token"]),
+                   FirstMessage({"type": "subscribe", "token": "test-token"}),
+                   FirstMessage({"type": "auth", "token": 42})):
+        assert authenticate(service, socket) is None
+
+
+def test_stream_rejects_bad_tokens_and_other_roles(service, monkeypatch):
+    async def verify_token(token):
+        if token == "expired":
+            raise HTTPException(status_code=401, detail="Could not validate credentials")
+        return {"username": "guest", "userRole": "guest"}
+
+    monkeypatch.setattr(purchase_order, "verify_token", verify_token)
+    for token in ("expired", "guest-token"):
+        assert authenticate(service, FirstMessage({"type": "auth", "token": token})) is None
+
+
+def test_stream_takes_no_token_query_param():
+    route = next(r for r in purchase_order.router_purchase_order.routes if r.path.endswith("/stream"))
+    assert [p.name for p in route.dependant.query_params] == ["since"]
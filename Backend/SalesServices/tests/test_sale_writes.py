@@ -0,0 +1,206 @@
+"""
+Sale writes: the rows create_sale and the batch endpoint leave in Sales, SaleItems and
+SaleDiscounts, the totals they answer with, and the round trips they cost.
+
+The endpoint tests run against the in-memory stand-in database. test_insert_sale_lines_on_sql_server
+runs the same set-based statement on the SQL Server configured in database.py, inside a
+transaction it rolls back; it is skipped unless SALES_TEST_SQLSERVER=1.
+"""
+import json
+import os
+from datetime import datetime
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pytest
+
+from benchmarks.bench_load import PRODUCTS, DISCOUNT_NAME
+from sale_writes import insert_sale_lines, sale_discount_rows, sale_item_rows
+
+HEADERS = {"Authorization": "Bearer test-token"}
+ESPRESSO_SHOT = Decimal("25.00")  # the stand-in's AddonPrices row for espressoShots
+
+
+def cart(lines, client_price=1.0):
+    """Line i sells PRODUCTS[i % 3] with quantity i % 3 + 1 and one espresso shot per unit.
+    The client price is deliberately wrong: sales are priced from the catalog."""
+    return [
+        {"name": name, "quantity": i % 3 + 1, "price": client_price, "category": category,
+         "addons": {"espressoShots": 1}}
+        for i, (name, _, category) in enumerate(PRODUCTS[i % 3] for i in range(lines))
+    ]
+
+
+def sale(lines=3, discounts=(DISCOUNT_NAME,)):
+    return {"cartItems": cart(lines), "orderType": "Dine In", "paymentMethod": "Cash",
+            "appliedDiscounts": list(discounts)}
+
+
+def expected_subtotal(lines):
+    return sum(((PRODUCTS[i % 3][1] + ESPRESSO_SHOT) * (i % 3 + 1) for i in range(lines)), Decimal("0"))
+
+
+def discount_id(db, name=DISCOUNT_NAME):
+    return next(d["DiscountID"] for d in db.discounts.values() if d["DiscountName"] == name)
+
+
+def test_sale_item_rows_use_server_prices():
+    items = [SimpleNamespace(name="Spanish Latte", quantity=2, price=1.0, category="Coffee", addons={"espressoShots": 1}),
+             SimpleNamespace(name="Croissant", quantity=1, price=1.0, category="Pastry", addons={})]
+    rows = sale_item_rows(7, items, [Decimal("129.00"), Decimal("95.00")], [Decimal("25.00"), Decimal("0")])
+    assert rows == [
+        (7, "Spanish Latte", 2, Decimal("129.00"), "Coffee", json.dumps({"espressoShots": 1}), Decimal("25.00")),
+        (7, "Croissant", 1, Decimal("95.00"), "Pastry", None, Decimal("0")),
+    ]
+    assert sale_discount_rows(7, [{"id": 3, "amount": Decimal("12.50")}]) == [(7, 3, Decimal("12.50"))]
+
+
+def test_create_sale_writes_lines_discount_and_totals(service):
+    async def scenario(client, db):
+        response = await client.post("/auth/sales/", json=sale(), headers=HEADERS)
+        return response, db
+
+    response, db = service(scenario, background=False)
+    assert response.status_code == 201
+    body = response.json()
+    sale_id = body["saleId"]
+
+    # 154 x 1 + 174 x 2 + 120 x 3; the discount is 10% of it (minimum spend 100).
+    assert Decimal(str(body["subtotal"])) == expected_subtotal(3) == Decimal("862.00")
+    assert Decimal(str(body["discountAmount"])) == Decimal("86.20")
+    assert Decimal(str(body["finalTotal"])) == Decimal("775.80")
+
+    lines = [(i["ItemName"], i["Quantity"], i["UnitPrice"], i["AddonsPrice"], json.loads(i["Addons"]))
+             for i in db.sale_items[sale_id]]
+    assert lines == [
+        ("Spanish Latte", 1, Decimal("129.00"), ESPRESSO_SHOT, {"espressoShots": 1}),
+        ("Matcha Latte", 2, Decimal("149.00"), ESPRESSO_SHOT, {"espressoShots": 1}),
+        ("Croissant", 3, Decimal("95.00"), ESPRESSO_SHOT, {"espressoShots": 1}),
+    ]
+    assert [(s, d, Decimal(amount)) for s, d, amount in db.sale_discounts] == [(sale_id, discount_id(db), Decimal("86.20"))]
+    header = db.sales[sale_id]
+    assert (header["TotalDiscountAmount"], header["Status"]) == (Decimal("86.20"), "processing")
+    # Stored lines add up to the subtotal the till was given.
+    assert sum((i["UnitPrice"] + i["AddonsPrice"]) * i["Quantity"] for i in db.sale_items[sale_id]) == Decimal("862.00")
+    # One deduction row per inventory target, in the sale's transaction.
+    assert sorted(row["Target"] for row in db.outbox.values() if row["SaleID"] == sale_id) == ["ingredients", "materials"]
+
+
+def test_discount_names_match_case_insensitively(service):
+    async def scenario(client, db):
+        body = sale(discounts=(DISCOUNT_NAME.upper(), DISCOUNT_NAME.lower()))
+        response = await client.post("/auth/sales/", json=body, headers=HEADERS)
+        return response, db
+
+    response, db = service(scenario)
+    assert response.status_code == 201
+    assert Decimal(str(response.json()["discountAmount"])) == Decimal("86.20")
+    # Both spellings name the same discount, so it is applied once.
+    assert [(d, Decimal(amount)) for _, d, amount in db.sale_discounts] == [(discount_id(db), Decimal("86.20"))]
+
+
+def test_round_trips_do_not_grow_with_the_cart(service):
+    async def scenario(client, db):
+        counts = {}
+        for lines in (1, 50):
+            before = db.round_trips
+            response = await client.post("/auth/sales/", json=sale(lines), headers=HEADERS)
+            assert response.status_code == 201
+            counts[lines] = (db.round_trips - before, response.json())
+        return counts, db
+
+    counts, db = service(scenario, background=False)
+    (one_trips, one), (fifty_trips, fifty) = counts[1], counts[50]
+    assert one_trips == fifty_trips
+    assert len(db.sale_items[one["saleId"]]) == 1
+    assert len(db.sale_items[fifty["saleId"]]) == 50
+    assert Decimal(str(fifty["subtotal"])) == expected_subtotal(50)
+    assert sum((i["UnitPrice"] + i["AddonsPrice"]) * i["Quantity"] for i in db.sale_items[fifty["saleId"]]) \
+        == expected_subtotal(50)
+
+
+def test_batch_writes_each_sale_once(service):
+    created_at = datetime.now().replace(microsecond=0)
+    batch = {"sales": [
+        {**sale(lines=n + 1), "idempotencyKey": f"terminal-1:{n}", "createdAt": created_at.isoformat(),
+         "status": "completed" if n == 2 else "processing"}
+        for n in range(3)
+    ]}
+
+    async def scenario(client, db):
+        first = await client.post("/auth/sales/batch", json=batch, headers=HEADERS)
+        sales_after_first = len(db.sales)
+        retry = await client.post("/auth/sales/batch", json=batch, headers=HEADERS)
+        return first.json(), retry.json(), sales_after_first, db
+
+    first, retry, sales_after_first, db = service(scenario)
+    assert [r["status"] for r in first] == ["created"] * 3
+    assert [r["status"] for r in retry] == ["duplicate"] * 3
+    assert [r["saleId"] for r in retry] == [r["saleId"] for r in first]
+    assert len(db.sales) == sales_after_first == 3
+
+    for n, result in enumerate(first):
+        sale_id = result["saleId"]
+        assert len(db.sale_items[sale_id]) == n + 1
+        assert Decimal(str(result["subtotal"])) == expected_subtotal(n + 1)
+        assert db.sales[sale_id]["CreatedAt"] == created_at
+    assert [db.sales[r["saleId"]]["Status"] for r in first] == ["processing", "processing", "completed"]
+    # 154 is over the minimum spend, so every sale carries the discount once.
+    assert sorted(row[0] for row in db.sale_discounts) == sorted(r["saleId"] for r in first)
+
+
+def test_unknown_product_writes_nothing(service):
+    body = sale()
+    body["cartItems"][1]["name"] = "Not On The Menu"
+
+    async def scenario(client, db):
+        response = await client.post("/auth/sales/", json=body, headers=HEADERS)
+        return response, db
+
+    response, db = service(scenario)
+    assert response.status_code == 400
+    assert not db.sales and not db.sale_items and not db.sale_discounts and not db.outbox
+
+
+@pytest.mark.skipif(os.getenv("SALES_TEST_SQLSERVER") != "1", reason="set SALES_TEST_SQLSERVER=1 to use the configured SQL Server")
+def test_insert_sale_lines_on_sql_server(run):
+    from database import init_db_pool, close_db_pool, acquire_connection, transaction
+
+    class RollBack(Exception):
+        pass
+
+    items = [SimpleNamespace(name=f"Test Item {n}", quantity=n % 3 + 1, price=0, category="Test",
+                             addons={"espressoShots": 1} if n % 2 else {}) for n in range(30)]
+
+    async def scenario():
+        await init_db_pool()
+        try:
+            async with acquire_connection() as conn:
+                try:
+                    async with transaction(conn), conn.cursor() as cursor:
+                        await cursor.execute(
+                            "INSERT INTO Sales (OrderType, PaymentMethod, CashierName, TotalDiscountAmount) "
+                            "OUTPUT INSERTED.SaleID VALUES ('Dine In', 'Cash', 'pytest', 5.00)")
+                        sale_id = (await cursor.fetchone())[0]
+                        unit_prices = [Decimal("10.00") + n for n in range(30)]
+                        addon_prices = [ESPRESSO_SHOT if n % 2 else Decimal("0") for n in range(30)]
+                        await insert_sale_lines(cursor, sale_item_rows(sale_id, items, unit_prices, addon_prices),
+                                                [(sale_id, 1, Decimal("5.00"))])
+                        await cursor.execute(
+                            "SELECT COUNT(*), SUM((UnitPrice + AddonsPrice) * Quantity) FROM SaleItems WHERE SaleID = ?",
+                            sale_id)
+                        lines = tuple(await cursor.fetchone())
+                        await cursor.execute(
+                            "SELECT COUNT(*), SUM(DiscountAppliedAmount) FROM SaleDiscounts WHERE SaleID = ?", sale_id)
+                        discounts = tuple(await cursor.fetchone())
+                        raise RollBack
+                except RollBack:
+                    pass
+        finally:
+            await close_db_pool()
+        return lines, discounts, unit_prices, addon_prices
+
+    lines, discounts, unit_prices, addon_prices = run(scenario())
+    expected = sum((u + a) * item.quantity for item, u, a in zip(items, unit_prices, addon_prices))
+    assert lines == (30, expected)
+    assert discounts == (1, Decimal("5.00"))
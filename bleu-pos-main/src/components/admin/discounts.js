@@ -98,7 +98,7 @@ function Discounts() {
     }
 
     try {
-      const response = await fetch(`${API_BASE_URL_DISCOUNTS}/discounts/`, {
+      const response = await fetch(`${API_BASE_URL_DISCOUNTS}/discounts/?stream=true`, {
         headers: { "Authorization": `Bearer ${token}` },
       });
       if (!response.ok) {
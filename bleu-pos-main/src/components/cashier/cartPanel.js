@@ -58,7 +58,7 @@ const CartPanel = ({
 
       try {
         // This now correctly points to http://127.0.0.1:9002/discounts
-        const response = await fetch(`${DISCOUNTS_API_URL}/discounts?active_only=true`, {
+        const response = await fetch(`${DISCOUNTS_API_URL}/discounts?active_only=true&stream=true`, {
           headers: {
             'Authorization': `Bearer ${token}`
           }